@@ -26,12 +26,44 @@
 
 from __future__ import absolute_import, print_function
 
-from .api import match
+import importlib
+import sys
+
+from .deadline import Deadline
 from .ext import InvenioMatcher
 from .version import __version__
 
+_LAZY_NAMES = {
+    'match': '.api',
+    'match_batch': '.api',
+    'match_ranked': '.api',
+    'match_targets': '.api',
+}
+"""Public names imported on first use, as they pull in the search client."""
+
+
+def __getattr__(name):
+    """Import the lazy public names on first use."""
+    try:
+        module = importlib.import_module(_LAZY_NAMES[name], __name__)
+    except KeyError:
+        raise AttributeError(
+            'module {0} has no attribute {1}'.format(__name__, name))
+
+    value = globals()[name] = getattr(module, name)
+    return value
+
+
+if sys.version_info < (3, 7):
+    # Module level __getattr__ is not supported, see PEP 562.
+    from .api import match, match_batch, match_ranked, match_targets
+
 __all__ = (
     '__version__',
+    'Deadline',
     'InvenioMatcher',
     'match',
+    'match_batch',
+    'match_ranked',
+    'match_targets',
 )
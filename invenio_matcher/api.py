@@ -24,11 +24,27 @@
 
 """Matcher API."""
 
-from .core import execute, get_queries
+from __future__ import absolute_import, division, print_function
+
+import heapq
+import itertools
+import time
+from functools import partial
+from multiprocessing.pool import ThreadPool
+
+import six
+from flask import current_app
+from werkzeug.utils import import_string
+
+from .core import execute, execute_combined, extract_values, get_queries
+from .deadline import Deadline
 from .errors import NoQueryDefined
+from .proxies import current_matcher
 
 
-def match(record, index, doc_type, queries=None, validator=None, **kwargs):
+def match(record, index, doc_type, queries=None, validator=None,
+          timeout=None, deadline=None, exclude_seen=None, combine_exact=None,
+          extracted=None, **kwargs):
     """Find duplicates of the given record and yield results.
 
     This function is a generator, which returns one result at a time.
@@ -50,11 +66,39 @@ def match(record, index, doc_type, queries=None, validator=None, **kwargs):
     which wraps the previous keyword arguments.
 
     You can pass your own validator which is called for every result. The
-    default validator filters our existing matches to avoid returning the
-    same record several times.
+    default validator, built by ``MATCHER_VALIDATOR``, filters our existing
+    matches to avoid returning the same record several times. Results are
+    validated as they are yielded, so the ones left unread when the caller
+    stops early are not remembered by a shared validator.
+
+    The whole call can be bounded in time with `timeout`, in seconds, which
+    defaults to `MATCHER_TIMEOUT`. Each search gets the remaining budget as
+    its timeout and the queries left when it runs out are skipped. To know
+    whether that happened, pass your own `Deadline` instead and check its
+    `partial` flag after consuming the results.
+
+    With `exclude_seen`, which defaults to `MATCHER_EXCLUDE_SEEN`, each
+    query excludes the ids returned by the previous ones in Elasticsearch,
+    so that only new candidates are transferred.
+
+    With `combine_exact`, which defaults to `MATCHER_COMBINE_EXACT`, plain
+    `exact` queries are sent together in a single search, in the place of
+    the first of them. Each result records in `matched_queries` the queries
+    it satisfied.
+
+    The values of the record matched by the queries are extracted in a
+    single walk of the record, unless they are passed in `extracted`, for
+    example from the columns of a batch of records.
+
+    Each query can set conditions on its run, see ``MATCHER_QUERIES``.
+
+    When ``MATCHER_SCHEDULER`` is set, the queries run by decreasing yield
+    of new matches per second observed so far, see `QueryScheduler`.
 
     :return: generator over MatchResult instances.
     """
+    from elasticsearch.exceptions import ConnectionTimeout
+
     if not queries:
         queries = get_queries(index, doc_type, **kwargs)
 
@@ -64,17 +108,323 @@ def match(record, index, doc_type, queries=None, validator=None, **kwargs):
             )
 
     if not validator:
-        def validator(record, result, existing_matches={}):
-            """Validate results for duplicates."""
-            if result.id not in existing_matches:
-                existing_matches[result.id] = True
-                return True
-            return False
+        validator = _get_default_validator()
+
+    if deadline is None:
+        timeout = timeout or current_app.config.get('MATCHER_TIMEOUT')
+        if timeout:
+            deadline = Deadline(timeout)
+
+    if extracted is None:
+        extracted = extract_values(record, queries)
+
+    if combine_exact is None:
+        combine_exact = current_app.config.get('MATCHER_COMBINE_EXACT')
+    if combine_exact:
+        queries = _combine_exact_queries(queries)
+
+    scheduler = current_matcher.scheduler
+    if scheduler:
+        queries = scheduler.order(index, doc_type, queries)
+
+    if exclude_seen is None:
+        exclude_seen = current_app.config.get('MATCHER_EXCLUDE_SEEN')
+    seen = set()
+    found = False
 
     for query in queries:
-        results = execute(index, doc_type, query, record, **kwargs)
+        conditions = query if isinstance(query, dict) else {}
+        if found and conditions.get('run_if_no_match'):
+            continue
+        max_results = conditions.get('max_results')
+        stop_score = conditions.get('stop_if_score_above')
 
+        if exclude_seen and seen:
+            kwargs['exclude_ids'] = sorted(seen)
+
+        if deadline:
+            if deadline.expired:
+                deadline.partial = True
+                return
+            kwargs['request_timeout'] = deadline.remaining
+            kwargs['deadline'] = deadline
+
+        timer = _Timer()
+        try:
+            with timer:
+                if isinstance(query, list):
+                    results = execute_combined(
+                        index, doc_type, query, record, extracted=extracted,
+                        **kwargs)
+                else:
+                    results = execute(
+                        index, doc_type, query, record, extracted=extracted,
+                        **kwargs)
+        except ConnectionTimeout:
+            if not deadline or not deadline.expired:
+                raise
+            deadline.partial = True
+            return
+
+        count = 0
+        stop = False
         if results:
-            for result in results:
+            for result in timer.iterate(results):
+                if max_results is not None and count >= max_results:
+                    break
+                if exclude_seen:
+                    seen.add(result.id)
                 if validator(record, result):
+                    count += 1
                     yield result
+                    if stop_score is not None and \
+                            (result.score or 0) > stop_score:
+                        stop = True
+                        break
+
+        if scheduler:
+            scheduler.record(index, doc_type, query, timer.elapsed, count > 0)
+
+        found = found or count > 0
+        if stop:
+            return
+
+
+def match_ranked(record, index, doc_type, size=10, normalize=True,
+                 max_candidates=None, validator=None, **kwargs):
+    """Find the best duplicates of the given record across all queries.
+
+    Raw scores are not comparable between queries, so with ``normalize``
+    each score is divided by the best score of its query. Results re-ranked
+    by their query use their ``similarity`` instead, which is comparable
+    already. The score is then multiplied by the ``weight`` of the query, 1
+    by default, and the weighted scores of the queries hitting the same
+    record are added up. The result has this combined ``score`` and the
+    queries hitting it in ``matched_queries``.
+
+    Only the best ``max_candidates`` records, ``10 * size`` by default, are
+    kept while the queries run. The other keyword arguments are passed to
+    `match`, which runs the queries without grouping the exact ones nor
+    excluding the records already seen.
+
+    :param size: number of results to return.
+    :return: list of the best MatchResult instances, best first.
+    """
+    max_candidates = max_candidates or 10 * size
+    kwargs.update(combine_exact=False, exclude_seen=False)
+
+    best_scores = {}
+    candidates = {}
+    hits = {}
+    for result in match(record, index, doc_type,
+                        validator=validator or (lambda *args: True),
+                        **kwargs):
+        candidate = candidates.get(result.id)
+        if candidate is None:
+            candidate = candidates[result.id] = result
+            candidate.matched_queries = []
+            hits[result.id] = []
+        elif result.query in candidate.matched_queries:
+            continue
+        candidate.matched_queries.append(result.query)
+
+        key = None
+        score = result.similarity
+        if score is None:
+            score = result.score or 0
+            if normalize:
+                key = id(result.query)
+                best_scores[key] = max(best_scores.get(key, 0), score)
+        weight = (result.query or {}).get('weight', 1)
+        hits[result.id].append((key, score, weight))
+
+        if len(candidates) > 2 * max_candidates:
+            _score_candidates(candidates, hits, best_scores)
+            candidates = dict(
+                (candidate.id, candidate) for candidate in heapq.nlargest(
+                    max_candidates, six.itervalues(candidates),
+                    key=lambda candidate: candidate.score))
+            hits = dict((id_, hits[id_]) for id_ in candidates)
+
+    _score_candidates(candidates, hits, best_scores)
+    return heapq.nlargest(size, six.itervalues(candidates),
+                          key=lambda candidate: candidate.score)
+
+
+def match_batch(records, index, doc_type, queries=None, **kwargs):
+    """Find duplicates of each of the given records.
+
+    The queries are looked up once for the whole batch, and the other
+    keyword arguments are passed to `match`. When NumPy is installed, the
+    values of the records are extracted and normalized for the whole batch
+    at once, see `invenio_matcher.columns`.
+
+    :return: list of the list of MatchResult instances of each record.
+    """
+    if not queries:
+        queries = get_queries(index, doc_type, **kwargs)
+    records = list(records)
+
+    try:
+        from .columns import extract_columns, get_row
+    except ImportError:
+        rows = [None] * len(records)
+    else:
+        columns = extract_columns(records, queries)
+        rows = [get_row(columns, i) for i in range(len(records))]
+
+    return [
+        list(match(record, index, doc_type, queries=queries, extracted=row,
+                   **kwargs))
+        for record, row in zip(records, rows)
+    ]
+
+
+def match_targets(record, targets, size=10, processes=None, **kwargs):
+    """Find duplicates of the given record in several indices.
+
+    Each target is a tuple of `index` and `doc_type`, matched concurrently
+    with `match` and its own queries, unless `queries` is passed. Raw scores
+    are not comparable between indices, so they are divided by the best
+    score of their index before being merged. The ``score`` of the results
+    is this normalised one.
+
+    :param size: number of results to return.
+    :param processes: number of threads querying the targets, one per target
+        by default.
+    :return: list of the best MatchResult instances, best first.
+    """
+    targets = list(targets)
+    if not targets:
+        return []
+
+    pool = ThreadPool(processes or len(targets))
+    try:
+        best_by_target = pool.map(partial(
+            _match_target,
+            app=current_app._get_current_object(),
+            record=record,
+            size=size,
+            kwargs=kwargs,
+        ), targets)
+    finally:
+        pool.terminate()
+
+    counter = itertools.count()
+    heap = []
+    for max_score, results in best_by_target:
+        for result in results:
+            score = (result.score or 0) / max_score if max_score else 0
+            item = (score, -next(counter), result)
+            if len(heap) < size:
+                heapq.heappush(heap, item)
+            else:
+                heapq.heappushpop(heap, item)
+
+    best = []
+    for score, _, result in sorted(heap, reverse=True):
+        result.score = score
+        best.append(result)
+
+    return best
+
+
+def _match_target(target, app, record, size, kwargs):
+    """Return the best score and the best results of a target."""
+    index, doc_type = target
+    counter = itertools.count()
+    max_score = 0
+    heap = []
+
+    with app.app_context():
+        for result in match(record, index, doc_type, **kwargs):
+            score = result.score or 0
+            max_score = max(max_score, score)
+            item = (score, -next(counter), result)
+            if len(heap) < size:
+                heapq.heappush(heap, item)
+            else:
+                heapq.heappushpop(heap, item)
+
+    return max_score, [result for _, _, result in heap]
+
+
+def _score_candidates(candidates, hits, best_scores):
+    """Set the combined score of the candidates from their hits.
+
+    The scores of the hits are divided by the best score of their query
+    seen so far, when it is in ``best_scores``.
+    """
+    for id_, candidate in six.iteritems(candidates):
+        candidate.score = 0
+        for key, score, weight in hits[id_]:
+            if key is not None:
+                best_score = best_scores[key]
+                score = score / best_score if best_score else 0
+            candidate.score += score * weight
+
+
+class _Timer(object):
+    """Time spent searching, leaving out the time spent by the caller."""
+
+    def __init__(self):
+        """Initialize the timer."""
+        self.elapsed = 0
+        self._start = None
+
+    def __enter__(self):
+        """Start timing."""
+        self._start = time.time()
+
+    def __exit__(self, *exc_info):
+        """Stop timing."""
+        self.elapsed += time.time() - self._start
+
+    def iterate(self, iterable):
+        """Yield the items, timing only the fetching of each of them.
+
+        Lazy results, such as paginated ones, fetch their pages there.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+
+def _get_default_validator():
+    """Return a new default validator, see ``MATCHER_VALIDATOR``."""
+    factory = current_app.config.get('MATCHER_VALIDATOR')
+    if not factory:
+        from .validators import SetValidator
+        return SetValidator()
+    if isinstance(factory, six.string_types):
+        factory = import_string(factory)
+
+    return factory()
+
+
+def _combine_exact_queries(queries):
+    """Group the plain exact queries in a list, in the place of the first."""
+    plain = [query for query in queries if _is_plain_exact(query)]
+    if len(plain) < 2:
+        return queries
+
+    plan = []
+    for query in queries:
+        if not _is_plain_exact(query):
+            plan.append(query)
+        elif query is plain[0]:
+            plan.append(plain)
+
+    return plan
+
+
+def _is_plain_exact(query):
+    """Return whether the query is an exact query on a single path."""
+    return query.get('type') == 'exact' and \
+        isinstance(query.get('match'), six.string_types) and \
+        set(query) <= set(['type', 'match', 'with', 'values', 'normalize'])
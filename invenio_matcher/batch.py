@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Matcher of the records of JSON lines files.
+
+Records are read one per line, from plain or gzipped files, and matched in
+batches by a pool of worker processes, each with its own search client. The
+results are written as JSON lines in the order of the input, so that a job
+can resume by skipping as many records as there are lines in its output.
+Blank lines of the input are not records and are skipped.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import gzip
+import io
+import itertools
+import json
+import multiprocessing
+import multiprocessing.util
+import time
+
+import six
+from flask import current_app
+
+from .utils import imap_from_caller
+
+
+def match_file(input_path, output_path, index, doc_type, processes=None,
+               batch_size=100, offset=0, progress=None, **kwargs):
+    """Match the records of a JSON lines file and write the results.
+
+    Each line of the output has the ``position`` of the record in the input
+    and its ``matches``, a list of objects with their ``id`` and ``score``.
+    The other keyword arguments are passed to `invenio_matcher.api.match`.
+
+    :param input_path: JSON lines file, gzipped if it ends with ``.gz``.
+    :param output_path: file the results are appended to.
+    :param processes: number of worker processes, one per CPU by default.
+    :param batch_size: number of records sent at once to a worker. At most
+        two batches per worker are read ahead of the results written.
+    :param offset: number of records of the input to skip, for example the
+        ones already written by an interrupted job, see `count_lines`.
+    :param progress: function called with the stats after each batch.
+    :return: the stats of the job, with the number of ``records`` matched,
+        of ``matched`` records, of ``seconds`` and the ``throughput``.
+    """
+    stats = {'records': 0, 'matched': 0, 'seconds': 0, 'throughput': 0}
+    start = time.time()
+
+    processes = processes or multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(
+        processes,
+        initializer=_init_worker,
+        initargs=(current_app._get_current_object(),))
+    try:
+        with _open(input_path) as input_fp, \
+                io.open(output_path, 'a', encoding='utf-8') as output_fp:
+            lines = itertools.islice(
+                (line for line in input_fp if line.strip()), offset, None)
+            batches = (
+                (index, doc_type, offset + i * batch_size, batch, kwargs)
+                for i, batch in enumerate(_batches(lines, batch_size))
+            )
+            for results in imap_from_caller(
+                    pool, _match_batch, batches, 2 * processes):
+                for line, matched in results:
+                    output_fp.write(line)
+                    output_fp.write(u'\n')
+                    stats['matched'] += matched
+                output_fp.flush()
+
+                stats['records'] += len(results)
+                stats['seconds'] = time.time() - start
+                stats['throughput'] = stats['records'] / stats['seconds']
+                if progress:
+                    progress(stats)
+        # NOTE: let the workers exit, saving their scheduler statistics.
+        pool.close()
+        pool.join()
+    finally:
+        pool.terminate()
+
+    return stats
+
+
+def count_lines(path):
+    """Return the number of complete lines of a file.
+
+    A last line without its newline, left by an interrupted job, is not
+    counted, see `truncate_partial_line`. A missing file has no lines.
+    """
+    try:
+        with io.open(path, 'rb') as fp:
+            return sum(1 for line in fp if line.endswith(b'\n'))
+    except IOError:
+        return 0
+
+
+def truncate_partial_line(path):
+    """Remove the last line of a file if it has no newline.
+
+    Results appended after it would otherwise be written on the same line.
+    """
+    try:
+        with io.open(path, 'rb+') as fp:
+            size = 0
+            for line in fp:
+                if line.endswith(b'\n'):
+                    size += len(line)
+            fp.truncate(size)
+    except IOError:
+        pass
+
+
+def _open(path):
+    """Open a JSON lines file, gzipped or not."""
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(
+            io.BufferedReader(gzip.open(path)), encoding='utf-8')
+
+    return io.open(path, encoding='utf-8')
+
+
+def _batches(iterable, size):
+    """Yield lists of ``size`` items of the iterable, the last one shorter."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _init_worker(app):
+    """Give the worker process its own application context and client.
+
+    The state of the extension is inherited from the parent process, so its
+    search client and scheduler are dropped and built again on first use,
+    with connections and statistics owned by this process. The statistics
+    of the scheduler are saved when the worker exits.
+    """
+    state = app.extensions['invenio-matcher']
+    state.__dict__.pop('search_client', None)
+    state.__dict__.pop('scheduler', None)
+    app.app_context().push()
+    multiprocessing.util.Finalize(
+        None, _save_scheduler, args=(state,), exitpriority=10)
+
+
+def _save_scheduler(state):
+    """Save the statistics of the scheduler of the worker, if any."""
+    if state.scheduler:
+        state.scheduler.save()
+
+
+def _match_batch(args):
+    """Return the JSON line of the results of each line of a batch.
+
+    Each JSON line comes with whether the record matched anything.
+    """
+    from .api import match_batch
+
+    index, doc_type, position, lines, kwargs = args
+    records = [json.loads(line) for line in lines]
+
+    return [
+        (six.text_type(json.dumps({
+            'position': position + i,
+            'matches': [
+                {'id': result.id, 'score': result.score}
+                for result in results
+            ],
+        }, sort_keys=True)), bool(results))
+        for i, results in enumerate(
+            match_batch(records, index, doc_type, **kwargs))
+    ]
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Matcher blocking keys.
+
+Blocking keys are cheap properties that duplicates are expected to share,
+such as the publication year or the document type. They narrow the records
+scored by expensive queries down to a small block of candidates. Here's an
+example of the format:
+```
+'blocking': [
+    {'type': 'range', 'match': 'publication_info.year', 'delta': 1},
+    {'type': 'prefix', 'match': 'authors[0].full_name',
+     'with': 'authors.full_name', 'length': 1},
+    {'type': 'term', 'match': 'document_type'},
+]
+```
+As in queries, ``match`` is the path of the values in the record and
+``with`` the field searched, defaulting to ``match``. A key whose values
+are missing from the record does not narrow the block.
+"""
+
+from __future__ import absolute_import, print_function
+
+import re
+
+import six
+
+from .errors import InvalidQuery
+from .utils import get_value
+
+
+def get_blocking_filters(record, blocking):
+    """Return the search filters restricting candidates to the block."""
+    filters = []
+
+    for key in blocking:
+        _type, values = _parse(key, record)
+        if not values:
+            continue
+
+        field = key.get('with', key['match'])
+
+        if _type == 'term':
+            filters.append({'terms': {field: values}})
+        elif _type == 'range':
+            delta = key.get('delta', 0)
+            filters.append({'range': {field: {
+                'gte': min(values) - delta,
+                'lte': max(values) + delta,
+            }}})
+        elif _type == 'prefix':
+            filters.append({'bool': {'should': [
+                {'prefix': {field: value}} for value in values
+            ]}})
+
+    return filters
+
+
+def get_blocking_keys(record, blocking):
+    """Return the tuple of blocking values of the record.
+
+    Records sharing the same tuple belong to the same block. Ranges are
+    bucketed by ``delta + 1``, and values within ``delta`` of each other
+    are in the same or in neighbouring buckets, see `get_neighbour_keys`.
+    """
+    keys = []
+
+    for key in blocking:
+        _type, values = _parse(key, record)
+        if not values:
+            keys.append(None)
+        elif _type == 'range':
+            keys.append(values[0] // (key.get('delta', 0) + 1))
+        else:
+            keys.append(values[0])
+
+    return tuple(keys)
+
+
+def get_neighbour_keys(key, blocking):
+    """Return the keys of all the blocks of a record with the given key.
+
+    A record is also put in the block of the next bucket of each range, so
+    that any two records within ``delta`` of each other share a block. The
+    pairs of a block are the ones it owns, see `owns_pair`.
+    """
+    keys = [()]
+    for value, blocking_key in zip(key, blocking):
+        values = [value]
+        if value is not None and blocking_key['type'] == 'range' and \
+                blocking_key.get('delta', 0):
+            values.append(value + 1)
+        keys = [head + (value,) for head in keys for value in values]
+
+    return keys
+
+
+def owns_pair(block_key, key_a, key_b):
+    """Return whether a pair of records of the given keys is in this block.
+
+    Records of neighbouring ranges share a single block, the one of the
+    greatest bucket, while records of the same range share two blocks and
+    are only compared in the first one.
+    """
+    return all(
+        value == (a if a == b else max(a, b))
+        for value, a, b in zip(block_key, key_a, key_b)
+    )
+
+
+def get_blocking_fields(blocking):
+    """Return the fields of the records read by the blocking keys.
+
+    They can restrict the ``_source`` fetched to compute the keys.
+    """
+    return sorted(set(
+        re.sub(r'\[\d+\]', '', key['match']) for key in blocking))
+
+
+def _parse(key, record):
+    """Parse a blocking key and extract its values from the record."""
+    try:
+        _type = key['type']
+        match = key['match']
+    except KeyError:
+        raise InvalidQuery('Keys "type" and "match" not defined in blocking'
+                           ' key {key}'.format(key=key))
+
+    values = get_value(record, match, default=[])
+    if not isinstance(values, list):
+        values = [values]
+    values = [value for value in values if value not in (None, '', [])]
+
+    if _type == 'term':
+        return _type, sorted(set(values))
+    elif _type == 'range':
+        return _type, _to_integers(values)
+    elif _type == 'prefix':
+        length = key.get('length', 1)
+        return _type, sorted(set(
+            six.text_type(value)[:length].lower() for value in values))
+
+    raise InvalidQuery('Blocking key of type {_type} is not currently'
+                       ' implemented.'.format(_type=_type))
+
+
+def _to_integers(values):
+    """Convert the values to integers, parsing years from dates."""
+    result = []
+    for value in values:
+        try:
+            result.append(int(value))
+        except (TypeError, ValueError):
+            try:
+                result.append(int(six.text_type(value)[:4]))
+            except ValueError:
+                continue
+
+    return result
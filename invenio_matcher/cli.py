@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Command line interface of the matcher."""
+
+from __future__ import absolute_import, print_function
+
+import click
+from flask.cli import with_appcontext
+
+from .proxies import current_matcher
+
+
+@click.group()
+def matcher():
+    """Matcher commands."""
+
+
+@matcher.command()
+@click.option('--no-samples', is_flag=True, default=False,
+              help='Skip the replay of MATCHER_WARMUP_SAMPLES.')
+@with_appcontext
+def warmup(no_samples):
+    """Warm up the matcher and report the time taken by each step."""
+    timings = current_matcher.warmup(samples=[] if no_samples else None)
+    for step, seconds in timings.items():
+        click.echo('{step}: {ms:.1f} ms'.format(step=step, ms=seconds * 1000))
+    click.secho('Matcher warmed up in {ms:.1f} ms.'.format(
+        ms=sum(timings.values()) * 1000), fg='green')
+
+
+@matcher.command()
+@click.argument('input_path', type=click.Path(exists=True, dir_okay=False))
+@click.argument('output_path', type=click.Path(dir_okay=False))
+@click.option('--index', '-i', required=True, help='Index to match against.')
+@click.option('--doc-type', '-t', required=True,
+              help='Document type to match against.')
+@click.option('--processes', '-p', type=int, default=None,
+              help='Number of worker processes, one per CPU by default.')
+@click.option('--batch-size', '-b', type=int, default=100,
+              help='Number of records sent at once to a worker.')
+@click.option('--offset', type=int, default=0,
+              help='Number of input records to skip.')
+@click.option('--resume', is_flag=True, default=False,
+              help='Also skip the input records already in the output.')
+@with_appcontext
+def run(input_path, output_path, index, doc_type, processes, batch_size,
+        offset, resume):
+    """Match the records of a JSON lines file, optionally gzipped.
+
+    The results are appended to OUTPUT_PATH as JSON lines, in input order.
+    """
+    from .batch import count_lines, match_file, truncate_partial_line
+
+    if resume:
+        truncate_partial_line(output_path)
+        offset += count_lines(output_path)
+
+    def progress(stats):
+        click.echo('{records} records, {matched} matched, '
+                   '{throughput:.1f} records/s'.format(**stats), err=True)
+
+    stats = match_file(input_path, output_path, index, doc_type,
+                       processes=processes, batch_size=batch_size,
+                       offset=offset, progress=progress)
+
+    click.secho('Matched {records} records in {seconds:.1f} s '
+                '({throughput:.1f} records/s), {matched} with results.'.format(
+                    **stats), fg='green')
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Matcher clusters of duplicates.
+
+Matches are pairwise, but duplicates are transitive: if A matches B and B
+matches C, the three records are one cluster. Clusters are kept in a
+disjoint-set forest with path compression and union by rank, backed by
+arrays so that millions of records fit in little memory and are saved as
+raw arrays on disk.
+"""
+
+from __future__ import absolute_import, print_function
+
+import json
+import os
+from array import array
+
+
+class DuplicateClusters(object):
+    """Disjoint sets of duplicate records.
+
+    Besides the parent and rank of each record, a circular list links the
+    records of each cluster, so that its members are enumerated without
+    scanning all the records.
+    """
+
+    def __init__(self):
+        """Initialize empty clusters."""
+        self.ids = []
+        self.indexes = {}
+        self.parent = array('i')
+        self.rank = array('B')
+        self.next = array('i')
+
+    def __len__(self):
+        """Return the number of records."""
+        return len(self.ids)
+
+    def __contains__(self, id_):
+        """Return whether the record is known."""
+        return id_ in self.indexes
+
+    def add(self, id_):
+        """Add a record in a cluster of its own, return its index."""
+        index = self.indexes.get(id_)
+        if index is None:
+            index = len(self.ids)
+            self.indexes[id_] = index
+            self.ids.append(id_)
+            self.parent.append(index)
+            self.rank.append(0)
+            self.next.append(index)
+
+        return index
+
+    def find(self, id_):
+        """Return the representative of the cluster of the record."""
+        return self.ids[self._find(self.add(id_))]
+
+    def union(self, id_a, id_b):
+        """Merge the clusters of two records.
+
+        :return: whether they were in different clusters.
+        """
+        root_a = self._find(self.add(id_a))
+        root_b = self._find(self.add(id_b))
+        if root_a == root_b:
+            return False
+
+        if self.rank[root_a] < self.rank[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        if self.rank[root_a] == self.rank[root_b]:
+            self.rank[root_a] += 1
+
+        self.next[root_a], self.next[root_b] = \
+            self.next[root_b], self.next[root_a]
+
+        return True
+
+    def add_pairs(self, pairs):
+        """Merge the clusters of each pair of duplicates."""
+        for id_a, id_b in pairs:
+            self.union(id_a, id_b)
+
+    def add_matches(self, id_, results):
+        """Merge the cluster of a record with the ones of its matches."""
+        self.add(id_)
+        for result in results:
+            self.union(id_, result.id)
+
+    def cluster(self, id_):
+        """Return the records in the cluster of the record."""
+        start = self.indexes.get(id_)
+        if start is None:
+            return [id_]
+
+        members = [id_]
+        index = self.next[start]
+        while index != start:
+            members.append(self.ids[index])
+            index = self.next[index]
+
+        return members
+
+    def clusters(self):
+        """Yield the clusters of more than one record."""
+        for index, id_ in enumerate(self.ids):
+            if self._find(index) == index and self.next[index] != index:
+                yield self.cluster(id_)
+
+    def save(self, path):
+        """Save the clusters in the directory ``path``."""
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        _write_atomically(os.path.join(path, 'ids.json'), 'w',
+                          lambda fp: json.dump(self.ids, fp))
+        for name in ('parent', 'rank', 'next'):
+            _write_atomically(os.path.join(path, name), 'wb',
+                              getattr(self, name).tofile)
+
+    @classmethod
+    def load(cls, path):
+        """Load the clusters saved in the directory ``path``."""
+        clusters = cls()
+
+        with open(os.path.join(path, 'ids.json')) as fp:
+            clusters.ids = json.load(fp)
+        clusters.indexes = dict(
+            (id_, index) for index, id_ in enumerate(clusters.ids))
+
+        for name in ('parent', 'rank', 'next'):
+            with open(os.path.join(path, name), 'rb') as fp:
+                getattr(clusters, name).fromfile(fp, len(clusters.ids))
+
+        return clusters
+
+    def _find(self, index):
+        """Return the root of the index, compressing the path to it."""
+        root = index
+        while self.parent[root] != root:
+            root = self.parent[root]
+
+        while self.parent[index] != root:
+            self.parent[index], index = root, self.parent[index]
+
+        return root
+
+
+def _write_atomically(path, mode, write):
+    """Write a file through a temporary one, replacing it at the end."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, mode) as fp:
+        write(fp)
+    os.rename(tmp_path, path)
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Matcher columnar extraction of values from batches of records.
+
+The values of a path in a batch of records are kept in a single column: a
+flat array of all the values plus the offsets where the values of each
+record start, like Arrow list arrays. Normalization, coalescing and
+fingerprinting then work on whole batches, computing once what is shared
+by several records. Requires NumPy (``pip install invenio-matcher[numpy]``).
+"""
+
+from __future__ import absolute_import, print_function
+
+import zlib
+
+import numpy as np
+import six
+
+from .core import get_normalized_key, get_paths
+from .normalizers import compile_pipeline
+from .utils import PathTrie
+
+
+class ValueColumn(object):
+    """Values of one path for a batch of records."""
+
+    def __init__(self, offsets, values):
+        """Initialize a column.
+
+        :param offsets: array of ``n + 1`` integers, the values of the record
+            ``i`` being ``values[offsets[i]:offsets[i + 1]]``.
+        :param values: flat array of all the values.
+        """
+        self.offsets = offsets
+        self.values = values
+
+    @classmethod
+    def from_lists(cls, lists):
+        """Build a column from the list of values of each record."""
+        lengths = np.fromiter(
+            (len(values) for values in lists), dtype=np.int64,
+            count=len(lists))
+        offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        return cls(offsets, _to_array(
+            [value for values in lists for value in values]))
+
+    @classmethod
+    def from_rows(cls, rows, values, size):
+        """Build a column from the record of each value, in record order."""
+        offsets = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=size), out=offsets[1:])
+
+        return cls(offsets, values)
+
+    def __len__(self):
+        """Return the number of records."""
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        """Return the list of values of the record ``i``."""
+        return self.values[self.offsets[i]:self.offsets[i + 1]].tolist()
+
+    def to_lists(self):
+        """Return the list of values of each record."""
+        return [self[i] for i in range(len(self))]
+
+    @property
+    def lengths(self):
+        """Return the number of values of each record."""
+        return np.diff(self.offsets)
+
+    @property
+    def rows(self):
+        """Return the record of each value."""
+        return np.repeat(np.arange(len(self)), self.lengths)
+
+    def normalize(self, pipeline):
+        """Return the column normalized by the pipeline.
+
+        Each distinct value is normalized once, and the duplicates and
+        empties it produces inside a record are dropped.
+        """
+        distinct, codes = _factorize(self.values)
+        normalized, normalized_codes = _factorize(
+            _to_array([pipeline(value) for value in distinct]))
+        codes = normalized_codes[codes]
+
+        empty = np.fromiter(
+            (value is None or value == u'' for value in normalized),
+            dtype=bool, count=len(normalized))
+        kept = np.flatnonzero(~empty[codes])
+
+        rows = self.rows
+        selected = kept[_first_occurrences(
+            rows[kept], codes[kept], len(normalized))]
+
+        return ValueColumn.from_rows(
+            rows[selected], normalized[codes[selected]], len(self))
+
+    def first(self):
+        """Return the first value of each record, ``None`` if it has none."""
+        result = np.empty(len(self), dtype=object)
+        present = self.lengths > 0
+        result[present] = self.values[self.offsets[:-1][present]]
+
+        return result
+
+    def fingerprint(self):
+        """Return a fingerprint of the set of values of each record.
+
+        Records with the same values, in whatever order and repetition,
+        have the same fingerprint, which is stable between processes.
+        Records without values have the fingerprint 0.
+        """
+        distinct, codes = _factorize(self.values)
+        hashes = np.fromiter(
+            (zlib.crc32(six.text_type(value).encode('utf-8')) & 0xffffffff
+             for value in distinct),
+            dtype=np.uint64, count=len(distinct))
+
+        rows = self.rows
+        selected = _first_occurrences(rows, codes, len(distinct))
+
+        result = np.zeros(len(self), dtype=np.uint64)
+        np.bitwise_xor.at(result, rows[selected], hashes[codes[selected]])
+
+        return result
+
+
+def coalesce(*columns):
+    """Return, for each record, the first value of the first column having one.
+
+    Records without values in any of the columns get ``None``.
+    """
+    result = columns[0].first()
+    missing = columns[0].lengths == 0
+
+    for column in columns[1:]:
+        taken = missing & (column.lengths > 0)
+        result[taken] = column.values[column.offsets[:-1][taken]]
+        missing &= ~taken
+
+    return result
+
+
+def extract_columns(records, queries):
+    """Return the column of each path matched by the queries.
+
+    Each record is walked once, see `PathTrie`. The values of the queries
+    with a ``normalize`` key are also normalized column by column, under
+    the key of `get_normalized_key`.
+    """
+    paths = get_paths(queries)
+    trie = PathTrie(paths)
+
+    lists = dict((path, []) for path in paths)
+    for record in records:
+        extracted = trie.extract(record, default=[])
+        for path in paths:
+            lists[path].append(_to_list(extracted[path]))
+
+    columns = dict(
+        (path, ValueColumn.from_lists(values))
+        for path, values in six.iteritems(lists)
+    )
+
+    for query in queries:
+        if query.get('match') in columns and 'normalize' in query:
+            key = get_normalized_key(query['match'], query['normalize'])
+            try:
+                columns[key] = columns[query['match']].normalize(
+                    compile_pipeline(query['normalize']))
+            except TypeError:
+                # NOTE: unhashable values, normalized record by record.
+                pass
+
+    return columns
+
+
+def get_row(columns, i):
+    """Return the values of the record ``i``, as expected by ``match``."""
+    return dict(
+        (path, column[i]) for path, column in six.iteritems(columns))
+
+
+def _to_array(values):
+    """Return an object array of the values, which can be lists."""
+    result = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        result[i] = value
+
+    return result
+
+
+def _to_list(value):
+    """Return the value as a list, as `invenio_matcher.core` does."""
+    if not value:
+        return []
+    if not isinstance(value, list):
+        return [value]
+
+    return value
+
+
+def _factorize(values):
+    """Return the distinct values and the code of each value among them."""
+    index = {}
+    codes = np.fromiter(
+        (index.setdefault(value, len(index)) for value in values),
+        dtype=np.int64, count=len(values))
+
+    distinct = np.empty(len(index), dtype=object)
+    for value, code in six.iteritems(index):
+        distinct[code] = value
+
+    return distinct, codes
+
+
+def _first_occurrences(rows, codes, size):
+    """Return the indexes of the first occurrence of each code in each row.
+
+    The indexes are sorted, so the order of the values is kept.
+    """
+    _, first = np.unique(rows * size + codes, return_index=True)
+
+    return np.sort(first)
@@ -41,4 +41,226 @@ MATCHER_QUERIES = {
 For Elasticsearch, we use nested dictionaries to denote indices
 and doc_types, so that query retrieval is just a dictionary
 traversal.
+
+The values extracted from the record can be normalized before querying,
+by adding a ``normalize`` key. See ``invenio_matcher.normalizers`` for the
+format.
+
+The candidates of a query can be re-ranked by their similarity with the
+record, computed locally with NumPy, by adding a ``rerank`` key:
+```
+{
+    'type': 'fuzzy',
+    'match': 'titles.title',
+    'rerank': {
+        'text': ['titles.title'],
+        'year': 'imprints.date',
+        'weights': {'tokens': 1, 'ngrams': 1, 'year': 0.5},
+        'threshold': 0.5,
+    },
+}
+```
+See ``invenio_matcher.rerank.rerank`` for all the options.
+
+Queries on an index routed by a key can be sent only to the shards holding
+the key, by adding a ``routing`` key with the path of its values in the
+record, for example ``'routing': 'collection'``.
+
+The candidates of a ``fuzzy`` query can be restricted to the records
+sharing some cheap blocking keys with the record, by adding a ``blocking``
+key. See ``invenio_matcher.blocking`` for the format.
+
+Queries can be skipped or cut short by conditions evaluated by ``match``:
+
+- ``'run_if_no_match': True`` runs the query only if none of the previous
+  ones returned a match;
+- ``'stop_if_score_above': 10`` stops the match, skipping the following
+  queries, after a result of the query scores above 10;
+- ``'max_results': 1`` returns at most 1 result of the query.
+
+For example, to run a costly title query only when no identifier matched:
+```
+MATCHER_QUERIES = {
+    'records': {
+        'record': [
+            {'type': 'exact', 'match': 'arxiv_eprints.value',
+             'stop_if_score_above': 0},
+            {'type': 'fuzzy', 'match': 'titles.title',
+             'run_if_no_match': True, 'max_results': 5},
+        ]
+    }
+}
+```
+
+The scores of the results of ``match_ranked`` are weighted by the
+``weight`` of their query, 1 by default.
+
+All the candidates of a query, instead of the first page of them, can be
+enumerated lazily by adding a ``paginate`` key, for example
+``'paginate': {'min_score': 2}``. See ``invenio_matcher.engine.scan`` for
+all the options.
+"""
+
+MATCHER_SEARCH_CLIENT = None
+"""Factory of the search client used by the matcher.
+
+It can be a callable or an import path to one, and it is called with the
+keyword arguments in ``MATCHER_SEARCH_CLIENT_CONFIG``. When neither of them
+is set, the matcher shares ``invenio_search.current_search_client`` with
+the rest of the application.
+"""
+
+MATCHER_SEARCH_CLIENT_CONFIG = {}
+"""Settings of a dedicated search client for the matcher.
+
+When no ``MATCHER_SEARCH_CLIENT`` is set, they are passed to
+``elasticsearch.Elasticsearch``, with ``hosts`` defaulting to
+``SEARCH_ELASTIC_HOSTS``. Here's an example of the format:
+```
+MATCHER_SEARCH_CLIENT_CONFIG = {
+    'maxsize': 25,
+    'http_compress': True,
+    'timeout': 30,
+    'max_retries': 3,
+    'retry_on_timeout': True,
+    'sniff_on_start': True,
+    'sniff_on_connection_fail': True,
+    'sniffer_timeout': 60,
+}
+```
+``maxsize`` is the number of kept-alive connections per node, so batch
+matching gets its own connection pool and does not starve the UI.
+"""
+
+MATCHER_SEARCH_TIMEOUT = None
+"""Timeout in seconds of every search sent by the matcher.
+
+When ``None``, the default timeout of the search client is used.
+"""
+
+MATCHER_TIMEOUT = None
+"""Default time budget in seconds of a whole ``match`` call.
+
+Each search gets the remaining budget as its timeout, and the queries left
+when the budget runs out are skipped. When ``None``, there is no budget.
+"""
+
+MATCHER_SEARCH_LIMITER = None
+"""Settings of the adaptive limiter around the searches of the matcher.
+
+When ``None``, searches are sent directly to the search client. Otherwise
+they are passed to ``invenio_matcher.limiter.AdaptiveLimiter``. Here's an
+example of the format:
+```
+MATCHER_SEARCH_LIMITER = {
+    'initial_limit': 8,
+    'max_limit': 64,
+    'latency_target': 1.0,
+    'max_retries': 3,
+    'retry_backoff': 0.1,
+    'failure_threshold': 5,
+    'reset_timeout': 30,
+}
+```
+"""
+
+MATCHER_BLOCKING = {}
+"""Blocking keys used to find duplicates inside an index.
+
+They have the same nesting as ``MATCHER_QUERIES`` and the format described
+in ``invenio_matcher.blocking``:
+```
+MATCHER_BLOCKING = {
+    'records': {
+        'record': [
+            {'type': 'range', 'match': 'publication_info.year', 'delta': 1},
+            {'type': 'term', 'match': 'document_type'},
+        ]
+    }
+}
+```
+"""
+
+MATCHER_EXCLUDE_SEEN = False
+"""Whether queries exclude the ids returned by the previous ones.
+
+The exclusion is done by Elasticsearch with a ``must_not`` ``ids`` clause,
+so hits already returned are not transferred and deserialized again.
+"""
+
+MATCHER_COMBINE_EXACT = False
+"""Whether plain ``exact`` queries are sent together in a single search.
+
+Each of them becomes a named clause of a ``bool`` query, and the names in
+the ``matched_queries`` of the hits tell which queries they satisfied.
+"""
+
+MATCHER_SCHEDULER = None
+"""Settings of the scheduler ordering the queries of each match.
+
+When ``None``, queries run in the order of ``MATCHER_QUERIES``. Otherwise
+they are ordered by ``invenio_matcher.scheduler.QueryScheduler`` by the
+new matches per second they returned so far. Statistics are kept for each
+index and doc_type, and saved to ``path`` to survive restarts:
+```
+MATCHER_SCHEDULER = {
+    'path': '/var/lib/invenio/matcher-scheduler.json',
+    'decay': 0.99,
+    'save_every': 100,
+}
+```
+"""
+
+MATCHER_VALIDATOR = None
+"""Factory of the default validator of ``match``, called for each match.
+
+It can be a callable or an import path to one. When ``None``, each match
+remembers all the ids it returned with
+``invenio_matcher.validators.SetValidator``. ``LRUValidator`` and
+``BloomValidator`` bound the memory used, for example:
+```
+MATCHER_VALIDATOR = 'invenio_matcher.validators:LRUValidator'
+```
+To filter out the results already returned by other matches, such as the
+ones of a long-running stream, pass the same validator to all of them.
+"""
+
+MATCHER_SEARCH_PREFERENCE = False
+"""Whether searches carry a ``preference`` derived from their body.
+
+Identical searches then land on the same shard copies, whose caches were
+warmed by the previous ones, instead of on random replicas. Disabled by
+default, as frequent identical searches then all load the same copies;
+enable it with:
+```
+MATCHER_SEARCH_PREFERENCE = True
+```
+"""
+
+MATCHER_SEARCH_REQUEST_CACHE = False
+"""Whether cacheable searches are sent with ``request_cache=true``.
+
+Searches with scripts, random scores or dates relative to now are never
+cached, as their results change for the same body. Disabled by default, as
+the cache of a shard is dropped at each refresh and only pays off on indices
+rarely written to; enable it with:
+```
+MATCHER_SEARCH_REQUEST_CACHE = True
+```
+"""
+
+MATCHER_WARMUP_SAMPLES = []
+"""Sample matches replayed by the warm-up, to fill the search caches.
+
+Each sample gives the ``record`` to match against ``index`` and
+``doc_type``, for example:
+```
+MATCHER_WARMUP_SAMPLES = [
+    {
+        'index': 'records',
+        'doc_type': 'record',
+        'record': {'titles': [{'title': 'foo bar'}]},
+    },
+]
+```
 """
@@ -25,25 +25,49 @@
 """Matcher core."""
 
 import copy
+import json
 
 import six
 from flask import current_app
-from invenio_records import Record
 
-from .engine import exact, free, fuzzy
+from .blocking import get_blocking_filters
+from .engine import combined, exact, free, fuzzy
 from .errors import InvalidQuery, NoQueryDefined, NotImplementedQuery
-from .models import MatchResult
-from .utils import get_value
+from .normalizers import compile_pipeline
+from .utils import PathTrie, get_value
 
+MATCH_OPTIONS = frozenset(['run_if_no_match', 'stop_if_score_above',
+                           'max_results', 'weight'])
+"""Query options evaluated by `invenio_matcher.api` instead of the engine."""
 
-def execute(index, doc_type, query, record, **kwargs):
-    """Parse a query and send it to the engine, returning a list of hits."""
-    _type, match, values, extras = _parse(query, record)
+_tries = {}
+
+
+def execute(index, doc_type, query, record, extracted=None, **kwargs):
+    """Parse a query and send it to the engine, returning a list of hits.
+
+    Values already extracted from the record by `extract_values` can be
+    passed in ``extracted``.
+    """
+    _type, match, values, extras = _parse(query, record, extracted)
 
     if not values and not isinstance(match, (dict, list)):
         return []
 
     _kwargs = _merge(kwargs, extras)
+    rerank_config = _kwargs.pop('rerank', None)
+    blocking = _kwargs.pop('blocking', None)
+
+    routing = _kwargs.pop('routing', None)
+
+    if blocking and _type == 'fuzzy':
+        _kwargs['filters'] = get_blocking_filters(record, blocking)
+
+    if routing:
+        routing_values = _get_values(record, routing, extracted)
+        if routing_values:
+            _kwargs['routing'] = ','.join(
+                six.text_type(value) for value in routing_values)
 
     if _type == 'exact':
         result = exact(index, doc_type, match=match, values=values, **_kwargs)
@@ -54,7 +78,74 @@ def execute(index, doc_type, query, record, **kwargs):
     else:
         raise NotImplementedQuery('Query of type {_type} is not currently'
                                   ' implemented.'.format(_type=_type))
-    return _build_result(result['hits']['hits'])
+    if _kwargs.get('paginate'):
+        results = _iter_results(result['hits']['hits'], query)
+    else:
+        results = _build_result(result['hits']['hits'], query)
+
+    if rerank_config:
+        from .rerank import rerank
+        results = rerank(record, list(results), **rerank_config)
+
+    return results
+
+
+def execute_combined(index, doc_type, queries, record, extracted=None,
+                     **kwargs):
+    """Send several exact queries as a single search of named clauses.
+
+    The hits record in ``matched_queries`` all the queries they satisfied,
+    and in ``query`` the first of them.
+    """
+    clauses = []
+    for position, query in enumerate(queries):
+        _type, match, values, extras = _parse(query, record, extracted)
+        if values:
+            clauses.append((str(position), match, values))
+
+    if not clauses:
+        return []
+
+    result = combined(index, doc_type, clauses, **kwargs)
+
+    results = []
+    for hit in result['hits']['hits']:
+        matched_queries = [
+            queries[int(name)] for name in sorted(
+                hit.get('matched_queries', []), key=int)
+        ]
+        match_result = _build_result(
+            [hit], matched_queries[0] if matched_queries else None)[0]
+        match_result.matched_queries = matched_queries
+        results.append(match_result)
+
+    return results
+
+
+def extract_values(record, queries):
+    """Return the values of all the paths matched by the queries.
+
+    The record is walked once for all of them, see `PathTrie`.
+    """
+    return _get_trie(get_paths(queries)).extract(record, default=[])
+
+
+def get_paths(queries):
+    """Return the paths of the values to extract for the queries."""
+    return tuple(
+        query['match'] for query in queries
+        if isinstance(query.get('match'), six.string_types) and
+        'values' not in query
+    )
+
+
+def get_normalized_key(path, specs):
+    """Return the key of the normalized values of a path.
+
+    Values extracted and normalized ahead, for example by
+    `invenio_matcher.columns.extract_columns`, are found under this key.
+    """
+    return path, json.dumps(specs, sort_keys=True)
 
 
 def get_queries(index, doc_type, **kwargs):
@@ -68,12 +159,25 @@ def get_queries(index, doc_type, **kwargs):
                                  index=index, doc_type=doc_type))
 
 
-def _build_result(hits):
-    return [MatchResult(
-        hit['_id'],
-        Record(hit['_source']),
-        hit['_score']) for hit in hits
-    ]
+def _build_result(hits, query=None):
+    return list(_iter_results(hits, query))
+
+
+def _iter_results(hits, query=None):
+    """Yield the results of the hits, as they come."""
+    # NOTE: imported here as they pull in the database layer.
+    from invenio_records import Record
+
+    from .models import MatchResult
+
+    for hit in hits:
+        yield MatchResult(
+            hit['_id'],
+            Record(hit['_source']),
+            hit['_score'],
+            query=query,
+            index=hit.get('_index'),
+            doc_type=hit.get('_type'))
 
 
 def _merge(d1, d2):
@@ -84,7 +188,16 @@ def _merge(d1, d2):
     return result
 
 
-def _get_values(record, match):
+def _get_trie(paths):
+    """Return the trie of the paths, building it once."""
+    trie = _tries.get(paths)
+    if trie is None:
+        trie = _tries[paths] = PathTrie(paths)
+
+    return trie
+
+
+def _get_values(record, match, extracted=None):
     """Retrieve the values from the record.
 
     Ensures that the values will be a list, since this is what the
@@ -93,7 +206,10 @@ def _get_values(record, match):
     if not isinstance(match, six.string_types):
         return []
 
-    result = get_value(record, match, default=[])
+    if extracted is not None and match in extracted:
+        result = extracted[match]
+    else:
+        result = get_value(record, match, default=[])
     if not result:
         return []
     if not isinstance(result, list):
@@ -102,7 +218,7 @@ def _get_values(record, match):
     return result
 
 
-def _parse(query, record):
+def _parse(query, record, extracted=None):
     """Parse a query and extract values from record."""
     try:
         _type = query['type']
@@ -116,10 +232,18 @@ def _parse(query, record):
     # not advertised in the public API.
     if 'values' in query:
         values = query['values']
+    elif 'normalize' in query:
+        key = isinstance(match, six.string_types) and \
+            get_normalized_key(match, query['normalize'])
+        if key and extracted is not None and key in extracted:
+            values = extracted[key]
+        else:
+            values = compile_pipeline(query['normalize']).normalize(
+                _get_values(record, match, extracted))
     else:
-        values = _get_values(record, match)
+        values = _get_values(record, match, extracted)
     match = query.get('with', match)
-    extras = {k: v for k, v in six.iteritems(
-        query) if k not in set(['type', 'match', 'with', 'values'])}
+    extras = {k: v for k, v in six.iteritems(query) if k not in set(
+        ['type', 'match', 'with', 'values', 'normalize']) | MATCH_OPTIONS}
 
     return _type, match, values, extras
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Matcher deadline."""
+
+from __future__ import absolute_import, division, print_function
+
+import time
+
+
+class Deadline(object):
+    """Time budget shared by all the searches of a single match.
+
+    After the match is consumed, ``partial`` tells whether some queries
+    were skipped because the budget ran out.
+    """
+
+    def __init__(self, timeout, clock=time.time):
+        """Start a budget of ``timeout`` seconds."""
+        self.timeout = timeout
+        self.clock = clock
+        self.expires_at = clock() + timeout
+        self.partial = False
+
+    @property
+    def remaining(self):
+        """Return the seconds left in the budget."""
+        return max(self.expires_at - self.clock(), 0)
+
+    @property
+    def expired(self):
+        """Return whether the budget has run out."""
+        return self.remaining <= 0
+
+    def __deepcopy__(self, memo):
+        """Share the budget with the copies of the options holding it."""
+        return self
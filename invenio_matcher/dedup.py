@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Matcher detection of duplicates inside an index.
+
+Instead of matching every record against the whole index, records are
+grouped by blocking keys and only the pairs inside each block are compared.
+Blocks are compared in parallel, either with the configured queries or with
+a local similarity function, and the duplicate pairs are written as JSON
+lines to a file. A checkpoint file allows an interrupted job to resume.
+
+After a first full pass, only the records changed since the last run need
+to be matched against the index, which ``deduplicate_changes`` does.
+"""
+
+from __future__ import absolute_import, print_function
+
+import itertools
+import json
+import multiprocessing
+import os
+from functools import partial
+from multiprocessing.pool import ThreadPool
+
+import six
+from elasticsearch.helpers import scan
+from flask import current_app
+from werkzeug import import_string
+
+from .api import match
+from .blocking import get_blocking_fields, get_blocking_keys, \
+    get_neighbour_keys, owns_pair
+from .errors import NoBlockingDefined
+from .proxies import current_matcher
+from .utils import get_value, imap_from_caller
+
+
+def deduplicate(index, doc_type, output, blocking=None, similarity=None,
+                threshold=0.5, processes=None, checkpoint=None,
+                max_block_size=None, query=None, source=None):
+    """Find the duplicate records of an index and write them to a file.
+
+    :param output: path of the file where duplicate pairs are written, one
+        JSON object with the ``ids`` and the ``score`` per line.
+    :param blocking: blocking keys, see ``invenio_matcher.blocking``.
+        Defaults to the ones defined in ``MATCHER_BLOCKING``.
+    :param similarity: function, or import path to one, returning the
+        similarity of two records. Pairs reaching ``threshold`` are
+        duplicates. When not given, each record of a block is matched with
+        the configured queries and its hits inside the block are duplicates.
+    :param processes: number of workers. Blocks are compared in processes
+        with a similarity function and in threads with queries, which spend
+        their time waiting for the search backend.
+    :param checkpoint: path of a file recording the progress, so that the job
+        resumes after the last compared block.
+    :param max_block_size: blocks bigger than this are skipped.
+    :param query: query selecting the records to deduplicate.
+    :param source: fields of the records to compare, defaults to all.
+    :return: the number of duplicate pairs written.
+    """
+    if blocking is None:
+        blocking = get_blocking(index, doc_type)
+
+    # NOTE: only the blocking fields of the whole index are held in memory,
+    # the records to compare are fetched block by block.
+    blocks = get_blocks(
+        scan_records(index, doc_type, query=query,
+                     source=get_blocking_fields(blocking)),
+        blocking)
+    blocks = dict(
+        (key, [(id_, get_blocking_keys(record, blocking))
+               for id_, record in block])
+        for key, block in six.iteritems(blocks))
+    keys = sorted(blocks, key=json.dumps)
+
+    state = _read_checkpoint(
+        checkpoint, {'block': None, 'offset': 0, 'pairs': 0})
+    if state['block'] is not None:
+        keys = [key for key in keys if json.dumps(key) > state['block']]
+
+    if similarity:
+        compare = partial(
+            _compare_with_similarity,
+            similarity=similarity,
+            threshold=threshold)
+        pool = multiprocessing.Pool(processes)
+    else:
+        compare = partial(
+            _compare_with_queries,
+            app=current_app._get_current_object(),
+            index=index,
+            doc_type=doc_type)
+        pool = ThreadPool(processes)
+
+    todo = (
+        _fetch_block(index, doc_type, key,
+                     _skip_if_bigger(blocks[key], max_block_size), source)
+        for key in keys
+    )
+    window = 2 * (processes or multiprocessing.cpu_count())
+
+    with open(output, 'a') as fp:
+        fp.truncate(state['offset'])
+        try:
+            for key, pairs in six.moves.zip(keys, imap_from_caller(
+                    pool, compare, todo, window)):
+                for id_a, id_b, score in pairs:
+                    fp.write(json.dumps({'ids': [id_a, id_b], 'score': score}))
+                    fp.write('\n')
+                state['pairs'] += len(pairs)
+                state['block'] = json.dumps(key)
+                fp.flush()
+                state['offset'] = fp.tell()
+                _write_checkpoint(checkpoint, state)
+        finally:
+            pool.terminate()
+
+    return state['pairs']
+
+
+def deduplicate_changes(index, doc_type, output, watermark,
+                        field='_updated', processes=None, source=None,
+                        lag=None):
+    """Match the records changed since the last run against the index.
+
+    :param output: path of the file where duplicate pairs are appended, in
+        the same format as ``deduplicate``. Pairs already in it are not
+        written again.
+    :param watermark: path of the file recording the greatest value of
+        ``field`` seen by the last run and the size of the output then. It
+        is replaced atomically once all the changed records are matched, so
+        a failed run is simply repeated, without the pairs it wrote.
+    :param field: field increasing with every change, such as the update
+        timestamp or a sequence number.
+    :param processes: number of threads matching the changed records.
+    :param source: fields of the records to fetch, which must include
+        ``field``. Defaults to all.
+    :param lag: how far before the watermark the records are matched again,
+        so that the ones searchable only after the last run, because of the
+        refresh interval, are not missed. A number for numeric fields or a
+        time unit such as ``'1m'`` for dates.
+    :return: the number of duplicate pairs written.
+    """
+    state = _read_checkpoint(
+        watermark, {'value': None, 'pairs': 0, 'offset': None})
+    if state.get('offset') is None:
+        state['offset'] = os.path.getsize(output) \
+            if os.path.exists(output) else 0
+        _write_checkpoint(watermark, state)
+
+    query = None
+    if state['value'] is not None:
+        query = {'query': {'range': {field: {
+            'gte': _subtract_lag(state['value'], lag)}}}}
+
+    compare = partial(
+        _match_record,
+        app=current_app._get_current_object(),
+        index=index,
+        doc_type=doc_type,
+        field=field)
+    pool = ThreadPool(processes)
+    window = 2 * (processes or multiprocessing.cpu_count())
+
+    value = state['value']
+    count = 0
+    seen = _read_pairs(output, state['offset'])
+    with open(output, 'a') as fp:
+        fp.truncate(state['offset'])
+        try:
+            for record_value, pairs in imap_from_caller(
+                    pool, compare, scan_records(
+                        index, doc_type, query=query, source=source),
+                    window):
+                for id_a, id_b, score in pairs:
+                    pair = frozenset([id_a, id_b])
+                    if pair in seen:
+                        continue
+                    seen.add(pair)
+                    fp.write(json.dumps({'ids': [id_a, id_b], 'score': score}))
+                    fp.write('\n')
+                    count += 1
+                if record_value is not None and \
+                        (value is None or record_value > value):
+                    value = record_value
+        finally:
+            pool.terminate()
+        fp.flush()
+        offset = fp.tell()
+
+    _write_checkpoint(
+        watermark, {'value': value, 'pairs': count, 'offset': offset})
+
+    return count
+
+
+def get_blocking(index, doc_type):
+    """Return blocking keys defined for the given index and doc_type."""
+    MATCHER_BLOCKING = current_app.config.get('MATCHER_BLOCKING')
+    try:
+        return MATCHER_BLOCKING[index][doc_type]
+    except (KeyError, TypeError):
+        raise NoBlockingDefined('No blocking defined for index {index} and'
+                                ' doc_type {doc_type} in MATCHER_BLOCKING.'
+                                .format(index=index, doc_type=doc_type))
+
+
+def scan_records(index, doc_type, query=None, source=None):
+    """Yield the id and the source of every record matching the query."""
+    body = query or {'query': {'match_all': {}}}
+    kwargs = {}
+    if source:
+        kwargs['_source'] = source
+
+    for hit in scan(current_matcher.search_client, query=body, index=index,
+                    doc_type=doc_type, **kwargs):
+        yield hit['_id'], hit['_source']
+
+
+def fetch_records(index, doc_type, ids, source=None):
+    """Return the id and the source of the records of the given ids."""
+    if not ids:
+        return []
+
+    kwargs = {}
+    if source:
+        kwargs['_source'] = source
+
+    response = current_matcher.search_client.mget(
+        index=index, doc_type=doc_type, body={'ids': ids}, **kwargs)
+    return [
+        (doc['_id'], doc['_source'])
+        for doc in response['docs'] if doc.get('found')
+    ]
+
+
+def get_blocks(records, blocking):
+    """Group records of ``(id, record)`` by their blocking keys.
+
+    A record is in several blocks when its ranges are near the ones of the
+    next blocks, see `invenio_matcher.blocking.get_neighbour_keys`. Blocks
+    of a single record, which have nothing to compare, are dropped.
+    """
+    blocks = {}
+    for id_, record in records:
+        for key in get_neighbour_keys(
+                get_blocking_keys(record, blocking), blocking):
+            blocks.setdefault(key, []).append((id_, record))
+
+    return dict(
+        (key, block) for key, block in six.iteritems(blocks)
+        if len(block) > 1
+    )
+
+
+def _skip_if_bigger(block, max_block_size):
+    """Return the block, or no records if it is too big to compare."""
+    if max_block_size and len(block) > max_block_size:
+        current_app.logger.warning(
+            'Skipping block of {size} records.'.format(size=len(block)))
+        return []
+    return block
+
+
+def _fetch_block(index, doc_type, key, block, source):
+    """Return the key, the records and the blocking keys of a block."""
+    ids = [id_ for id_, _ in block]
+    return key, fetch_records(index, doc_type, ids, source=source), \
+        dict(block)
+
+
+def _compare_with_similarity(block, similarity, threshold):
+    """Return the pairs of the block at least as similar as the threshold."""
+    key, records, keys = block
+    if isinstance(similarity, six.string_types):
+        similarity = import_string(similarity)
+
+    pairs = []
+    for (id_a, a), (id_b, b) in itertools.combinations(records, 2):
+        if not owns_pair(key, keys[id_a], keys[id_b]):
+            continue
+        score = similarity(a, b)
+        if score >= threshold:
+            pairs.append((id_a, id_b, score))
+
+    return pairs
+
+
+def _compare_with_queries(block, app, index, doc_type):
+    """Return the pairs of the block matched by the configured queries.
+
+    The searches of each record are restricted to the other records of the
+    block, instead of the whole index.
+    """
+    key, records, keys = block
+    ids = set(id_ for id_, _ in records)
+
+    pairs = []
+    seen = set()
+    with app.app_context():
+        for id_, record in records:
+            other_ids = sorted(ids - set([id_]), key=six.text_type)
+            for result in match(record, index, doc_type,
+                                include_ids=other_ids):
+                pair = frozenset([id_, result.id])
+                if result.id in ids and len(pair) == 2 and \
+                        pair not in seen and \
+                        owns_pair(key, keys[id_], keys[result.id]):
+                    seen.add(pair)
+                    pairs.append((id_, result.id, result.score))
+
+    return pairs
+
+
+def _match_record(record, app, index, doc_type, field):
+    """Return the value of ``field`` and the duplicates of the record."""
+    id_, record = record
+
+    with app.app_context():
+        pairs = [
+            (id_, result.id, result.score)
+            for result in match(record, index, doc_type)
+            if result.id != id_
+        ]
+
+    return get_value(record, field), pairs
+
+
+def _read_pairs(path, size):
+    """Return the pairs of ids written in the first ``size`` bytes."""
+    pairs = set()
+    if os.path.exists(path):
+        with open(path, 'rb') as fp:
+            for line in fp:
+                size -= len(line)
+                if size < 0:
+                    break
+                pairs.add(frozenset(json.loads(line.decode('utf-8'))['ids']))
+
+    return pairs
+
+
+def _subtract_lag(value, lag):
+    """Return the value of the watermark moved back by the lag."""
+    if not lag:
+        return value
+    if isinstance(value, six.string_types):
+        return '{value}||-{lag}'.format(value=value, lag=lag)
+    return value - lag
+
+
+def _read_checkpoint(path, default):
+    """Return the progress recorded in the checkpoint."""
+    if path and os.path.exists(path):
+        with open(path) as fp:
+            return json.load(fp)
+
+    return default
+
+
+def _write_checkpoint(path, state):
+    """Record the progress atomically in the checkpoint."""
+    if not path:
+        return
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as fp:
+        json.dump(state, fp)
+    os.rename(tmp_path, path)
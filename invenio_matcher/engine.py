@@ -24,40 +24,259 @@
 
 """Matcher engine performing queries to the search backend."""
 
+import hashlib
 import json
 import six
 from flask import current_app
-from invenio_search import current_search_client
 from werkzeug import import_string
 
+from .proxies import current_matcher
 
-def search(index, doc_type, body):
-    """Perform search to external client."""
+SEARCH_PARAMS = ('request_timeout', 'routing', 'paginate', 'deadline')
+"""Query options passed to the search instead of the query builders."""
+
+
+def search(index, doc_type, body, request_timeout=None, paginate=None,
+           deadline=None, **kwargs):
+    """Perform search to external client.
+
+    With ``paginate``, ``True`` or a dict of options of `scan`, all the hits
+    are enumerated page by page and the response holds a generator of them
+    instead of a list. The pages are then fetched within the ``deadline`` of
+    the match, if any.
+
+    Extra keyword arguments are passed to the client as search parameters.
+    """
     if current_app.debug:
         current_app.logger.debug(
             json.dumps(body, indent=4)
         )
-    return current_search_client.search(
-        index=index, doc_type=doc_type, body=body
-    )
 
-
-def exact(index, doc_type, match, values, **kwargs):
+    timeout = current_app.config.get('MATCHER_SEARCH_TIMEOUT')
+    if timeout and request_timeout is not None:
+        request_timeout = min(timeout, request_timeout)
+    elif timeout:
+        request_timeout = timeout
+    if request_timeout is not None:
+        kwargs['request_timeout'] = request_timeout
+
+    if current_app.config.get('MATCHER_SEARCH_PREFERENCE'):
+        kwargs.setdefault('preference', _get_preference(body))
+    if current_app.config.get('MATCHER_SEARCH_REQUEST_CACHE') and \
+            _is_cacheable(body):
+        kwargs.setdefault('request_cache', True)
+
+    if paginate:
+        options = dict(paginate) if isinstance(paginate, dict) else {}
+        options.update(kwargs, deadline=deadline)
+        return {'hits': {'hits': scan(index, doc_type, body, **options)}}
+
+    return _call('search', deadline, index=index, doc_type=doc_type,
+                 body=body, **kwargs)
+
+
+def scan(index, doc_type, body, min_score=None, size=500,
+         mode='scroll', tiebreaker='_uid', scroll='5m', deadline=None,
+         **kwargs):
+    """Yield all the hits of a search, best first, one page at a time.
+
+    Deep pages are not fetched with ``from``, which costs Elasticsearch the
+    hits of all the previous pages, but in a scroll context or, with the
+    ``search_after`` mode, after the last hit of the previous page. Only a
+    page of hits is held in memory at a time.
+
+    :param min_score: only hits scoring at least this are returned.
+    :param size: number of hits of each page.
+    :param mode: ``scroll`` or ``search_after``. The latter needs
+        Elasticsearch 5 or later, which rejects the ``filtered`` queries
+        built for the ``exact`` type.
+    :param tiebreaker: unique field sorting hits of the same score, for
+        ``search_after``.
+    :param scroll: how long the scroll context is kept between pages.
+    :param deadline: `invenio_matcher.deadline.Deadline` of the match. Each
+        page is only given the time left, and the hits stop, marking the
+        match as partial, when it runs out.
+    """
+    timeout = kwargs.get('request_timeout')
+    body = dict(body, size=size)
+    if min_score is not None:
+        body['min_score'] = min_score
+
+    if mode == 'scroll':
+        kwargs.pop('request_cache', None)
+        response = _fetch_page('search', deadline, timeout, index=index,
+                               doc_type=doc_type, body=body, scroll=scroll,
+                               **kwargs)
+        if response is None:
+            return
+        scroll_id = response.get('_scroll_id')
+        try:
+            while response['hits']['hits']:
+                for hit in response['hits']['hits']:
+                    yield hit
+                response = _fetch_page('scroll', deadline, timeout,
+                                       scroll_id=scroll_id, scroll=scroll)
+                if response is None:
+                    return
+                scroll_id = response.get('_scroll_id', scroll_id)
+        finally:
+            if scroll_id:
+                current_matcher.search_client.clear_scroll(
+                    scroll_id=scroll_id)
+        return
+
+    body['sort'] = [{'_score': 'desc'}, {tiebreaker: 'asc'}]
+    body['track_scores'] = True
+    while True:
+        response = _fetch_page('search', deadline, timeout, index=index,
+                               doc_type=doc_type, body=body, **kwargs)
+        if response is None:
+            return
+        hits = response['hits']['hits']
+        for hit in hits:
+            yield hit
+        if len(hits) < size:
+            return
+        body['search_after'] = hits[-1]['sort']
+
+
+def exact(index, doc_type, match, values, exclude_ids=None,
+          include_ids=None, **kwargs):
     """Build an exact query and send it to Elasticsearch."""
+    params = _pop_search_params(kwargs)
     exact_query = _build_exact_query(match, values, **kwargs)
-    return search(index, doc_type, exact_query)
+    exact_query = _include_ids(exact_query, include_ids)
+    exact_query = _exclude_ids(exact_query, exclude_ids)
+    return search(index, doc_type, exact_query, **params)
 
 
-def fuzzy(index, doc_type, match, values, **kwargs):
+def fuzzy(index, doc_type, match, values, exclude_ids=None,
+          include_ids=None, **kwargs):
     """Build a fuzzy query and send it to Elasticsearch."""
+    params = _pop_search_params(kwargs)
     fuzzy_query = _build_fuzzy_query(index, doc_type, match, values, **kwargs)
-    return search(index, doc_type, fuzzy_query)
+    fuzzy_query = _include_ids(fuzzy_query, include_ids)
+    fuzzy_query = _exclude_ids(fuzzy_query, exclude_ids)
+    return search(index, doc_type, fuzzy_query, **params)
 
 
-def free(index, doc_type, query, **kwargs):
+def free(index, doc_type, query, exclude_ids=None, include_ids=None,
+         **kwargs):
     """Build a free query and send it to Elasticsearch."""
+    params = _pop_search_params(kwargs)
     free_query = _build_free_query(query, **kwargs)
-    return search(index, doc_type, free_query)
+    free_query = _include_ids(free_query, include_ids)
+    free_query = _exclude_ids(free_query, exclude_ids)
+    return search(index, doc_type, free_query, **params)
+
+
+def combined(index, doc_type, clauses, exclude_ids=None, include_ids=None,
+             **kwargs):
+    """Build several named exact queries and send them in one search."""
+    params = _pop_search_params(kwargs)
+    combined_query = _build_combined_query(clauses, **kwargs)
+    combined_query = _include_ids(combined_query, include_ids)
+    combined_query = _exclude_ids(combined_query, exclude_ids)
+    return search(index, doc_type, combined_query, **params)
+
+
+def _call(method, deadline=None, **kwargs):
+    """Call a method of the search client, through the limiter if any.
+
+    The limiter does not retry past the ``deadline`` of the match.
+    """
+    func = getattr(current_matcher.search_client, method)
+    limiter = current_matcher.search_limiter
+    if limiter:
+        return limiter.call(func, deadline=deadline, **kwargs)
+    return func(**kwargs)
+
+
+def _fetch_page(method, deadline, timeout, **kwargs):
+    """Fetch a page of `scan` within the time left to the match.
+
+    Return ``None``, marking the match as partial, when the time ran out
+    before or while fetching it.
+    """
+    from elasticsearch.exceptions import ConnectionTimeout
+
+    if deadline:
+        if deadline.expired:
+            deadline.partial = True
+            return None
+        kwargs['request_timeout'] = deadline.remaining if timeout is None \
+            else min(timeout, deadline.remaining)
+
+    try:
+        return _call(method, deadline, **kwargs)
+    except ConnectionTimeout:
+        if not deadline or not deadline.expired:
+            raise
+        deadline.partial = True
+        return None
+
+
+def _pop_search_params(kwargs):
+    """Remove from the query options the parameters of the search."""
+    return dict(
+        (key, kwargs.pop(key)) for key in SEARCH_PARAMS if key in kwargs
+    )
+
+
+def _get_preference(body):
+    """Return a preference derived from the query.
+
+    Identical queries are sent to the same shard copies, so that they hit
+    the caches warmed by the previous ones.
+    """
+    serialized = json.dumps(body, sort_keys=True, default=str)
+    return hashlib.md5(serialized.encode('utf-8')).hexdigest()
+
+
+def _is_cacheable(body):
+    """Return whether the results of the query can be cached.
+
+    Queries with scripts, random scores or dates relative to now return
+    different results for the same body.
+    """
+    if isinstance(body, dict):
+        return all(
+            key not in ('script', 'random_score') and _is_cacheable(value)
+            for key, value in six.iteritems(body)
+        )
+    elif isinstance(body, list):
+        return all(_is_cacheable(value) for value in body)
+    elif isinstance(body, six.string_types):
+        return not body.startswith('now')
+    return True
+
+
+def _build_combined_query(clauses, **kwargs):
+    """Build a query satisfied by any of several named exact queries.
+
+    Each clause is a tuple of name, match and values. The names of the
+    clauses satisfied by a hit are returned in its ``matched_queries``.
+    """
+    queries = []
+
+    for name, match, values in clauses:
+        queries.append({
+            'bool': {
+                'must': _build_exact_query(match, values)['query'],
+                '_name': name,
+            }
+        })
+
+    return {
+        # NOTE: keep the default number of hits of each query.
+        'size': 10 * len(queries),
+        'query': {
+            'bool': {
+                'should': queries,
+                'minimum_should_match': 1,
+            }
+        }
+    }
 
 
 def _build_exact_query(match, values, **kwargs):
@@ -96,14 +315,72 @@ def _build_exact_query(match, values, **kwargs):
 def _build_fuzzy_query(index, doc_type, match, values, **kwargs):
     """Build a fuzzy query."""
     if isinstance(match, list):
-        return _build_dis_max_query(match, index, doc_type, **kwargs)
-
-    if isinstance(match, dict):
-        doc = match
+        result = _build_dis_max_query(match, index, doc_type, **kwargs)
     else:
-        doc = _build_doc(match, values)
+        if isinstance(match, dict):
+            doc = match
+        else:
+            doc = _build_doc(match, values)
+        result = _build_mlt_query(doc, index, doc_type, **kwargs)
+
+    return _add_filters(result, kwargs.get('filters'))
+
+
+def _add_filters(query, filters):
+    """Restrict a query to the documents matching all the filters.
+
+    Filters do not contribute to scoring and are cached by Elasticsearch, so
+    only the documents passing them are scored by the wrapped query.
+    """
+    if not filters:
+        return query
+
+    query['query'] = {
+        'bool': {
+            'must': query['query'],
+            'filter': filters,
+        }
+    }
+
+    return query
+
+
+def _include_ids(query, ids):
+    """Restrict the query to the documents with the given ids."""
+    if ids is None or 'query' not in query:
+        return query
+
+    query['query'] = {
+        'bool': {
+            'must': query['query'],
+            'filter': {
+                'ids': {
+                    'values': list(ids)
+                }
+            },
+        }
+    }
+
+    return query
+
+
+def _exclude_ids(query, ids):
+    """Exclude the documents with the given ids from the query."""
+    if not ids or 'query' not in query:
+        return query
+
+    query['query'] = {
+        'bool': {
+            'must': query['query'],
+            'must_not': {
+                'ids': {
+                    'values': list(ids)
+                }
+            },
+        }
+    }
 
-    return _build_mlt_query(doc, index, doc_type, **kwargs)
+    return query
 
 
 def _build_doc(match, values):
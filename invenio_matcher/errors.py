@@ -39,3 +39,11 @@ class InvalidQuery(MatcherError):
 
 class NotImplementedQuery(MatcherError):
     """Query type is not implemented."""
+
+
+class SearchUnavailable(MatcherError):
+    """Search backend is unavailable."""
+
+
+class NoBlockingDefined(MatcherError):
+    """No blocking keys were defined."""
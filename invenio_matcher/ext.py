@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 #
 # This file is part of Invenio.
-# Copyright (C) 2016 CERN.
+# Copyright (C) 2016, 2017 CERN.
 #
 # Invenio is free software; you can redistribute it
 # and/or modify it under the terms of the GNU General Public License as
@@ -26,9 +26,73 @@
 
 from __future__ import absolute_import, print_function
 
+import six
+from flask import current_app
+from werkzeug.utils import cached_property, import_string
+
 from . import config
 
 
+class _MatcherState(object):
+    """Matcher state for an application."""
+
+    def __init__(self, app):
+        """Initialize state."""
+        self.app = app
+
+    @cached_property
+    def search_client(self):
+        """Return the search client used by the matcher.
+
+        A dedicated client, with its own connection pool, is built only when
+        ``MATCHER_SEARCH_CLIENT`` or ``MATCHER_SEARCH_CLIENT_CONFIG`` are set.
+        Search clients are imported here, so that loading the extension does
+        not import them.
+        """
+        factory = self.app.config.get('MATCHER_SEARCH_CLIENT')
+        client_config = dict(
+            self.app.config.get('MATCHER_SEARCH_CLIENT_CONFIG') or {})
+
+        if factory:
+            if isinstance(factory, six.string_types):
+                factory = import_string(factory)
+            return factory(**client_config)
+
+        if client_config:
+            from elasticsearch import Elasticsearch
+            client_config.setdefault(
+                'hosts', self.app.config.get('SEARCH_ELASTIC_HOSTS'))
+            return Elasticsearch(**client_config)
+
+        from invenio_search import current_search_client
+        return current_search_client
+
+    @cached_property
+    def search_limiter(self):
+        """Return the limiter around the searches, if configured."""
+        limiter_config = self.app.config.get('MATCHER_SEARCH_LIMITER')
+        if limiter_config is None:
+            return None
+
+        from .limiter import AdaptiveLimiter
+        return AdaptiveLimiter(**limiter_config)
+
+    @cached_property
+    def scheduler(self):
+        """Return the scheduler ordering the queries, if configured."""
+        scheduler_config = self.app.config.get('MATCHER_SCHEDULER')
+        if scheduler_config is None:
+            return None
+
+        from .scheduler import QueryScheduler
+        return QueryScheduler(**scheduler_config)
+
+    def warmup(self, samples=None):
+        """Warm up the matcher, see `invenio_matcher.warmup.warmup`."""
+        from .warmup import warmup
+        return warmup(self.app, samples=samples)
+
+
 class InvenioMatcher(object):
     """Invenio-Matcher extension."""
 
@@ -40,7 +104,18 @@ class InvenioMatcher(object):
     def init_app(self, app):
         """Flask application initialization."""
         self.init_config(app)
-        app.extensions['invenio-matcher'] = self
+        app.extensions['invenio-matcher'] = _MatcherState(app)
+
+    @staticmethod
+    def warmup(app=None, samples=None):
+        """Warm up the matcher of the application.
+
+        The application defaults to the current one.
+
+        :return: an ordered dict of the seconds taken by each step.
+        """
+        app = app or current_app._get_current_object()
+        return app.extensions['invenio-matcher'].warmup(samples=samples)
 
     @staticmethod
     def init_config(app):
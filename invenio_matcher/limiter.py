@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Matcher limiter protecting the search backend from overload."""
+
+from __future__ import absolute_import, division, print_function
+
+import random
+import threading
+import time
+
+from elasticsearch.exceptions import ConnectionError, ConnectionTimeout, \
+    TransportError
+
+from .errors import SearchUnavailable
+
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+"""HTTP status codes returned by an overloaded cluster."""
+
+
+def _is_overload(exc):
+    """Return whether the error means that the backend is overloaded."""
+    if isinstance(exc, ConnectionError):
+        return True
+    return isinstance(exc, TransportError) and \
+        exc.status_code in RETRY_STATUS_CODES
+
+
+def _is_retryable(exc):
+    """Return whether the call can be retried after the error.
+
+    Timeouts are not retried, as they are likely caused by the time budget
+    of the match and retrying them would only add load.
+    """
+    return _is_overload(exc) and not isinstance(exc, ConnectionTimeout)
+
+
+class CircuitBreaker(object):
+    """Fail fast once the search backend keeps failing.
+
+    The circuit opens after ``failure_threshold`` consecutive failures and
+    rejects every call for ``reset_timeout`` seconds. After that, calls are
+    let through again and the first failure opens the circuit once more.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30,
+                 clock=time.time):
+        """Initialize a closed circuit."""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        """Return whether calls are currently rejected."""
+        with self._lock:
+            return self.opened_at is not None and \
+                self.clock() - self.opened_at < self.reset_timeout
+
+    def before_call(self):
+        """Raise if the circuit is open."""
+        if self.is_open:
+            raise SearchUnavailable(
+                'Search backend failed {failures} times in a row, not'
+                ' sending searches for {reset_timeout} seconds.'.format(
+                    failures=self.failures,
+                    reset_timeout=self.reset_timeout))
+
+    def record_success(self):
+        """Close the circuit."""
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        """Count a failure, opening the circuit past the threshold."""
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+
+
+class AdaptiveLimiter(object):
+    """Limit the concurrent searches with AIMD.
+
+    The concurrency limit grows additively while searches are fast and
+    shrinks multiplicatively when they are slower than ``latency_target`` or
+    when the backend is overloaded. Overloaded calls are retried with
+    jittered exponential backoff, and a ``CircuitBreaker`` fails fast when
+    they keep failing.
+    """
+
+    def __init__(self, initial_limit=8, min_limit=1, max_limit=64,
+                 latency_target=1.0, backoff_ratio=0.5, max_retries=3,
+                 retry_backoff=0.1, max_retry_backoff=5,
+                 failure_threshold=5, reset_timeout=30,
+                 clock=time.time, sleep=time.sleep):
+        """Initialize the limiter."""
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff_ratio = backoff_ratio
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.clock = clock
+        self.sleep = sleep
+        self.breaker = CircuitBreaker(
+            failure_threshold=failure_threshold,
+            reset_timeout=reset_timeout,
+            clock=clock)
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Wait until there is room for another search."""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        """Free the room taken by a search."""
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def increase(self):
+        """Grow the limit by one every ``limit`` successful searches."""
+        with self._condition:
+            self.limit = min(self.limit + 1 / self.limit, self.max_limit)
+            self._condition.notify_all()
+
+    def decrease(self):
+        """Shrink the limit multiplicatively."""
+        with self._condition:
+            self.limit = max(self.limit * self.backoff_ratio, self.min_limit)
+
+    def backoff(self, attempt):
+        """Return the jittered time to wait before retrying."""
+        ceiling = min(self.retry_backoff * 2 ** attempt,
+                      self.max_retry_backoff)
+        return random.uniform(0, ceiling)
+
+    def call(self, func, *args, **kwargs):
+        """Call ``func`` within the limits, retrying when overloaded.
+
+        A ``deadline`` keyword argument, not passed to ``func``, bounds the
+        retries: they are given the time left as ``request_timeout``, and
+        they stop when the backoff would not leave any.
+        """
+        deadline = kwargs.pop('deadline', None)
+        timeout = kwargs.get('request_timeout')
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            self.acquire()
+            start = self.clock()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as exc:
+                if not _is_overload(exc):
+                    raise
+                self.decrease()
+                self.breaker.record_failure()
+                if not _is_retryable(exc) or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                if deadline and delay >= deadline.remaining:
+                    raise
+            else:
+                if self.clock() - start > self.latency_target:
+                    self.decrease()
+                else:
+                    self.increase()
+                self.breaker.record_success()
+                return result
+            finally:
+                self.release()
+
+            self.sleep(delay)
+            if deadline:
+                kwargs['request_timeout'] = deadline.remaining \
+                    if timeout is None else min(timeout, deadline.remaining)
+            attempt += 1
@@ -24,15 +24,36 @@
 
 """Matcher models."""
 
+from __future__ import absolute_import, print_function
+
+from datetime import datetime
+
+import six
+from invenio_db import db
+from sqlalchemy_utils.types import JSONType
+
 
 class MatchResult(object):
     """Matcher - represent a result."""
 
-    def __init__(self, id_, record, score):
-        """Initialize a match result with id, data and score."""
+    def __init__(self, id_, record, score, similarity=None, query=None,
+                 matched_queries=None, index=None, doc_type=None):
+        """Initialize a match result with id, data and score.
+
+        The similarity is set only when the result was re-ranked, and the
+        query is the one that found the result. When several queries were
+        sent in a single search, all the ones satisfied by the result are
+        in matched_queries. The index and doc_type are the ones where the
+        result was found.
+        """
         self.id = id_
         self.record = record
         self.score = score
+        self.similarity = similarity
+        self.query = query
+        self.matched_queries = matched_queries
+        self.index = index
+        self.doc_type = doc_type
 
     def __eq__(self, other):
         """Two results are equal if they are the same record.
@@ -40,3 +61,66 @@ class MatchResult(object):
         The score is an implementation detail, what matters is the record.
         """
         return self.record == other.record
+
+
+class MatchDecision(db.Model):
+    """Matcher - stored match of a record with another one."""
+
+    __tablename__ = 'matcher_decision'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    """Decision identifier."""
+
+    record_id = db.Column(db.String(255), nullable=False, index=True)
+    """Identifier of the matched record."""
+
+    matched_id = db.Column(db.String(255), nullable=False, index=True)
+    """Identifier of the record it matched."""
+
+    match_query = db.Column(JSONType, nullable=True)
+    """Query that found the match."""
+
+    score = db.Column(db.Float, nullable=True)
+    """Score of the match."""
+
+    created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    """Creation date of the decision."""
+
+    @classmethod
+    def bulk_create(cls, decisions, batch_size=1000):
+        """Insert decisions with one ``executemany`` INSERT per batch.
+
+        Decisions are dictionaries with the column values, such as the ones
+        returned by ``from_results``. The caller commits the session.
+
+        :return: the number of inserted decisions.
+        """
+        statement = cls.__table__.insert()
+        count = 0
+        batch = []
+
+        for decision in decisions:
+            batch.append(decision)
+            if len(batch) >= batch_size:
+                db.session.execute(statement, batch)
+                count += len(batch)
+                batch = []
+
+        if batch:
+            db.session.execute(statement, batch)
+            count += len(batch)
+
+        return count
+
+    @staticmethod
+    def from_results(record_id, results):
+        """Yield the decisions of a record for the results of its match."""
+        created = datetime.utcnow()
+        for result in results:
+            yield {
+                'record_id': six.text_type(record_id),
+                'matched_id': six.text_type(result.id),
+                'match_query': result.query,
+                'score': result.score,
+                'created': created,
+            }
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Matcher normalization of the values extracted from records.
+
+Identifiers come in many forms, like ``DOI:10.1/ABC`` and
+``https://doi.org/10.1/abc``, which only match exactly once normalized.
+A query can list the normalizers applied to its values. Here's an example
+of the format:
+```
+{
+    'type': 'exact',
+    'match': 'dois.value',
+    'normalize': [
+        'strip',
+        'lowercase',
+        {'type': 'strip_prefix',
+         'prefixes': ['doi:', 'https://doi.org/', 'http://dx.doi.org/']},
+    ],
+}
+```
+Each normalizer is either a name or a dictionary with a ``type`` and its
+options. Pipelines are compiled once, and the values they normalize are
+memoized.
+"""
+
+from __future__ import absolute_import, print_function
+
+import json
+import re
+
+import six
+
+from .errors import InvalidQuery
+
+CACHE_SIZE = 10000
+"""Number of normalized values memoized by each pipeline."""
+
+
+def lowercase():
+    """Lowercase the value."""
+    return lambda value: value.lower()
+
+
+def uppercase():
+    """Uppercase the value."""
+    return lambda value: value.upper()
+
+
+def strip():
+    """Strip whitespace around the value."""
+    return lambda value: value.strip()
+
+
+def strip_prefix(prefixes):
+    """Strip the first of the prefixes starting the value, ignoring case."""
+    pattern = re.compile(
+        u'^(?:{0})'.format(u'|'.join(re.escape(p) for p in prefixes)),
+        re.IGNORECASE | re.UNICODE)
+    return lambda value: pattern.sub(u'', value, count=1)
+
+
+def strip_version():
+    """Strip a version suffix like the ``v2`` of ``1234.5678v2``."""
+    pattern = re.compile(r'v\d+$')
+    return lambda value: pattern.sub(u'', value)
+
+
+def regex(pattern, replace=u'', ignore_case=False):
+    """Replace the matches of a regular expression."""
+    flags = re.UNICODE
+    if ignore_case:
+        flags |= re.IGNORECASE
+    pattern = re.compile(pattern, flags)
+    return lambda value: pattern.sub(replace, value)
+
+
+NORMALIZERS = {
+    'lowercase': lowercase,
+    'uppercase': uppercase,
+    'strip': strip,
+    'strip_prefix': strip_prefix,
+    'strip_version': strip_version,
+    'regex': regex,
+}
+"""Available normalizers, by name."""
+
+_pipelines = {}
+
+
+class Pipeline(object):
+    """Compiled sequence of normalizers with memoized results."""
+
+    def __init__(self, steps):
+        """Initialize the pipeline with the normalizing functions."""
+        self.steps = steps
+        self.cache = {}
+
+    def __call__(self, value):
+        """Return the normalized value.
+
+        Values which are not strings are returned as they are.
+        """
+        if not isinstance(value, six.string_types):
+            return value
+
+        try:
+            return self.cache[value]
+        except KeyError:
+            pass
+
+        result = value
+        for step in self.steps:
+            result = step(result)
+
+        if len(self.cache) >= CACHE_SIZE:
+            self.cache.clear()
+        self.cache[value] = result
+
+        return result
+
+    def normalize(self, values):
+        """Normalize a list of values, dropping the duplicates and empties."""
+        return _unique(self(value) for value in values)
+
+    def normalize_batch(self, batch):
+        """Normalize the lists of values of a batch of records.
+
+        Each distinct string in the batch is normalized once.
+        """
+        distinct = set(
+            value for values in batch for value in values
+            if isinstance(value, six.string_types)
+        )
+        normalized = dict((value, self(value)) for value in distinct)
+
+        return [
+            _unique(normalized.get(value, value)
+                    if isinstance(value, six.string_types) else value
+                    for value in values)
+            for values in batch
+        ]
+
+
+def compile_pipeline(specs):
+    """Return the pipeline of normalizers described by the specs.
+
+    Pipelines are compiled once for each distinct specs.
+    """
+    key = json.dumps(specs, sort_keys=True)
+    pipeline = _pipelines.get(key)
+    if pipeline is None:
+        pipeline = _pipelines[key] = Pipeline(
+            [_compile_step(spec) for spec in specs])
+
+    return pipeline
+
+
+def _compile_step(spec):
+    """Return the normalizing function described by the spec."""
+    if isinstance(spec, six.string_types):
+        spec = {'type': spec}
+
+    options = dict(spec)
+    name = options.pop('type', None)
+    try:
+        factory = NORMALIZERS[name]
+    except KeyError:
+        raise InvalidQuery('Normalizer {name} is not currently'
+                           ' implemented.'.format(name=name))
+
+    return factory(**options)
+
+
+def _unique(values):
+    """Return the values without duplicates and empties, keeping the order."""
+    result = []
+    for value in values:
+        if value not in (None, u'') and value not in result:
+            result.append(value)
+
+    return result
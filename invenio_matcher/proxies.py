@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Proxy objects for easier access to application objects."""
+
+from __future__ import absolute_import, print_function
+
+from flask import current_app
+from werkzeug.local import LocalProxy
+
+
+def _get_state():
+    """Return the matcher state of the current application.
+
+    Applications not registering the extension get a new state at each
+    access, which searches with the Invenio-Search client as before.
+    """
+    state = current_app.extensions.get('invenio-matcher')
+    if state is None:
+        from .ext import _MatcherState
+        state = _MatcherState(current_app._get_current_object())
+    return state
+
+
+current_matcher = LocalProxy(_get_state)
+"""Proxy to the state of the Invenio-Matcher extension."""
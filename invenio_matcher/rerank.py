@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Matcher re-ranking of candidates by local similarity.
+
+Raw scores of ``fuzzy`` queries cannot be compared between queries, so the
+candidates can be re-ranked by their similarity with the input record. All
+the candidates of a query are compared in one vectorised pass, which
+requires NumPy (``pip install invenio-matcher[numpy]``).
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import re
+
+import numpy as np
+import six
+
+from .utils import get_value
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+DEFAULT_WEIGHTS = {'tokens': 1, 'ngrams': 1, 'year': 1}
+
+
+def rerank(record, results, text=None, year=None, weights=None,
+           threshold=0, ngram_size=3, year_scale=2):
+    """Reorder and filter results by their similarity with the record.
+
+    :param record: the record being matched.
+    :param results: list of `MatchResult` to re-rank.
+    :param text: list of paths whose values are compared as text, with
+        token-set and character n-gram similarities.
+    :param year: path of a year, compared by the absolute difference relative
+        to ``year_scale``.
+    :param weights: weights of the ``tokens``, ``ngrams`` and ``year``
+        similarities in the combined one.
+    :param threshold: minimum combined similarity of the results to keep.
+    :return: the kept results, most similar first, with their combined
+        similarity in ``similarity``.
+    """
+    if not results:
+        return results
+
+    weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+    features = []
+
+    if text:
+        reference = _get_text(record, text)
+        if reference:
+            candidates = [_get_text(result.record, text)
+                          for result in results]
+            features.append((weights['tokens'], _jaccard(
+                _tokens(reference), [_tokens(c) for c in candidates])))
+            features.append((weights['ngrams'], _jaccard(
+                _ngrams(reference, ngram_size),
+                [_ngrams(c, ngram_size) for c in candidates])))
+
+    if year:
+        reference = _get_year(record, year)
+        if reference is not None:
+            years = np.array(
+                [_get_year(result.record, year) for result in results],
+                dtype=float)
+            features.append((weights['year'], _year_similarity(
+                reference, years, year_scale)))
+
+    if not features:
+        return results
+
+    total_weight = sum(weight for weight, _ in features)
+    if not total_weight:
+        return results
+    similarity = sum(weight * values for weight, values in features)
+    similarity /= total_weight
+
+    order = np.argsort(-similarity, kind='mergesort')
+    reranked = []
+    for i in order:
+        if similarity[i] < threshold:
+            break
+        results[i].similarity = float(similarity[i])
+        reranked.append(results[i])
+
+    return reranked
+
+
+def _get_text(record, paths):
+    """Return the text found at the given paths, lowercased."""
+    values = []
+    for path in paths:
+        value = get_value(record, path, default=[])
+        if not isinstance(value, list):
+            value = [value]
+        values.extend(_flatten(value))
+
+    return u' '.join(
+        six.text_type(value) for value in values if value).lower()
+
+
+def _flatten(values):
+    """Flatten nested lists of values."""
+    for value in values:
+        if isinstance(value, list):
+            for inner_value in _flatten(value):
+                yield inner_value
+        else:
+            yield value
+
+
+def _get_year(record, path):
+    """Return the first year found at the given path, or ``None``."""
+    value = get_value(record, path, default=[])
+    if not isinstance(value, list):
+        value = [value]
+
+    for year in _flatten(value):
+        try:
+            return int(six.text_type(year)[:4])
+        except ValueError:
+            continue
+
+
+def _tokens(text):
+    """Return the set of word tokens of the text."""
+    return set(TOKEN_PATTERN.findall(text))
+
+
+def _ngrams(text, size):
+    """Return the set of character n-grams of the text."""
+    text = u' '.join(TOKEN_PATTERN.findall(text))
+    if len(text) <= size:
+        return set([text]) if text else set()
+    return set(text[i:i + size] for i in range(len(text) - size + 1))
+
+
+def _jaccard(reference, candidates):
+    """Return the Jaccard similarities of the reference with the candidates.
+
+    Only the elements of the reference matter for the intersections, so the
+    candidates are encoded as a boolean matrix over them, plus their sizes.
+    """
+    if not reference:
+        return np.zeros(len(candidates))
+
+    vocabulary = dict((element, i) for i, element in enumerate(reference))
+    rows, columns = [], []
+    for row, candidate in enumerate(candidates):
+        for element in candidate:
+            column = vocabulary.get(element)
+            if column is not None:
+                rows.append(row)
+                columns.append(column)
+
+    matrix = np.zeros((len(candidates), len(vocabulary)), dtype=bool)
+    matrix[np.array(rows, dtype=int), np.array(columns, dtype=int)] = True
+
+    intersection = matrix.sum(axis=1)
+    sizes = np.fromiter(
+        (len(candidate) for candidate in candidates),
+        dtype=float, count=len(candidates))
+    union = sizes + len(reference) - intersection
+
+    return intersection / union
+
+
+def _year_similarity(reference, years, scale):
+    """Return the similarities of the reference year with the years."""
+    similarity = 1 - np.abs(years - reference) / (scale + 1)
+    return np.nan_to_num(np.clip(similarity, 0, 1))
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Matcher scheduler ordering queries by their observed yield and cost.
+
+For each index and doc_type, the scheduler keeps how often each query
+returned a new validated match and how long it took. Queries are then run
+by decreasing expected yield per second, so that the cheap queries finding
+most of the matches come first. Statistics decay, so that the order follows
+changes of the data, and can be saved to a file to survive restarts. The
+file can be shared by several processes, each adding its observations to
+the ones saved by the others.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class QueryScheduler(object):
+    """Order queries by expected yield per unit of cost."""
+
+    def __init__(self, path=None, decay=0.99, prior_latency=0.1,
+                 save_every=100):
+        """Initialize the scheduler, loading the statistics saved in path.
+
+        :param path: JSON file where the statistics are saved.
+        :param decay: weight of the past observations at each new one.
+        :param prior_latency: latency, in seconds, assumed for the queries
+            before they are observed.
+        :param save_every: number of observations between saves.
+        """
+        self.path = path
+        self.decay = decay
+        self.prior_latency = prior_latency
+        self.save_every = save_every
+        self.stats = _load(path) if path else {}
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def order(self, index, doc_type, queries):
+        """Return the queries by decreasing expected yield per second.
+
+        Queries with the same expectation, such as the ones never observed,
+        keep their order. Queries with conditions depending on the queries
+        before them, or deciding whether the queries after them run, stay in
+        place, and the other queries are only reordered between them.
+        """
+        with self._lock:
+            stats = self.stats.get(index, {}).get(doc_type, {})
+            rates = [self._rate(stats.get(_key(query))) for query in queries]
+
+        result = []
+        segment = []
+        for i, query in enumerate(queries):
+            if _is_fixed(query):
+                result.extend(queries[j] for j in sorted(
+                    segment, key=lambda j: -rates[j]))
+                result.append(query)
+                segment = []
+            else:
+                segment.append(i)
+        result.extend(
+            queries[j] for j in sorted(segment, key=lambda j: -rates[j]))
+
+        return result
+
+    def record(self, index, doc_type, query, latency, matched):
+        """Record that the query took ``latency`` seconds.
+
+        :param matched: whether it returned a new validated match.
+        """
+        observation = (index, doc_type, _key(query), latency, bool(matched))
+        with self._lock:
+            self._observe(self.stats, *observation)
+
+            if self.path:
+                self._pending.append(observation)
+                if len(self._pending) >= self.save_every:
+                    self._save()
+
+    def save(self):
+        """Save the statistics to the file, for example before exiting."""
+        with self._lock:
+            self._save()
+
+    def _observe(self, stats, index, doc_type, key, latency, matched):
+        """Add an observation to the statistics."""
+        stats = stats.setdefault(index, {}).setdefault(
+            doc_type, {}).setdefault(
+                key, {'runs': 0, 'matches': 0, 'latency': 0})
+        stats['runs'] = stats['runs'] * self.decay + 1
+        stats['matches'] = stats['matches'] * self.decay + matched
+        stats['latency'] = stats['latency'] * self.decay + latency
+
+    def _rate(self, stats):
+        """Return the expected matches per second of a query."""
+        stats = stats or {'runs': 0, 'matches': 0, 'latency': 0}
+        probability = (stats['matches'] + 1) / (stats['runs'] + 2)
+        latency = (stats['latency'] + self.prior_latency) / (stats['runs'] + 1)
+
+        return probability / latency
+
+    def _save(self):
+        """Save the statistics atomically, holding the lock.
+
+        The observations made since the last save are added to the
+        statistics in the file, which other processes may have saved since.
+        """
+        if not self.path or not self._pending:
+            return
+
+        with _lock_file(self.path + '.lock'):
+            stats = _load(self.path)
+            for observation in self._pending:
+                self._observe(stats, *observation)
+
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(os.path.abspath(self.path)),
+                suffix='.tmp')
+            with os.fdopen(fd, 'w') as fp:
+                json.dump(stats, fp)
+            os.rename(tmp_path, self.path)
+
+        self.stats = stats
+        self._pending = []
+
+
+def _load(path):
+    """Return the statistics saved in the file, empty if it is unreadable."""
+    if not os.path.exists(path):
+        return {}
+
+    try:
+        with open(path) as fp:
+            return json.load(fp)
+    except (IOError, ValueError):
+        logger.warning('Ignoring unreadable scheduler statistics in %s.', path)
+        return {}
+
+
+@contextmanager
+def _lock_file(path):
+    """Hold an exclusive lock on the file between processes."""
+    if fcntl is None:
+        yield
+        return
+
+    with open(path, 'a') as fp:
+        fcntl.flock(fp, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fp, fcntl.LOCK_UN)
+
+
+def _is_fixed(query):
+    """Return whether the query has conditions tying it to its position."""
+    return isinstance(query, dict) and bool(
+        query.get('run_if_no_match') or
+        query.get('stop_if_score_above') is not None)
+
+
+def _key(query):
+    """Return the key of the statistics of a query."""
+    return json.dumps(query, sort_keys=True)
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Celery tasks matching records in chunks.
+
+A `ChunkedMatch` splits the records to match in chunks, each of them
+matched by a `match_chunk` task which stores the results as
+`MatchDecision` rows. The chunks can then be tracked and the failed ones
+sent again. Requires Celery (``pip install invenio-matcher[celery]``).
+"""
+
+from __future__ import absolute_import, print_function
+
+import six
+from celery import shared_task
+from celery.states import FAILURE, SUCCESS
+
+
+@shared_task(bind=True, ignore_result=False, max_retries=3,
+             default_retry_delay=10)
+def match_chunk(self, chunk, index, doc_type, id_field='control_number',
+                **kwargs):
+    """Match a chunk of records and store the results.
+
+    Searches failing because the search backend is unavailable are retried.
+
+    :param chunk: list of the ids of stored records or of record payloads,
+        whose id is in their ``id_field``. The decisions previously stored
+        for these records are replaced.
+    :param kwargs: passed to `invenio_matcher.api.match_batch`.
+    :return: the number of stored decisions.
+    """
+    from elasticsearch.exceptions import ConnectionError
+    from invenio_db import db
+
+    from .api import match_batch
+    from .errors import SearchUnavailable
+    from .models import MatchDecision
+
+    record_ids, records = _load_records(chunk, id_field)
+    try:
+        results = match_batch(records, index, doc_type, **kwargs)
+    except (ConnectionError, SearchUnavailable) as exc:
+        raise self.retry(exc=exc)
+
+    # NOTE: a chunk matched again, e.g. when its task is retried after the
+    # commit, replaces the decisions it stored before.
+    if record_ids:
+        MatchDecision.query.filter(MatchDecision.record_id.in_(
+            [six.text_type(record_id) for record_id in record_ids]
+        )).delete(synchronize_session=False)
+    count = MatchDecision.bulk_create(
+        decision
+        for record_id, record_results in zip(record_ids, results)
+        for decision in MatchDecision.from_results(record_id, record_results)
+    )
+    db.session.commit()
+
+    return count
+
+
+class ChunkedMatch(object):
+    """Match of records split in chunks, each matched by a task."""
+
+    def __init__(self, records, index, doc_type, chunk_size=100, **kwargs):
+        """Split the records in chunks.
+
+        :param records: ids of stored records or record payloads, see
+            `match_chunk`, which also gets the other keyword arguments.
+        """
+        records = list(records)
+        self.chunks = [
+            records[i:i + chunk_size]
+            for i in range(0, len(records), chunk_size)
+        ]
+        self.index = index
+        self.doc_type = doc_type
+        self.kwargs = kwargs
+        self.results = {}
+
+    def start(self):
+        """Send the chunks not sent yet."""
+        for i in range(len(self.chunks)):
+            if i not in self.results:
+                self._send(i)
+
+        return self
+
+    def retry_failed(self):
+        """Send again the chunks whose task failed.
+
+        :return: the numbers of the chunks sent again.
+        """
+        failed = self.failed
+        for i in failed:
+            self._send(i)
+
+        return failed
+
+    @property
+    def completed(self):
+        """Numbers of the chunks whose results are stored."""
+        return self._with_state(SUCCESS)
+
+    @property
+    def failed(self):
+        """Numbers of the chunks whose task failed."""
+        return self._with_state(FAILURE)
+
+    @property
+    def done(self):
+        """Whether the results of all the chunks are stored."""
+        return len(self.completed) == len(self.chunks)
+
+    @property
+    def decisions(self):
+        """Number of decisions stored by the completed chunks."""
+        return sum(self.results[i].result for i in self.completed)
+
+    def _send(self, i):
+        """Send the chunk ``i`` to a task."""
+        self.results[i] = match_chunk.delay(
+            self.chunks[i], self.index, self.doc_type, **self.kwargs)
+
+    def _with_state(self, state):
+        """Return the numbers of the sent chunks in the given state."""
+        return sorted(
+            i for i, result in six.iteritems(self.results)
+            if result.state == state)
+
+
+def _load_records(chunk, id_field):
+    """Return the ids and the records of a chunk.
+
+    Payloads without an id are skipped, as their decisions could not be
+    told apart.
+    """
+    from flask import current_app
+    from invenio_records.api import Record
+
+    ids = [item for item in chunk if isinstance(item, six.string_types)]
+    stored = dict(
+        (six.text_type(record.id), record)
+        for record in Record.get_records(ids)) if ids else {}
+
+    record_ids, records = [], []
+    for item in chunk:
+        if isinstance(item, six.string_types):
+            if item not in stored:
+                continue
+            record_ids.append(item)
+            records.append(stored[item])
+        else:
+            record_id = item.get(id_field)
+            if record_id is None:
+                current_app.logger.error(
+                    'Skipping a record without %s in its payload.', id_field)
+                continue
+            record_ids.append(record_id)
+            records.append(item)
+
+    return record_ids, records
@@ -26,8 +26,10 @@
 
 from __future__ import absolute_import, division, print_function
 
+import collections
 import re
 
+import six
 
 SPLIT_KEY_PATTERN = re.compile('\.|\[')
 
@@ -45,30 +47,6 @@ def get_value(record, key, default=None):
             >>> %timeit x = dd['a'][0]['b']
             1000000 loops, best of 3: 598 ns per loop
     """
-    def getitem(k, v, default):
-        if isinstance(v, dict):
-            return v[k]
-        elif ']' in k:
-            k = k[:-1].replace('n', '-1')
-            # Work around for list indexes and slices
-            try:
-                return v[int(k)]
-            except IndexError:
-                return default
-            except ValueError:
-                return v[slice(*map(
-                    lambda x: int(x.strip()) if x.strip() else None,
-                    k.split(':')
-                ))]
-        else:
-            tmp = []
-            for inner_v in v:
-                try:
-                    tmp.append(getitem(k, inner_v, default))
-                except KeyError:
-                    continue
-            return tmp
-
     # Check if we are using python regular keys
     try:
         return record[key]
@@ -79,7 +57,131 @@ def get_value(record, key, default=None):
     value = record
     for k in keys:
         try:
-            value = getitem(k, value, default)
+            value = _getitem(k, value, default)
         except KeyError:
             return default
     return value
+
+
+def imap_from_caller(pool, func, iterable, window):
+    """Yield ``func`` of each item, in order, computed by the pool.
+
+    Unlike ``pool.imap``, the iterable is consumed by the calling thread,
+    which has the application context, and at most ``window`` items are
+    sent ahead of the results consumed, so a long iterable is not read
+    into memory.
+    """
+    pending = collections.deque()
+    for item in iterable:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+
+    while pending:
+        yield pending.popleft().get()
+
+
+def _getitem(k, v, default):
+    """Return the item ``k`` of ``v`` as described in `get_value`."""
+    if isinstance(v, dict):
+        return v[k]
+    elif ']' in k:
+        k = k[:-1].replace('n', '-1')
+        # Work around for list indexes and slices
+        try:
+            return v[int(k)]
+        except IndexError:
+            return default
+        except ValueError:
+            return v[slice(*map(
+                lambda x: int(x.strip()) if x.strip() else None,
+                k.split(':')
+            ))]
+    else:
+        tmp = []
+        for inner_v in v:
+            try:
+                tmp.append(_getitem(k, inner_v, default))
+            except KeyError:
+                continue
+        return tmp
+
+
+class PathTrie(object):
+    """Trie of 'smart query' paths sharing their common prefixes.
+
+    It returns the same values as calling `get_value` with every path, but
+    walks the record once: a prefix shared by several paths, like
+    ``authors`` in ``authors.full_name`` and ``authors.affiliations``, is
+    looked up once and its list is iterated once for all of them.
+    """
+
+    def __init__(self, paths):
+        """Build the trie of the given paths."""
+        self.paths = []
+        self.root = self._node()
+
+        for path in paths:
+            if path in self.paths:
+                continue
+            self.paths.append(path)
+
+            node = self.root
+            for k in SPLIT_KEY_PATTERN.split(path):
+                node = node['keys'].setdefault(k, self._node())
+            node['paths'].append(path)
+
+    def extract(self, record, default=None):
+        """Return a dictionary with the value of every path in the record."""
+        result = {}
+        self._walk(self.root, record, default, result)
+
+        # Python regular keys take precedence, as in `get_value`.
+        if isinstance(record, dict):
+            for path in self.paths:
+                if path in record:
+                    result[path] = record[path]
+
+        return result
+
+    @staticmethod
+    def _node():
+        return {'keys': {}, 'paths': []}
+
+    def _walk(self, node, value, default, result):
+        for path in node['paths']:
+            result[path] = value
+
+        if isinstance(value, dict):
+            for k, child in six.iteritems(node['keys']):
+                if k in value:
+                    self._walk(child, value[k], default, result)
+                else:
+                    self._fill(child, default, result)
+            return
+
+        children = []
+        for k, child in six.iteritems(node['keys']):
+            if ']' in k:
+                self._walk(child, _getitem(k, value, default), default, result)
+            else:
+                children.append((k, child, []))
+
+        if not children:
+            return
+
+        for inner_v in value:
+            for k, child, values in children:
+                try:
+                    values.append(_getitem(k, inner_v, default))
+                except KeyError:
+                    continue
+
+        for k, child, values in children:
+            self._walk(child, values, default, result)
+
+    def _fill(self, node, default, result):
+        for path in node['paths']:
+            result[path] = default
+        for child in node['keys'].values():
+            self._fill(child, default, result)
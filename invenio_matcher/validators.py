@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Matcher validators filtering out the results already returned.
+
+Validators are called by ``match`` with the record and each result, and
+return whether the result is new, one result at a time so that the results
+never read are not remembered. Callers holding a whole list of results can
+validate it at once with ``validate``. They are thread-safe, so one of them can
+be shared by the matches of a batch, running in several threads.
+
+Remembering every id is exact but grows without limit on long streams:
+``LRUValidator`` only remembers the most recent ids and ``BloomValidator``
+trades a small rate of false duplicates for a fixed memory.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+
+import six
+
+
+class Validator(object):
+    """Base class of the validators remembering the ids of the results."""
+
+    def __init__(self):
+        """Initialize the validator."""
+        self._lock = threading.Lock()
+
+    def __call__(self, record, result):
+        """Return whether the result was not returned before."""
+        with self._lock:
+            return self._add(result.id)
+
+    def validate(self, record, results):
+        """Return the results not returned before, in order."""
+        with self._lock:
+            return [result for result in results if self._add(result.id)]
+
+    def _add(self, id_):
+        """Remember the id and return whether it is new."""
+        raise NotImplementedError()
+
+
+class SetValidator(Validator):
+    """Validator remembering all the ids."""
+
+    def __init__(self):
+        """Initialize the validator."""
+        super(SetValidator, self).__init__()
+        self.seen = set()
+
+    def _add(self, id_):
+        if id_ in self.seen:
+            return False
+        self.seen.add(id_)
+        return True
+
+
+class LRUValidator(Validator):
+    """Validator remembering the ``size`` most recently returned ids."""
+
+    def __init__(self, size=10000):
+        """Initialize the validator."""
+        super(LRUValidator, self).__init__()
+        self.size = size
+        self.seen = OrderedDict()
+
+    def _add(self, id_):
+        if id_ in self.seen:
+            del self.seen[id_]
+            self.seen[id_] = True
+            return False
+
+        self.seen[id_] = True
+        if len(self.seen) > self.size:
+            self.seen.popitem(last=False)
+        return True
+
+
+class BloomValidator(Validator):
+    """Validator remembering the ids in a Bloom filter.
+
+    New results are taken for duplicates with a probability ``error_rate``
+    as long as fewer than ``capacity`` ids were added, but duplicates are
+    never taken for new results.
+    """
+
+    def __init__(self, capacity=1000000, error_rate=0.001):
+        """Initialize the validator."""
+        super(BloomValidator, self).__init__()
+        size = int(math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.size = size
+        self.hashes = max(1, int(round(size / capacity * math.log(2))))
+        self.bits = bytearray((size + 7) // 8)
+
+    def _add(self, id_):
+        digest = hashlib.md5(
+            six.text_type(id_).encode('utf-8')).hexdigest()
+        first, second = int(digest[:16], 16), int(digest[16:], 16)
+
+        new = False
+        for i in range(self.hashes):
+            position = (first + i * second) % self.size
+            byte, mask = position // 8, 1 << (position % 8)
+            if not self.bits[byte] & mask:
+                self.bits[byte] |= mask
+                new = True
+        return new
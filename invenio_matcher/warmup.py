@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Warm up the matcher after the application starts.
+
+The first matches after a deploy pay for building the path tries and the
+normalizer pipelines, opening the connections to the search backend and
+filling its caches. Running `warmup` once at startup pays for all of them
+before the first record comes in.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import time
+from collections import OrderedDict
+
+import six
+
+
+def warmup(app, samples=None):
+    """Warm up the matcher of the application.
+
+    The sample searches default to ``MATCHER_WARMUP_SAMPLES``.
+
+    :return: an ordered dict of the seconds taken by each step.
+    """
+    if samples is None:
+        samples = app.config.get('MATCHER_WARMUP_SAMPLES')
+
+    queries = [
+        (index, doc_type, doc_type_queries)
+        for index, doc_types in six.iteritems(
+            app.config.get('MATCHER_QUERIES') or {})
+        for doc_type, doc_type_queries in six.iteritems(doc_types)
+    ]
+
+    timings = OrderedDict()
+    with app.app_context():
+        for step, func, args in (
+            ('plans', compile_plans, (queries,)),
+            ('search_client', open_search_client, ()),
+            ('samples', replay_samples, (samples or [],)),
+        ):
+            start = time.time()
+            func(*args)
+            timings[step] = time.time() - start
+
+    return timings
+
+
+def compile_plans(queries):
+    """Build the path tries and normalizer pipelines of the queries."""
+    from .core import _get_trie, get_paths
+    from .normalizers import compile_pipeline
+
+    for _, _, doc_type_queries in queries:
+        _get_trie(get_paths(doc_type_queries))
+        for query in doc_type_queries:
+            if query.get('normalize'):
+                compile_pipeline(query['normalize'])
+
+
+def open_search_client():
+    """Build the search client and open its first connection."""
+    from .proxies import current_matcher
+
+    current_matcher.search_client.ping()
+
+
+def replay_samples(samples):
+    """Run the sample matches, filling the caches of the search backend."""
+    from .api import match
+
+    for sample in samples:
+        list(match(sample['record'], sample['index'], sample['doc_type']))
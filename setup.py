@@ -34,6 +34,7 @@ history = open('CHANGES.rst').read()
 tests_require = [
     'check-manifest>=0.25',
     'coverage>=4.0',
+    'Flask-CeleryExt>=0.2.2',
     'mock>=1.0.0',
     'pydocstyle>=1.0.0',
     'pytest-cache>=1.0',
@@ -44,6 +45,9 @@ tests_require = [
 ]
 
 extras_require = {
+    'celery': [
+        'celery>=3.1.0',
+    ],
     'docs': [
         'Sphinx>=1.6.3',
     ],
@@ -53,6 +57,9 @@ extras_require = {
     'mysql': [
         'invenio-db[mysql]>=1.0.0a9',
     ],
+    'numpy': [
+        'numpy>=1.11.0',
+    ],
     'sqlite': [
         'invenio-db>=1.0.0a9',
     ],
@@ -98,9 +105,15 @@ setup(
     include_package_data=True,
     platforms='any',
     entry_points={
+        'flask.commands': [
+            'matcher = invenio_matcher.cli:matcher',
+        ],
         'invenio_base.apps': [
             'invenio_matcher = invenio_matcher:InvenioMatcher',
-        ]
+        ],
+        'invenio_db.models': [
+            'invenio_matcher = invenio_matcher.models',
+        ],
     },
     extras_require=extras_require,
     install_requires=install_requires,
@@ -36,6 +36,8 @@ from invenio_db import InvenioDB, db
 from invenio_records import InvenioRecords
 from invenio_search import InvenioSearch
 
+from invenio_matcher import InvenioMatcher
+
 
 @pytest.fixture()
 def app(request):
@@ -52,6 +54,7 @@ def app(request):
     InvenioDB(app)
     InvenioRecords(app)
     InvenioSearch(app)
+    InvenioMatcher(app)
 
     with app.app_context():
         db.create_all()
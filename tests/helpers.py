@@ -78,3 +78,126 @@ def no_queries(**kwargs):
 def single_query(**kwargs):
     """Return a single query."""
     return [{'type': 'exact', 'match': 'titles.title'}]
+
+
+class FakeClock(object):
+    """Clock advanced by hand instead of by time."""
+
+    def __init__(self):
+        """Start the clock at zero."""
+        self.now = 0
+
+    def __call__(self):
+        """Return the current time."""
+        return self.now
+
+    def sleep(self, seconds):
+        """Advance the clock instead of sleeping."""
+        self.now += seconds
+
+
+class FakeSearchClient(object):
+    """Search client injecting latency and errors.
+
+    Each search advances the clock by ``latency`` and returns the next of
+    ``responses``, raising it if it is an exception.
+    """
+
+    def __init__(self, responses, latency=0, clock=None):
+        """Initialize the client with the responses to return."""
+        self.responses = list(responses)
+        self.latency = latency
+        self.clock = clock
+        self.calls = []
+
+    def ping(self, **kwargs):
+        """Answer the ping without any latency."""
+        self.calls.append({'ping': True})
+        return True
+
+    def search(self, **kwargs):
+        """Return or raise the next response."""
+        self.calls.append(kwargs)
+        if self.clock:
+            self.clock.sleep(self.latency)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class FakeSearchBackend(object):
+    """Search client finding the documents having a term of the query.
+
+    It can be built by the extension from ``MATCHER_SEARCH_CLIENT``, so it
+    also works in worker processes.
+    """
+
+    def __init__(self, documents=None, **kwargs):
+        """Initialize the backend with documents by id."""
+        self.documents = documents or {}
+
+    def ping(self, **kwargs):
+        """Answer the ping."""
+        return True
+
+    def search(self, index, doc_type, body, **kwargs):
+        """Return the documents having one of the terms of the body."""
+        terms = list(_find_terms(body))
+        hits = [
+            {'_id': id_, '_source': source, '_score': 1.0,
+             '_index': index, '_type': doc_type}
+            for id_, source in sorted(self.documents.items())
+            if any(source.get(field) == value for field, value in terms)
+        ]
+        return {'hits': {'hits': hits, 'total': len(hits)}}
+
+
+def _find_terms(body):
+    """Yield the field and value of the term filters of a query."""
+    if isinstance(body, dict):
+        for key, value in body.items():
+            if key == 'term':
+                for item in value.items():
+                    yield item
+            else:
+                for term in _find_terms(value):
+                    yield term
+    elif isinstance(body, list):
+        for value in body:
+            for term in _find_terms(value):
+                yield term
+
+
+class FakeScrollClient(object):
+    """Search client returning all the records in a single scroll page."""
+
+    def __init__(self, records):
+        """Initialize the client with records of ``(id, source)``."""
+        self.records = records
+
+    def search(self, **kwargs):
+        """Return the first page of the scroll."""
+        return self._page(self.records)
+
+    def scroll(self, scroll_id, **kwargs):
+        """Return the end of the scroll."""
+        return self._page([])
+
+    def clear_scroll(self, **kwargs):
+        """Clear nothing."""
+
+    @staticmethod
+    def _page(records):
+        return {
+            '_scroll_id': 'scroll',
+            '_shards': {'successful': 1, 'total': 1},
+            'hits': {'hits': [
+                {'_id': id_, '_source': source} for id_, source in records
+            ]},
+        }
+
+
+def title_similarity(record, other):
+    """Return 1 if both records have the same title, 0 otherwise."""
+    return int(record.get('title') == other.get('title'))
@@ -26,14 +26,21 @@
 
 from __future__ import absolute_import, print_function
 
+import heapq
+
 import mock
 import pytest
 
-from invenio_matcher.api import match
+from invenio_matcher import core
+
+from invenio_matcher.api import _combine_exact_queries, match, \
+    match_batch, match_ranked, match_targets
+from invenio_matcher.deadline import Deadline
 from invenio_matcher.errors import NoQueryDefined
 from invenio_matcher.models import MatchResult
 
-from .helpers import duplicated_result, empty_search_result, one_search_result
+from .helpers import FakeClock, duplicated_result, empty_search_result, \
+    one_search_result, single_result
 
 
 def test_match_no_queries(app, simple_record):
@@ -151,3 +158,513 @@ def test_match_with_validator(app, simple_record, mocker):
         ))
 
         assert expected == result
+
+
+def test_match_passes_remaining_budget(app, simple_record, mocker):
+    """Give each search the remaining time budget as its timeout."""
+    from invenio_records import Record
+    execute = mocker.patch('invenio_matcher.api.execute', return_value=[])
+
+    app.config.update(dict(MATCHER_TIMEOUT=10))
+    with app.app_context():
+        record = Record(simple_record)
+        queries = [{'type': 'exact', 'match': 'title'}]
+
+        list(match(record, 'records', 'record', queries=queries))
+
+        request_timeout = execute.call_args[1]['request_timeout']
+        assert 0 < request_timeout <= 10
+        assert execute.call_args[1]['deadline'].timeout == 10
+
+
+def test_match_skips_queries_after_deadline(app, simple_record, mocker):
+    """Skip the remaining queries when the budget runs out."""
+    from invenio_records import Record
+    execute = mocker.patch('invenio_matcher.api.execute', return_value=[])
+
+    with app.app_context():
+        record = Record(simple_record)
+        queries = [{'type': 'exact', 'match': 'title'}]
+        deadline = Deadline(0)
+
+        result = list(match(
+            record, 'records', 'record', queries=queries, deadline=deadline))
+
+        assert result == []
+        assert deadline.partial
+        assert not execute.called
+
+
+def test_match_stops_on_timeout_after_deadline(app, simple_record, mocker):
+    """Return partial results when a search times out with the budget."""
+    from elasticsearch.exceptions import ConnectionTimeout
+    from invenio_records import Record
+
+    deadline = Deadline(10)
+
+    def execute(index, doc_type, query, record, **kwargs):
+        if query['match'] == 'title':
+            return single_result(query, record)
+        deadline.expires_at = 0
+        raise ConnectionTimeout('TIMEOUT', 'timed out', None)
+
+    mocker.patch('invenio_matcher.api.execute', execute)
+
+    with app.app_context():
+        record = Record(simple_record)
+        queries = [
+            {'type': 'exact', 'match': 'title'},
+            {'type': 'fuzzy', 'match': 'abstract'},
+        ]
+
+        expected = [MatchResult(1, record, 1)]
+        result = list(match(
+            record, 'records', 'record', queries=queries, deadline=deadline))
+
+        assert expected == result
+        assert deadline.partial
+
+
+def test_match_records_query_of_results(app, simple_record, mocker):
+    """Record in each result the query that found it."""
+    from invenio_records import Record
+    mocker.patch('invenio_matcher.engine.search', one_search_result)
+
+    with app.app_context():
+        record = Record(simple_record)
+        queries = [{'type': 'exact', 'match': 'title'}]
+
+        result = list(match(record, 'records', 'record', queries=queries))
+
+        assert result[0].query == {'type': 'exact', 'match': 'title'}
+
+
+def test_match_excludes_seen_ids(app, simple_record, mocker):
+    """Exclude from each query the ids returned by the previous ones."""
+    from invenio_records import Record
+    execute = mocker.patch('invenio_matcher.api.execute',
+                           side_effect=duplicated_result)
+
+    with app.app_context():
+        record = Record(simple_record)
+        queries = [
+            {'type': 'exact', 'match': 'title'},
+            {'type': 'fuzzy', 'match': 'title'},
+        ]
+
+        result = list(match(
+            record, 'records', 'record', queries=queries, exclude_seen=True))
+
+        assert result == [MatchResult(1, record, 1)]
+        assert 'exclude_ids' not in execute.call_args_list[0][1]
+        assert execute.call_args_list[1][1]['exclude_ids'] == [1]
+
+
+def test_match_with_scheduler(app, simple_record, mocker):
+    """Run the queries in the order of the scheduler and feed it back."""
+    from invenio_records import Record
+    exact = {'type': 'exact', 'match': 'doi'}
+    fuzzy = {'type': 'fuzzy', 'match': 'title'}
+
+    def execute(index, doc_type, query, record, **kwargs):
+        if query is exact:
+            return [MatchResult(1, record, 1)]
+        return []
+
+    execute = mocker.patch('invenio_matcher.api.execute',
+                           side_effect=execute)
+    app.config['MATCHER_SCHEDULER'] = {}
+
+    with app.app_context():
+        record = Record(simple_record)
+        for _ in range(3):
+            list(match(record, 'records', 'record', queries=[fuzzy, exact],
+                       validator=lambda record, result: True))
+
+    assert [c[0][2] for c in execute.call_args_list] == [
+        fuzzy, exact, exact, fuzzy, exact, fuzzy]
+
+
+def _execute_returning(results_by_match):
+    """Return an execute returning results of the given ids and scores."""
+    def execute(index, doc_type, query, record, **kwargs):
+        return [MatchResult(id_, {}, score)
+                for id_, score in results_by_match[query['match']]]
+
+    return execute
+
+
+def test_match_run_if_no_match(app, simple_record, mocker):
+    """Skip the queries to run only when nothing matched before."""
+    execute = mocker.patch('invenio_matcher.api.execute', side_effect=(
+        _execute_returning({'doi': [(1, 1)], 'arxiv': [], 'title': [(2, 1)]})))
+    queries = [
+        {'type': 'exact', 'match': 'doi'},
+        {'type': 'fuzzy', 'match': 'title', 'run_if_no_match': True},
+    ]
+
+    with app.app_context():
+        result = list(match(simple_record, 'records', 'record',
+                            queries=queries))
+        assert [r.id for r in result] == [1]
+        assert execute.call_count == 1
+
+        queries[0]['match'] = 'arxiv'
+        result = list(match(simple_record, 'records', 'record',
+                            queries=queries, validator=lambda *args: True))
+        assert [r.id for r in result] == [2]
+        assert execute.call_count == 3
+
+
+def test_match_stop_if_score_above(app, simple_record, mocker):
+    """Stop after a result scoring above the threshold of its query."""
+    execute = mocker.patch('invenio_matcher.api.execute', side_effect=(
+        _execute_returning({'doi': [(1, 5), (2, 20), (3, 30)],
+                            'title': [(4, 1)]})))
+    queries = [
+        {'type': 'exact', 'match': 'doi', 'stop_if_score_above': 10},
+        {'type': 'fuzzy', 'match': 'title'},
+    ]
+
+    with app.app_context():
+        result = list(match(simple_record, 'records', 'record',
+                            queries=queries))
+
+    assert [r.id for r in result] == [1, 2]
+    assert execute.call_count == 1
+
+
+def test_match_max_results(app, simple_record, mocker):
+    """Return at most the given number of results of a query."""
+    mocker.patch('invenio_matcher.api.execute', side_effect=(
+        _execute_returning({'title': [(1, 3), (1, 3), (2, 2), (3, 1)],
+                            'doi': [(4, 1)]})))
+    queries = [
+        {'type': 'fuzzy', 'match': 'title', 'max_results': 2},
+        {'type': 'exact', 'match': 'doi'},
+    ]
+
+    with app.app_context():
+        result = list(match(simple_record, 'records', 'record',
+                            queries=queries))
+
+    assert [r.id for r in result] == [1, 2, 4]
+
+
+def _execute_with_query(results_by_match):
+    """Return an execute returning results of the query, best first."""
+    def execute(index, doc_type, query, record, **kwargs):
+        return [MatchResult(id_, {}, score, query=query)
+                for id_, score in results_by_match[query['match']]]
+
+    return execute
+
+
+def test_match_ranked(app, simple_record, mocker):
+    """Merge the results of the queries on normalised, combined scores."""
+    mocker.patch('invenio_matcher.api.execute', side_effect=(
+        _execute_with_query({
+            'doi': [(1, 20)],
+            'title': [(2, 40), (1, 20), (3, 10)],
+            'abstract': [(3, 2), (4, 1)],
+        })))
+    queries = [
+        {'type': 'exact', 'match': 'doi', 'weight': 2},
+        {'type': 'fuzzy', 'match': 'title'},
+        {'type': 'fuzzy', 'match': 'abstract', 'weight': 0.5},
+    ]
+
+    with app.app_context():
+        result = match_ranked(simple_record, 'records', 'record', size=3,
+                              queries=queries, exclude_seen=True)
+
+    assert [(r.id, r.score) for r in result] == [
+        (1, 2.5), (2, 1), (3, 0.75)]
+    assert result[0].matched_queries == queries[:2]
+
+
+def test_match_ranked_with_raw_scores(app, simple_record, mocker):
+    """Add up the raw scores without normalising them."""
+    mocker.patch('invenio_matcher.api.execute', side_effect=(
+        _execute_with_query({'doi': [(1, 3), (1, 3)], 'title': [(2, 5)]})))
+    queries = [
+        {'type': 'exact', 'match': 'doi'},
+        {'type': 'fuzzy', 'match': 'title'},
+    ]
+
+    with app.app_context():
+        result = match_ranked(simple_record, 'records', 'record',
+                              queries=queries, normalize=False)
+
+    assert [(r.id, r.score) for r in result] == [(2, 5), (1, 3)]
+
+
+def test_match_ranked_normalises_by_the_best_score(
+        app, simple_record, mocker):
+    """Divide by the best score of a query, wherever its hit comes."""
+    mocker.patch('invenio_matcher.api.execute', side_effect=(
+        _execute_with_query({'title': [(1, 5), (2, 20)]})))
+
+    with app.app_context():
+        result = match_ranked(simple_record, 'records', 'record',
+                              queries=[{'type': 'fuzzy', 'match': 'title'}])
+
+    assert [(r.id, r.score) for r in result] == [(2, 1), (1, 0.25)]
+
+
+def test_match_ranked_uses_similarity(app, simple_record, mocker):
+    """Use the similarity of re-ranked results instead of their score."""
+    def execute(index, doc_type, query, record, **kwargs):
+        if query['match'] == 'doi':
+            return [MatchResult(2, {}, 3, query=query)]
+        return [MatchResult(1, {}, 5, similarity=0.75, query=query),
+                MatchResult(2, {}, 20, similarity=0.5, query=query)]
+
+    mocker.patch('invenio_matcher.api.execute', side_effect=execute)
+    queries = [
+        {'type': 'exact', 'match': 'doi'},
+        {'type': 'fuzzy', 'match': 'title', 'rerank': {'text': ['title']}},
+    ]
+
+    with app.app_context():
+        result = match_ranked(simple_record, 'records', 'record',
+                              queries=queries)
+
+    assert [(r.id, r.score) for r in result] == [(2, 1.5), (1, 0.75)]
+
+
+def test_match_ranked_keeps_the_best_candidates(app, simple_record, mocker):
+    """Hold at most twice the maximum number of candidates."""
+    hits = [(i, 100 - i) for i in range(50)]
+    mocker.patch('invenio_matcher.api.execute', side_effect=(
+        _execute_with_query({'title': hits})))
+    nlargest = mocker.spy(heapq, 'nlargest')
+
+    with app.app_context():
+        result = match_ranked(
+            simple_record, 'records', 'record', size=2, max_candidates=5,
+            queries=[{'type': 'fuzzy', 'match': 'title'}])
+
+    assert [r.id for r in result] == [0, 1]
+    assert nlargest.call_count > 1
+
+
+def test_match_shared_validator_keeps_unread_results(
+        app, simple_record, mocker):
+    """Only remember in a shared validator the results actually yielded."""
+    from invenio_matcher.validators import LRUValidator
+    mocker.patch('invenio_matcher.api.execute', side_effect=(
+        _execute_returning({'doi': [(1, 1), (2, 1)],
+                            'title': [(3, 5), (4, 1)]})))
+    validator = LRUValidator(size=10)
+    doi = [{'type': 'exact', 'match': 'doi'}]
+    title = [{'type': 'fuzzy', 'match': 'title', 'stop_if_score_above': 2}]
+
+    with app.app_context():
+        first = next(match(simple_record, 'records', 'record',
+                           queries=doi, validator=validator))
+        second = list(match(simple_record, 'records', 'record',
+                            queries=doi, validator=validator))
+        third = list(match(simple_record, 'records', 'record',
+                           queries=title, validator=validator))
+        fourth = list(match(simple_record, 'records', 'record',
+                            queries=title, validator=validator))
+
+    assert first.id == 1
+    assert [r.id for r in second] == [2]
+    assert [r.id for r in third] == [3]
+    assert [r.id for r in fourth] == [4]
+
+
+def test_match_default_validator(app, simple_record, mocker):
+    """Build the default validator of each match from the configuration."""
+    mocker.patch('invenio_matcher.api.execute', side_effect=(
+        _execute_returning({'doi': [(1, 1), (1, 1)]})))
+    app.config['MATCHER_VALIDATOR'] = \
+        'invenio_matcher.validators:BloomValidator'
+
+    with app.app_context():
+        for _ in range(2):
+            result = list(match(simple_record, 'records', 'record',
+                                queries=[{'type': 'exact', 'match': 'doi'}]))
+            assert [r.id for r in result] == [1]
+
+
+def test_match_with_scheduler_and_conditions(app, simple_record, mocker):
+    """Never run a conditional query before the queries it depends on."""
+    doi = {'type': 'exact', 'match': 'doi'}
+    title = {'type': 'fuzzy', 'match': 'title', 'run_if_no_match': True}
+    execute = mocker.patch('invenio_matcher.api.execute', side_effect=(
+        _execute_returning({'doi': [(1, 1)], 'title': [(2, 1)]})))
+    app.config['MATCHER_SCHEDULER'] = {}
+
+    with app.app_context():
+        scheduler = app.extensions['invenio-matcher'].scheduler
+        for _ in range(10):
+            scheduler.record('records', 'record', doi, 1, False)
+        for _ in range(3):
+            result = list(match(simple_record, 'records', 'record',
+                                queries=[doi, title]))
+            assert [r.id for r in result] == [1]
+
+    assert [c[0][2] for c in execute.call_args_list] == [doi, doi, doi]
+
+
+def test_match_with_scheduler_times_only_the_searches(
+        app, simple_record, mocker):
+    """Leave the time spent by the caller out of the latency."""
+    clock = FakeClock()
+    mocker.patch('invenio_matcher.api.time.time', clock)
+
+    def execute(index, doc_type, query, record, **kwargs):
+        clock.sleep(0.1)
+        for i in range(3):
+            clock.sleep(0.01)
+            yield MatchResult(i, record, 1)
+
+    mocker.patch('invenio_matcher.api.execute', side_effect=execute)
+    app.config['MATCHER_SCHEDULER'] = {}
+    query = {'type': 'exact', 'match': 'doi'}
+
+    with app.app_context():
+        scheduler = app.extensions['invenio-matcher'].scheduler
+        record_stats = mocker.spy(scheduler, 'record')
+        for result in match(simple_record, 'records', 'record',
+                            queries=[query]):
+            clock.sleep(0.2)
+
+    args = record_stats.call_args[0]
+    assert args[2] == query
+    assert args[3] == pytest.approx(0.13)
+    assert args[4] is True
+
+
+def test_combine_exact_queries():
+    """Group the plain exact queries in the place of the first one."""
+    queries = [
+        {'type': 'fuzzy', 'match': 'title'},
+        {'type': 'exact', 'match': 'doi'},
+        {'type': 'exact', 'match': 'isbn', 'boost': 2},
+        {'type': 'exact', 'match': 'arxiv', 'with': 'arxiv_eprints.value'},
+    ]
+
+    assert _combine_exact_queries(queries) == [
+        queries[0], [queries[1], queries[3]], queries[2]]
+    assert _combine_exact_queries(queries[:3]) == queries[:3]
+
+
+def test_match_with_combined_exact_queries(app, simple_record, mocker):
+    """Send the plain exact queries in a single search."""
+    from invenio_records import Record
+    execute = mocker.patch('invenio_matcher.api.execute', return_value=[])
+    execute_combined = mocker.patch(
+        'invenio_matcher.api.execute_combined', side_effect=duplicated_result)
+
+    app.config.update(dict(MATCHER_COMBINE_EXACT=True))
+    with app.app_context():
+        record = Record(simple_record)
+        queries = [
+            {'type': 'exact', 'match': 'title'},
+            {'type': 'exact', 'match': 'doi'},
+            {'type': 'fuzzy', 'match': 'title'},
+        ]
+
+        result = list(match(record, 'records', 'record', queries=queries))
+
+        assert result == [MatchResult(1, record, 1)]
+        assert execute_combined.call_args[0][2] == queries[:2]
+        assert execute.call_args[0][2] == queries[2]
+
+
+def test_match_with_extracted_values(app, simple_record, mocker):
+    """Use the values extracted beforehand."""
+    from invenio_records import Record
+    execute = mocker.patch('invenio_matcher.api.execute', return_value=[])
+    extract_values = mocker.patch('invenio_matcher.api.extract_values')
+
+    with app.app_context():
+        record = Record(simple_record)
+        queries = [{'type': 'exact', 'match': 'title'}]
+
+        list(match(record, 'records', 'record', queries=queries,
+                   extracted={'title': ['qux']}))
+
+        assert not extract_values.called
+        assert execute.call_args[1]['extracted'] == {'title': ['qux']}
+
+
+def test_match_batch(app, mocker):
+    """Match each record of the batch with the same queries."""
+    queries = [{'type': 'exact', 'match': 'title'}]
+    get_queries = mocker.patch(
+        'invenio_matcher.api.get_queries', return_value=queries)
+
+    def match(record, index, doc_type, **kwargs):
+        kwargs.pop('extracted')
+        assert kwargs == {'queries': queries, 'timeout': 1}
+        if record['title'] == 'foo':
+            yield MatchResult(1, record, 1)
+
+    mocker.patch('invenio_matcher.api.match', match)
+
+    with app.app_context():
+        result = match_batch([{'title': 'foo'}, {'title': 'bar'}],
+                             'records', 'record', timeout=1)
+
+    assert [[r.id for r in results] for results in result] == [[1], []]
+    assert get_queries.call_count == 1
+
+
+def test_match_batch_extracts_columns(app, mocker):
+    """Extract and normalize the values of the batch column by column."""
+    pytest.importorskip('numpy')
+    queries = [
+        {'type': 'exact', 'match': 'doi',
+         'normalize': [{'type': 'strip_prefix', 'prefixes': ['doi:']}]},
+        {'type': 'fuzzy', 'match': 'title'},
+    ]
+    execute = mocker.patch('invenio_matcher.api.execute', return_value=[])
+
+    with app.app_context():
+        match_batch([{'doi': 'doi:doi:10.1/a', 'title': 'foo'},
+                     {'title': ['bar', ['baz']]}],
+                    'records', 'record', queries=queries)
+
+    first = execute.call_args_list[0][1]['extracted']
+    second = execute.call_args_list[2][1]['extracted']
+    key = core.get_normalized_key('doi', queries[0]['normalize'])
+    assert first['title'] == ['foo']
+    assert first[key] == ['doi:10.1/a']
+    assert second['title'] == ['bar', ['baz']]
+
+
+def test_match_targets(app, simple_record, mocker):
+    """Merge the best results of several indices on normalised scores."""
+    results = {
+        'hep': [MatchResult(i, {}, score, index='hep')
+                for i, score in enumerate([10, 40, 20, 5])],
+        'conferences': [MatchResult(i, {}, score, index='conferences')
+                        for i, score in enumerate([1, 2])],
+        'jobs': [],
+    }
+
+    def match(record, index, doc_type, **kwargs):
+        assert kwargs == {'timeout': 1}
+        for result in results[index]:
+            yield result
+
+    mocker.patch('invenio_matcher.api.match', match)
+
+    with app.app_context():
+        targets = [('hep', 'hep'), ('conferences', 'conference'),
+                   ('jobs', 'job')]
+        result = match_targets(simple_record, targets, size=3, timeout=1)
+
+    assert [(r.index, r.score) for r in result] == [
+        ('hep', 1), ('conferences', 1), ('hep', 0.5)]
+
+
+def test_match_targets_without_targets(app, simple_record):
+    """Return no results without targets."""
+    with app.app_context():
+        assert match_targets(simple_record, []) == []
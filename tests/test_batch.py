@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2016 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Batch matching tests."""
+
+from __future__ import absolute_import, print_function
+
+import gzip
+import io
+import json
+
+import pytest
+from click.testing import CliRunner
+from flask.cli import ScriptInfo
+
+from invenio_matcher.batch import count_lines, match_file, \
+    truncate_partial_line
+from invenio_matcher.cli import matcher
+
+
+@pytest.fixture
+def batch_app(app, tmpdir):
+    """Application matching titles against a fake search backend."""
+    app.config.update(
+        MATCHER_QUERIES={
+            'records': {'record': [{'type': 'exact', 'match': 'title'}]},
+        },
+        MATCHER_SEARCH_CLIENT='tests.helpers:FakeSearchBackend',
+        MATCHER_SEARCH_CLIENT_CONFIG={
+            'documents': {
+                'a': {'title': 'foo'},
+                'b': {'title': 'bar'},
+            },
+        },
+    )
+    return app
+
+
+def _write_records(path, records, compress=False):
+    """Write the records as JSON lines."""
+    data = ''.join(json.dumps(record) + '\n' for record in records)
+    if compress:
+        with gzip.open(path, 'wb') as fp:
+            fp.write(data.encode('utf-8'))
+    else:
+        with io.open(path, 'w', encoding='utf-8') as fp:
+            fp.write(data)
+
+
+def _read_results(path):
+    """Read the JSON lines of the results."""
+    with io.open(path, encoding='utf-8') as fp:
+        return [json.loads(line) for line in fp]
+
+
+RECORDS = [
+    {'title': 'foo'},
+    {'title': 'baz'},
+    {'title': 'bar'},
+    {'title': 'foo'},
+    {'title': 'qux'},
+]
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_match_file(batch_app, tmpdir, compress):
+    """Write the results of every record in input order."""
+    input_path = str(tmpdir.join('records.jsonl.gz' if compress
+                                 else 'records.jsonl'))
+    output_path = str(tmpdir.join('results.jsonl'))
+    _write_records(input_path, RECORDS, compress=compress)
+    progress = []
+
+    with batch_app.app_context():
+        stats = match_file(input_path, output_path, 'records', 'record',
+                           processes=2, batch_size=2,
+                           progress=lambda stats: progress.append(
+                               stats['records']))
+
+    results = _read_results(output_path)
+    assert [result['position'] for result in results] == [0, 1, 2, 3, 4]
+    assert [[match['id'] for match in result['matches']]
+            for result in results] == [['a'], [], ['b'], ['a'], []]
+    assert stats['records'] == 5
+    assert stats['matched'] == 3
+    assert stats['throughput'] > 0
+    assert progress == [2, 4, 5]
+
+
+def test_match_file_from_offset(batch_app, tmpdir):
+    """Skip the records before the offset."""
+    input_path = str(tmpdir.join('records.jsonl'))
+    output_path = str(tmpdir.join('results.jsonl'))
+    _write_records(input_path, RECORDS)
+
+    with batch_app.app_context():
+        stats = match_file(input_path, output_path, 'records', 'record',
+                           processes=1, batch_size=2, offset=3)
+
+    results = _read_results(output_path)
+    assert [result['position'] for result in results] == [3, 4]
+    assert stats['records'] == 2
+
+
+def test_match_file_skips_blank_lines(batch_app, tmpdir):
+    """Do not count blank lines as records."""
+    input_path = str(tmpdir.join('records.jsonl'))
+    output_path = str(tmpdir.join('results.jsonl'))
+    with io.open(input_path, 'w', encoding='utf-8') as fp:
+        fp.write(u'{"title": "foo"}\n\n  \n{"title": "bar"}\n\n')
+
+    with batch_app.app_context():
+        stats = match_file(input_path, output_path, 'records', 'record',
+                           processes=1, batch_size=2)
+
+    results = _read_results(output_path)
+    assert [result['position'] for result in results] == [0, 1]
+    assert [[match['id'] for match in result['matches']]
+            for result in results] == [['a'], ['b']]
+    assert stats['records'] == 2
+
+
+def test_match_file_saves_scheduler_statistics(batch_app, tmpdir):
+    """Save the statistics of the scheduler of each worker at the end."""
+    input_path = str(tmpdir.join('records.jsonl'))
+    output_path = str(tmpdir.join('results.jsonl'))
+    stats_path = str(tmpdir.join('scheduler.json'))
+    _write_records(input_path, RECORDS)
+    batch_app.config['MATCHER_SCHEDULER'] = {
+        'path': stats_path, 'decay': 1, 'save_every': 1000}
+
+    with batch_app.app_context():
+        match_file(input_path, output_path, 'records', 'record',
+                   processes=2, batch_size=2)
+
+    with open(stats_path) as fp:
+        stats = json.load(fp)['records']['record']
+    assert [query['runs'] for query in stats.values()] == [5]
+
+
+def test_count_lines(tmpdir):
+    """Count the complete lines of a file, even a missing one."""
+    path = str(tmpdir.join('results.jsonl'))
+    assert count_lines(path) == 0
+
+    with open(path, 'w') as fp:
+        fp.write('{}\n{}\n{"pos')
+    assert count_lines(path) == 2
+
+
+def test_truncate_partial_line(tmpdir):
+    """Drop a last line without its newline."""
+    path = str(tmpdir.join('results.jsonl'))
+    truncate_partial_line(path)
+
+    with open(path, 'w') as fp:
+        fp.write('{}\n{}\n{"pos')
+    truncate_partial_line(path)
+    with open(path) as fp:
+        assert fp.read() == '{}\n{}\n'
+
+    truncate_partial_line(path)
+    assert count_lines(path) == 2
+
+
+def test_run_command_resumes(batch_app, tmpdir):
+    """Append the results of the records not yet in the output."""
+    input_path = str(tmpdir.join('records.jsonl'))
+    output_path = str(tmpdir.join('results.jsonl'))
+    _write_records(input_path, RECORDS)
+    with open(output_path, 'w') as fp:
+        fp.write(json.dumps({'position': 0, 'matches': []}) + '\n')
+        fp.write(json.dumps({'position': 1, 'matches': []}) + '\n')
+
+    runner = CliRunner()
+    script_info = ScriptInfo(create_app=lambda info=None: batch_app)
+    result = runner.invoke(
+        matcher,
+        ['run', input_path, output_path, '-i', 'records', '-t', 'record',
+         '-p', '1', '--resume'],
+        obj=script_info)
+
+    assert result.exit_code == 0
+    assert 'Matched 3 records' in result.output
+    assert [result['position'] for result in _read_results(output_path)] == \
+        [0, 1, 2, 3, 4]
+
+
+def test_run_command_resumes_from_offset(batch_app, tmpdir):
+    """Resume after the offset and the complete lines of the output."""
+    input_path = str(tmpdir.join('records.jsonl'))
+    output_path = str(tmpdir.join('results.jsonl'))
+    _write_records(input_path, RECORDS)
+    with open(output_path, 'w') as fp:
+        fp.write(json.dumps({'position': 1, 'matches': []}) + '\n')
+        fp.write('{"position": 2, "ma')
+
+    runner = CliRunner()
+    script_info = ScriptInfo(create_app=lambda info=None: batch_app)
+    result = runner.invoke(
+        matcher,
+        ['run', input_path, output_path, '-i', 'records', '-t', 'record',
+         '-p', '1', '--offset', '1', '--resume'],
+        obj=script_info)
+
+    assert result.exit_code == 0
+    assert 'Matched 3 records' in result.output
+    assert [result['position'] for result in _read_results(output_path)] == \
+        [1, 2, 3, 4]
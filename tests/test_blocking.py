@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test Matcher blocking keys."""
+
+from __future__ import absolute_import, print_function
+
+import pytest
+
+from invenio_matcher.blocking import get_blocking_fields, \
+    get_blocking_filters, get_blocking_keys, get_neighbour_keys, owns_pair
+from invenio_matcher.errors import InvalidQuery
+
+
+@pytest.fixture
+def blocking():
+    """Blocking on year, first author initial and document type."""
+    return [
+        {'type': 'range', 'match': 'year', 'delta': 1},
+        {'type': 'prefix', 'match': 'authors[0].full_name',
+         'with': 'authors.full_name'},
+        {'type': 'term', 'match': 'document_type'},
+    ]
+
+
+def test_get_blocking_filters(blocking):
+    """Build filters from the values of the record."""
+    record = {
+        'year': '2011-05-03',
+        'authors': [{'full_name': 'Doe, John'}, {'full_name': 'Roe, J.'}],
+        'document_type': ['article', 'article'],
+    }
+
+    expected = [
+        {'range': {'year': {'gte': 2010, 'lte': 2012}}},
+        {'bool': {'should': [{'prefix': {'authors.full_name': 'd'}}]}},
+        {'terms': {'document_type': ['article']}},
+    ]
+    result = get_blocking_filters(record, blocking)
+
+    assert expected == result
+
+
+def test_get_blocking_filters_skips_missing_values(blocking):
+    """Do not narrow the block on values missing from the record."""
+    record = {'year': 2011, 'document_type': None}
+
+    expected = [{'range': {'year': {'gte': 2010, 'lte': 2012}}}]
+    result = get_blocking_filters(record, blocking)
+
+    assert expected == result
+
+
+def test_get_blocking_keys(blocking):
+    """Group records sharing blocking values."""
+    record = {'year': 2011, 'authors': [{'full_name': 'Doe, John'}]}
+
+    assert get_blocking_keys(record, blocking) == (1005, 'd', None)
+
+
+def test_get_neighbour_keys(blocking):
+    """Put records in the blocks of the next ranges too."""
+    assert get_neighbour_keys((1005, 'd', None), blocking) == [
+        (1005, 'd', None), (1006, 'd', None)]
+    assert get_neighbour_keys((None, 'd', None), blocking) == [
+        (None, 'd', None)]
+    assert get_neighbour_keys((2011,), [{'type': 'range', 'match': 'year'}]) \
+        == [(2011,)]
+
+
+def test_owns_pair_straddling_a_bucket_edge(blocking):
+    """Compare values within delta on both sides of a bucket edge once."""
+    year = [blocking[0]]
+    key_a = get_blocking_keys({'year': 2011}, year)
+    key_b = get_blocking_keys({'year': 2012}, year)
+    assert key_a != key_b
+
+    shared = set(get_neighbour_keys(key_a, year)) & \
+        set(get_neighbour_keys(key_b, year))
+    assert [key for key in shared if owns_pair(key, key_a, key_b)] == \
+        [key_b]
+
+    key_c = get_blocking_keys({'year': 2010}, year)
+    shared = set(get_neighbour_keys(key_a, year)) & \
+        set(get_neighbour_keys(key_c, year))
+    assert [key for key in shared if owns_pair(key, key_a, key_c)] == \
+        [key_a]
+
+
+def test_get_blocking_fields(blocking):
+    """Return the fields read by the blocking keys."""
+    assert get_blocking_fields(blocking) == [
+        'authors.full_name', 'document_type', 'year']
+
+
+def test_invalid_blocking_key():
+    """Raise for unknown blocking key types."""
+    with pytest.raises(InvalidQuery):
+        get_blocking_filters({'year': 2011}, [{'type': 'x', 'match': 'year'}])
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test Matcher clusters of duplicates."""
+
+from __future__ import absolute_import, print_function
+
+from invenio_matcher.cluster import DuplicateClusters
+from invenio_matcher.models import MatchResult
+
+
+def test_union_is_transitive():
+    """Put A, B and C in one cluster when A matches B and B matches C."""
+    clusters = DuplicateClusters()
+    clusters.add_pairs([('a', 'b'), ('b', 'c'), ('d', 'e')])
+
+    assert clusters.find('a') == clusters.find('c')
+    assert clusters.find('a') != clusters.find('d')
+    assert sorted(clusters.cluster('c')) == ['a', 'b', 'c']
+    assert sorted(sorted(c) for c in clusters.clusters()) == [
+        ['a', 'b', 'c'], ['d', 'e']]
+
+
+def test_union_returns_whether_merged():
+    """Tell whether a union merged two different clusters."""
+    clusters = DuplicateClusters()
+
+    assert clusters.union(1, 2)
+    assert not clusters.union(2, 1)
+
+
+def test_add_matches():
+    """Merge a record with the results of its match."""
+    clusters = DuplicateClusters()
+    clusters.add_matches(1, [MatchResult(2, {}, 1), MatchResult(3, {}, 1)])
+    clusters.add_matches(4, [])
+
+    assert sorted(clusters.cluster(3)) == [1, 2, 3]
+    assert clusters.cluster(4) == [4]
+    assert clusters.cluster(5) == [5]
+    assert len(clusters) == 4
+
+
+def test_path_compression():
+    """Point every record of a found path directly to the root."""
+    clusters = DuplicateClusters()
+    for i in range(8):
+        clusters.add(i)
+    for step in (1, 2, 4):
+        for i in range(0, 8, 2 * step):
+            clusters.union(i, i + step)
+
+    root = clusters._find(7)
+
+    assert clusters.parent[7] == root
+    assert clusters.rank[root] == 3
+
+
+def test_save_and_load(tmpdir):
+    """Persist the clusters and keep merging after loading them."""
+    path = str(tmpdir.join('clusters'))
+    clusters = DuplicateClusters()
+    clusters.add_pairs([('a', 'b'), ('c', 'd')])
+    clusters.save(path)
+
+    loaded = DuplicateClusters.load(path)
+    loaded.union('b', 'c')
+    loaded.union('e', 'f')
+
+    assert 'a' in loaded
+    assert sorted(loaded.cluster('a')) == ['a', 'b', 'c', 'd']
+    assert sorted(loaded.cluster('f')) == ['e', 'f']
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test Matcher columnar extraction."""
+
+from __future__ import absolute_import, print_function
+
+import pytest
+
+from invenio_matcher.core import get_normalized_key
+from invenio_matcher.normalizers import compile_pipeline
+
+np = pytest.importorskip('numpy')
+
+from invenio_matcher.columns import ValueColumn, coalesce, \
+    extract_columns, get_row  # noqa: E402
+
+RECORDS = [
+    {'dois': [{'value': 'DOI:10.1/A'}, {'value': '10.1/a'}],
+     'arxiv': '1234.5678'},
+    {'titles': [{'title': 'foo'}]},
+    {'dois': [{'value': '10.1/B'}], 'arxiv': ['0000.0001', '0000.0002']},
+]
+
+QUERIES = [
+    {'type': 'exact', 'match': 'dois.value'},
+    {'type': 'exact', 'match': 'arxiv'},
+    {'type': 'fuzzy', 'match': 'titles.title'},
+]
+
+
+def test_extract_columns():
+    """Store the values of each path in offsets and a flat array."""
+    columns = extract_columns(RECORDS, QUERIES)
+
+    dois = columns['dois.value']
+    assert dois.offsets.tolist() == [0, 2, 2, 3]
+    assert dois.values.tolist() == ['DOI:10.1/A', '10.1/a', '10.1/B']
+    assert dois.lengths.tolist() == [2, 0, 1]
+    assert dois.rows.tolist() == [0, 0, 2]
+    assert columns['arxiv'].to_lists() == [
+        ['1234.5678'], [], ['0000.0001', '0000.0002']]
+    assert get_row(columns, 1) == {
+        'dois.value': [], 'arxiv': [], 'titles.title': ['foo']}
+
+
+def test_extract_columns_like_single_records():
+    """Keep nested lists and normalize the values of normalize queries."""
+    normalize = ['lowercase']
+    queries = [{'type': 'exact', 'match': 'doi', 'normalize': normalize}]
+    records = [{'doi': ['A', ['B']]}, {'doi': 'C'}, {'doi': ['D', 'd']}]
+
+    columns = extract_columns(records, queries)
+
+    assert columns['doi'].to_lists() == [['A', ['B']], ['C'], ['D', 'd']]
+    key = get_normalized_key('doi', normalize)
+    assert key not in columns
+
+    del records[0]
+    columns = extract_columns(records, queries)
+    assert columns[key].to_lists() == [['c'], ['d']]
+
+
+def test_normalize_column():
+    """Normalize a column, dropping duplicates inside each record."""
+    pipeline = compile_pipeline([
+        'lowercase', {'type': 'strip_prefix', 'prefixes': ['doi:']}])
+    column = ValueColumn.from_lists(
+        [['DOI:10.1/A', '10.1/a', 'doi:'], [], ['10.1/B', '10.1/a']])
+
+    result = column.normalize(pipeline)
+
+    assert result.to_lists() == [['10.1/a'], [], ['10.1/b', '10.1/a']]
+
+
+def test_coalesce():
+    """Take the first value of the first column having one."""
+    first = ValueColumn.from_lists([[], ['a'], []])
+    second = ValueColumn.from_lists([['b', 'c'], ['d'], []])
+
+    assert coalesce(first, second).tolist() == ['b', 'a', None]
+
+
+def test_fingerprint():
+    """Fingerprint the set of values of each record."""
+    column = ValueColumn.from_lists(
+        [['a', 'b'], ['b', 'a', 'a'], ['a'], []])
+
+    result = column.fingerprint()
+
+    assert result[0] == result[1]
+    assert result[0] != result[2]
+    assert result[3] == 0
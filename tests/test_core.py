@@ -29,7 +29,8 @@ from __future__ import absolute_import, print_function
 import mock
 import pytest
 
-from invenio_matcher.core import _merge, _parse, execute, get_queries
+from invenio_matcher.core import _merge, _parse, execute, execute_combined, \
+    extract_values, get_normalized_key, get_queries
 from invenio_matcher.errors import InvalidQuery, NotImplementedQuery
 from invenio_matcher.models import MatchResult
 from invenio_records import Record
@@ -205,6 +206,34 @@ def test_parse_query_with_with(app, simple_record):
         assert extras == {}
 
 
+def test_parse_query_with_conditions(app, simple_record):
+    """Keep the conditions of the query out of the extras."""
+    with app.app_context():
+        query = {'type': 'exact', 'match': 'title', 'max_results': 1,
+                 'run_if_no_match': True, 'stop_if_score_above': 2}
+        record = Record(simple_record)
+
+        _type, match, values, extras = _parse(query, record)
+
+        assert extras == {}
+
+
+def test_parse_query_with_normalized_values(app):
+    """Take the values normalized ahead instead of normalizing them."""
+    with app.app_context():
+        normalize = [{'type': 'strip_prefix', 'prefixes': ['doi:']}]
+        query = {'type': 'exact', 'match': 'doi', 'normalize': normalize}
+        record = Record({'doi': 'doi:doi:10.1/a'})
+        extracted = {
+            'doi': ['doi:doi:10.1/a'],
+            get_normalized_key('doi', normalize): ['normalized'],
+        }
+
+        assert _parse(query, record, extracted)[2] == ['normalized']
+        assert _parse(query, record, {'doi': ['doi:doi:10.1/a']})[2] == \
+            ['doi:10.1/a']
+
+
 def test_parse_query_with_extras(app, simple_record):
     """Parse a query preserving other keyword arguments."""
     with app.app_context():
@@ -282,3 +311,144 @@ def test_merge():
     d2 = {'baz': 'baz'}
 
     assert _merge(d1, d2) == {'foo': 'foo', 'bar': 'bar', 'baz': 'baz'}
+
+
+def test_execute_reranks_results(app, mocker):
+    """Re-rank the results when the query asks for it."""
+    pytest.importorskip('numpy')
+    mocker.patch('invenio_matcher.engine.search', one_search_result)
+
+    with app.app_context():
+        query = {'type': 'fuzzy', 'match': 'title', 'rerank': {
+            'text': ['title'], 'threshold': 0.5}}
+        index = "records"
+        doc_type = "record"
+
+        result = execute(index, doc_type, query, Record({'title': 'foo bar'}))
+        assert result[0].similarity == 1
+
+        result = execute(index, doc_type, query, Record({'title': 'qux'}))
+        assert result == []
+
+
+def test_execute_paginates_lazily(app, mocker):
+    """Yield the results as the pages of hits come."""
+    def search(index, doc_type, body, paginate=None, **kwargs):
+        assert paginate == {'min_score': 1}
+        hits = ({'_id': id_, '_source': {}, '_score': 1} for id_ in 'ab')
+        return {'hits': {'hits': hits}}
+
+    mocker.patch('invenio_matcher.engine.search', search)
+
+    with app.app_context():
+        query = {'type': 'exact', 'match': 'title',
+                 'paginate': {'min_score': 1}}
+        result = execute('records', 'record', query, Record({'title': 'x'}))
+
+        assert not isinstance(result, list)
+        assert [r.id for r in result] == ['a', 'b']
+
+
+def test_execute_combined(app, mocker):
+    """Send exact queries in one search and map back the matched ones."""
+    search = mocker.patch('invenio_matcher.engine.search', return_value={
+        'hits': {
+            'total': 1,
+            'max_score': 2.0,
+            'hits': [
+                {
+                    '_source': {'title': 'foo bar'},
+                    '_score': 2.0,
+                    '_id': 1,
+                    'matched_queries': ['2', '0'],
+                }
+            ]
+        }
+    })
+
+    with app.app_context():
+        queries = [
+            {'type': 'exact', 'match': 'title'},
+            {'type': 'exact', 'match': 'doi'},
+            {'type': 'exact', 'match': 'arxiv'},
+        ]
+        record = Record({'title': 'foo bar', 'arxiv': '1234.5678'})
+
+        result = execute_combined('records', 'record', queries, record)
+
+        assert result == [MatchResult(1, Record({'title': 'foo bar'}), 2.0)]
+        assert result[0].query == queries[0]
+        assert result[0].matched_queries == [queries[0], queries[2]]
+
+        clauses = search.call_args[0][2]['query']['bool']['should']
+        assert [clause['bool']['_name'] for clause in clauses] == ['0', '2']
+
+
+def test_execute_combined_without_values(app, mocker):
+    """Do not search when the record has none of the values."""
+    search = mocker.patch('invenio_matcher.engine.search')
+
+    with app.app_context():
+        queries = [{'type': 'exact', 'match': 'doi'}]
+
+        assert execute_combined('records', 'record', queries, {}) == []
+        assert not search.called
+
+
+def test_parse_query_normalizes_values(app):
+    """Normalize the values extracted from the record."""
+    with app.app_context():
+        query = {'type': 'exact', 'match': 'dois', 'normalize': [
+            'lowercase', {'type': 'strip_prefix', 'prefixes': ['doi:']}]}
+        record = Record({'dois': ['DOI:10.1/ABC', '10.1/abc']})
+
+        _type, match, values, extras = _parse(query, record)
+
+        assert match == 'dois'
+        assert values == ['10.1/abc']
+        assert extras == {}
+
+
+def test_extract_values(app):
+    """Extract the values of all the queries at once."""
+    with app.app_context():
+        queries = [
+            {'type': 'exact', 'match': 'titles.title'},
+            {'type': 'exact', 'match': 'dois.value', 'values': ['foo']},
+            {'type': 'fuzzy', 'match': {'title': 'foo'}},
+            {'type': 'exact', 'match': 'arxiv'},
+        ]
+        record = Record({'titles': [{'title': 'foo bar'}]})
+
+        extracted = extract_values(record, queries)
+
+        assert extracted == {'titles.title': ['foo bar'], 'arxiv': []}
+
+
+def test_execute_uses_extracted_values(app, mocker):
+    """Query the values extracted beforehand."""
+    exact = mocker.patch('invenio_matcher.core.exact',
+                         side_effect=empty_search_result)
+
+    with app.app_context():
+        query = {'type': 'exact', 'match': 'title'}
+        record = Record({'title': 'foo bar'})
+
+        execute('records', 'record', query, record,
+                extracted={'title': 'qux'})
+
+        assert exact.call_args[1]['values'] == ['qux']
+
+
+def test_execute_with_routing(app, mocker):
+    """Route the search with the values of the record."""
+    exact = mocker.patch('invenio_matcher.core.exact',
+                         side_effect=empty_search_result)
+
+    with app.app_context():
+        query = {'type': 'exact', 'match': 'title', 'routing': 'collections'}
+        record = Record({'title': 'foo bar', 'collections': ['hep', 'cds']})
+
+        execute('records', 'record', query, record)
+
+        assert exact.call_args[1]['routing'] == 'hep,cds'
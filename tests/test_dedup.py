@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test Matcher detection of duplicates inside an index."""
+
+from __future__ import absolute_import, print_function
+
+import json
+import os
+
+import pytest
+
+from invenio_matcher.dedup import _subtract_lag, deduplicate, \
+    deduplicate_changes, fetch_records, get_blocking, get_blocks
+from invenio_matcher.errors import NoBlockingDefined
+from invenio_matcher.models import MatchResult
+
+from .helpers import FakeScrollClient
+
+RECORDS = [
+    (1, {'title': 'foo', 'year': 2001}),
+    (2, {'title': 'foo', 'year': 2001}),
+    (3, {'title': 'bar', 'year': 2001}),
+    (4, {'title': 'foo', 'year': 2015}),
+    (5, {'title': 'baz', 'year': 2015}),
+    (6, {'title': 'baz', 'year': 2015}),
+    (7, {'title': 'qux', 'year': 1990}),
+]
+
+BLOCKING = [{'type': 'term', 'match': 'year'}]
+
+
+@pytest.fixture
+def fetch(mocker):
+    """Fetch the records to compare from ``RECORDS``."""
+    def fetch_records(index, doc_type, ids, source=None):
+        return [(id_, record) for id_, record in RECORDS if id_ in ids]
+
+    return mocker.patch('invenio_matcher.dedup.fetch_records',
+                        side_effect=fetch_records)
+
+
+def read_pairs(path):
+    """Return the pairs written to the output."""
+    with open(path) as fp:
+        return [json.loads(line) for line in fp]
+
+
+def test_get_blocks():
+    """Group records by blocking keys, dropping single records."""
+    blocks = get_blocks(iter(RECORDS), BLOCKING)
+
+    assert sorted(blocks) == [(2001,), (2015,)]
+    assert [id_ for id_, _ in blocks[(2001,)]] == [1, 2, 3]
+
+
+def test_get_blocking(app):
+    """Raise when no blocking is defined."""
+    app.config.update(MATCHER_BLOCKING={'records': {'record': BLOCKING}})
+    with app.app_context():
+        assert get_blocking('records', 'record') == BLOCKING
+        with pytest.raises(NoBlockingDefined):
+            get_blocking('records', 'workflow')
+
+
+def test_deduplicate_with_similarity(app, mocker, tmpdir, fetch):
+    """Compare pairs inside blocks with a similarity function."""
+    mocker.patch('invenio_matcher.dedup.scan_records',
+                 return_value=iter(RECORDS))
+    output = str(tmpdir.join('pairs.jsonl'))
+
+    with app.app_context():
+        count = deduplicate(
+            'records', 'record', output, blocking=BLOCKING,
+            similarity='tests.helpers.title_similarity', threshold=1,
+            processes=1)
+
+    assert count == 2
+    assert read_pairs(output) == [
+        {'ids': [1, 2], 'score': 1},
+        {'ids': [5, 6], 'score': 1},
+    ]
+
+
+def test_deduplicate_with_queries(app, mocker, tmpdir, fetch):
+    """Search only the other records of the block."""
+    def match(record, index, doc_type, include_ids):
+        return [MatchResult(id_, other, 2.0) for id_, other in RECORDS
+                if other['title'] == record['title'] and id_ in include_ids]
+
+    mocker.patch('invenio_matcher.dedup.scan_records',
+                 return_value=iter(RECORDS))
+    mocker.patch('invenio_matcher.dedup.match', match)
+    output = str(tmpdir.join('pairs.jsonl'))
+
+    with app.app_context():
+        count = deduplicate(
+            'records', 'record', output, blocking=BLOCKING, processes=2)
+
+    assert count == 2
+    assert read_pairs(output) == [
+        {'ids': [1, 2], 'score': 2.0},
+        {'ids': [5, 6], 'score': 2.0},
+    ]
+
+
+def test_deduplicate_resumes_from_checkpoint(app, mocker, tmpdir, fetch):
+    """Skip the blocks already compared and their written pairs."""
+    mocker.patch('invenio_matcher.dedup.scan_records',
+                 side_effect=lambda *args, **kwargs: iter(RECORDS))
+    output = str(tmpdir.join('pairs.jsonl'))
+    checkpoint = str(tmpdir.join('checkpoint.json'))
+
+    with app.app_context():
+        deduplicate(
+            'records', 'record', output, blocking=BLOCKING,
+            similarity='tests.helpers.title_similarity', threshold=1,
+            processes=1, checkpoint=checkpoint)
+
+        with open(checkpoint) as fp:
+            assert json.load(fp) == {
+                'block': '[2015]', 'pairs': 2,
+                'offset': os.path.getsize(output)}
+
+        first_line = json.dumps({'ids': [1, 2], 'score': 1}) + '\n'
+        with open(checkpoint, 'w') as fp:
+            json.dump({'block': '[2001]', 'pairs': 1,
+                       'offset': len(first_line)}, fp)
+        with open(output, 'a') as fp:
+            fp.write('{"ids": [5, 6], "sc')
+
+        count = deduplicate(
+            'records', 'record', output, blocking=BLOCKING,
+            similarity='tests.helpers.title_similarity', threshold=1,
+            processes=1, checkpoint=checkpoint)
+
+    assert count == 2
+    assert read_pairs(output) == [
+        {'ids': [1, 2], 'score': 1},
+        {'ids': [5, 6], 'score': 1},
+    ]
+
+
+def test_deduplicate_resumes_after_the_last_block(
+        app, mocker, tmpdir, fetch):
+    """Resume after the last compared block even if blocks were added."""
+    added = RECORDS + [(8, {'title': 'foo', 'year': 1995}),
+                       (9, {'title': 'foo', 'year': 1995})]
+    scan_records = mocker.patch('invenio_matcher.dedup.scan_records',
+                                return_value=iter(added))
+    fetch.side_effect = lambda index, doc_type, ids, source=None: [
+        (id_, record) for id_, record in added if id_ in ids]
+    output = str(tmpdir.join('pairs.jsonl'))
+    checkpoint = str(tmpdir.join('checkpoint.json'))
+    with open(checkpoint, 'w') as fp:
+        json.dump({'block': '[2001]', 'pairs': 0, 'offset': 0}, fp)
+
+    with app.app_context():
+        count = deduplicate(
+            'records', 'record', output, blocking=BLOCKING,
+            similarity='tests.helpers.title_similarity', threshold=1,
+            processes=1, checkpoint=checkpoint)
+
+    assert count == 1
+    assert read_pairs(output) == [{'ids': [5, 6], 'score': 1}]
+    assert scan_records.call_args[1]['source'] == ['year']
+    assert [call[0][2] for call in fetch.call_args_list] == [[4, 5, 6]]
+
+
+def test_fetch_records(app, mocker):
+    """Fetch the found records of the ids."""
+    client = mocker.Mock()
+    client.mget.return_value = {'docs': [
+        {'_id': 1, 'found': True, '_source': {'title': 'foo'}},
+        {'_id': 2, 'found': False},
+    ]}
+    app.config['MATCHER_SEARCH_CLIENT'] = lambda: client
+
+    with app.app_context():
+        assert fetch_records('records', 'record', []) == []
+        assert fetch_records('records', 'record', [1, 2],
+                             source=['title']) == [(1, {'title': 'foo'})]
+
+    client.mget.assert_called_once_with(
+        index='records', doc_type='record', body={'ids': [1, 2]},
+        _source=['title'])
+
+
+def test_deduplicate_pairs_across_range_buckets(app, mocker, tmpdir):
+    """Compare records within delta in neighbouring buckets, once."""
+    records = [
+        (1, {'title': 'foo', 'year': 2010}),
+        (2, {'title': 'foo', 'year': 2011}),
+        (3, {'title': 'foo', 'year': 2012}),
+        (4, {'title': 'foo', 'year': 2016}),
+    ]
+    mocker.patch('invenio_matcher.dedup.scan_records',
+                 return_value=iter(records))
+    mocker.patch(
+        'invenio_matcher.dedup.fetch_records',
+        side_effect=lambda index, doc_type, ids, source=None: [
+            (id_, record) for id_, record in records if id_ in ids])
+    output = str(tmpdir.join('pairs.jsonl'))
+
+    with app.app_context():
+        count = deduplicate(
+            'records', 'record', output,
+            blocking=[{'type': 'range', 'match': 'year', 'delta': 1}],
+            similarity='tests.helpers.title_similarity', threshold=1,
+            processes=1)
+
+    assert count == 3
+    assert sorted(pair['ids'] for pair in read_pairs(output)) == [
+        [1, 2], [1, 3], [2, 3]]
+
+
+def test_deduplicate_skips_big_blocks(app, mocker, tmpdir, fetch):
+    """Do not compare blocks bigger than the maximum size."""
+    mocker.patch('invenio_matcher.dedup.scan_records',
+                 return_value=iter(RECORDS))
+    output = str(tmpdir.join('pairs.jsonl'))
+
+    with app.app_context():
+        count = deduplicate(
+            'records', 'record', output, blocking=BLOCKING,
+            similarity='tests.helpers.title_similarity', threshold=1,
+            processes=1, max_block_size=2)
+
+    assert count == 0
+
+
+def test_deduplicate_changes(app, mocker, tmpdir):
+    """Match only the records changed since the last run."""
+    changed = [
+        (1, {'title': 'foo', '_updated': '2017-01-02T10:00:00'}),
+        (2, {'title': 'foo', '_updated': '2017-01-03T10:00:00'}),
+        (3, {'title': 'bar', '_updated': '2017-01-01T10:00:00'}),
+    ]
+    index = changed + [(4, {'title': 'bar'})]
+
+    def match(record, index_, doc_type):
+        return [MatchResult(id_, other, 2.0) for id_, other in index
+                if other['title'] == record['title']]
+
+    scan_records = mocker.patch('invenio_matcher.dedup.scan_records',
+                                side_effect=[iter(changed), iter([])])
+    mocker.patch('invenio_matcher.dedup.match', match)
+    output = str(tmpdir.join('pairs.jsonl'))
+    watermark = str(tmpdir.join('watermark.json'))
+
+    with app.app_context():
+        count = deduplicate_changes(
+            'records', 'record', output, watermark, processes=2)
+
+        assert count == 2
+        assert read_pairs(output) == [
+            {'ids': [1, 2], 'score': 2.0},
+            {'ids': [3, 4], 'score': 2.0},
+        ]
+        assert scan_records.call_args[1]['query'] is None
+
+        count = deduplicate_changes('records', 'record', output, watermark)
+
+        assert count == 0
+        assert scan_records.call_args[1]['query'] == {'query': {'range': {
+            '_updated': {'gte': '2017-01-03T10:00:00'}}}}
+
+    with open(watermark) as fp:
+        assert json.load(fp) == {'value': '2017-01-03T10:00:00', 'pairs': 0,
+                                 'offset': os.path.getsize(output)}
+
+
+def test_deduplicate_changes_overlaps_the_last_run(app, mocker, tmpdir):
+    """Match again the records near the watermark without repeating pairs."""
+    changed = [
+        (1, {'title': 'foo', '_updated': 10}),
+        (2, {'title': 'foo', '_updated': 12}),
+        (3, {'title': 'bar', '_updated': 12}),
+    ]
+
+    def match(record, index_, doc_type):
+        return [MatchResult(id_, other, 1.0) for id_, other in changed
+                if other['title'] == record['title']]
+
+    scan_records = mocker.patch('invenio_matcher.dedup.scan_records',
+                                side_effect=lambda *args, **kwargs: iter(
+                                    changed))
+    mocker.patch('invenio_matcher.dedup.match', match)
+    output = str(tmpdir.join('pairs.jsonl'))
+    watermark = str(tmpdir.join('watermark.json'))
+    first_line = json.dumps({'ids': [1, 2], 'score': 1.0}) + '\n'
+    with open(output, 'w') as fp:
+        fp.write(first_line)
+        fp.write('{"ids": [3, 4], "sc')
+    with open(watermark, 'w') as fp:
+        json.dump({'value': 10, 'pairs': 1, 'offset': len(first_line)}, fp)
+
+    with app.app_context():
+        changed.append((4, {'title': 'bar', '_updated': 9}))
+        count = deduplicate_changes(
+            'records', 'record', output, watermark, lag=2)
+
+    assert scan_records.call_args[1]['query'] == {'query': {'range': {
+        '_updated': {'gte': 8}}}}
+    assert count == 1
+    assert read_pairs(output) == [
+        {'ids': [1, 2], 'score': 1.0},
+        {'ids': [3, 4], 'score': 1.0},
+    ]
+    with open(watermark) as fp:
+        assert json.load(fp) == {
+            'value': 12, 'pairs': 1, 'offset': os.path.getsize(output)}
+
+
+def test_deduplicate_changes_scans_in_the_app_context(app, mocker, tmpdir):
+    """Scan the changed records with the client of the application."""
+    changed = [
+        (1, {'title': 'foo', '_updated': 1}),
+        (2, {'title': 'bar', '_updated': 2}),
+        (3, {'title': 'foo', '_updated': 3}),
+    ]
+    client = FakeScrollClient(changed)
+    app.config['MATCHER_SEARCH_CLIENT'] = lambda: client
+
+    def match(record, index_, doc_type):
+        return [MatchResult(id_, other, 1.0) for id_, other in changed
+                if other['title'] == record['title']]
+
+    mocker.patch('invenio_matcher.dedup.match', match)
+    output = str(tmpdir.join('pairs.jsonl'))
+    watermark = str(tmpdir.join('watermark.json'))
+
+    with app.app_context():
+        count = deduplicate_changes(
+            'records', 'record', output, watermark, processes=2)
+
+    assert count == 1
+    assert read_pairs(output) == [{'ids': [1, 3], 'score': 1.0}]
+    with open(watermark) as fp:
+        assert json.load(fp)['value'] == 3
+
+
+def test_subtract_lag():
+    """Move the watermark back with date math or arithmetic."""
+    assert _subtract_lag('2017-01-03T10:00:00', '1m') == \
+        '2017-01-03T10:00:00||-1m'
+    assert _subtract_lag(10, 2) == 8
+    assert _subtract_lag(10, None) == 10
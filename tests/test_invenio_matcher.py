@@ -27,6 +27,11 @@
 
 from __future__ import absolute_import, print_function
 
+import subprocess
+import sys
+
+import mock
+import pytest
 from flask import Flask
 
 from invenio_matcher import InvenioMatcher
@@ -49,3 +54,89 @@ def test_init():
     assert 'invenio-matcher' not in app.extensions
     ext.init_app(app)
     assert 'invenio-matcher' in app.extensions
+
+
+def test_search_client_defaults_to_invenio_search():
+    """Share the Invenio-Search client when nothing is configured."""
+    from invenio_search import current_search_client
+
+    app = Flask('testapp')
+    InvenioMatcher(app)
+
+    state = app.extensions['invenio-matcher']
+    assert state.search_client is current_search_client
+
+
+def test_search_without_extension():
+    """Search with the Invenio-Search client without the extension."""
+    from invenio_matcher.engine import search
+
+    app = Flask('testapp')
+    with mock.patch('invenio_search.current_search_client') as client:
+        with app.app_context():
+            search('records', 'record', {'query': {}})
+
+    client.search.assert_called_once_with(
+        index='records', doc_type='record', body={'query': {}})
+
+
+def test_search_client_from_factory():
+    """Build a dedicated client from the configured factory."""
+    client = object()
+    factory = mock.Mock(return_value=client)
+
+    app = Flask('testapp')
+    app.config.update(
+        MATCHER_SEARCH_CLIENT=factory,
+        MATCHER_SEARCH_CLIENT_CONFIG={'maxsize': 25, 'http_compress': True},
+    )
+    InvenioMatcher(app)
+
+    state = app.extensions['invenio-matcher']
+    assert state.search_client is client
+    assert state.search_client is client
+    factory.assert_called_once_with(maxsize=25, http_compress=True)
+
+
+@mock.patch('elasticsearch.Elasticsearch')
+def test_search_client_from_settings(Elasticsearch):
+    """Build a dedicated client from the configured settings."""
+    app = Flask('testapp')
+    app.config.update(
+        SEARCH_ELASTIC_HOSTS=['es:9200'],
+        MATCHER_SEARCH_CLIENT_CONFIG={'timeout': 5, 'sniff_on_start': True},
+    )
+    InvenioMatcher(app)
+
+    assert app.extensions['invenio-matcher'].search_client is \
+        Elasticsearch.return_value
+    Elasticsearch.assert_called_once_with(
+        hosts=['es:9200'], timeout=5, sniff_on_start=True)
+
+
+def test_import_is_lazy():
+    """Import the package without the search client and the database."""
+    heavy = ['elasticsearch', 'invenio_db', 'invenio_records',
+             'invenio_search', 'sqlalchemy']
+    script = (
+        'import sys, time; start = time.time(); import invenio_matcher; '
+        'elapsed = time.time() - start; '
+        'print(",".join(m for m in {0!r} if m in sys.modules)); '
+        'print(elapsed)'
+    ).format(heavy)
+
+    output = subprocess.check_output([sys.executable, '-c', script])
+    imported, elapsed = output.decode('utf-8').splitlines()
+
+    assert imported == ''
+    assert float(elapsed) < 1
+
+
+def test_lazy_names():
+    """Resolve the lazy public names on first use."""
+    import invenio_matcher
+    from invenio_matcher.api import match
+
+    assert invenio_matcher.match is match
+    with pytest.raises(AttributeError):
+        invenio_matcher.banana
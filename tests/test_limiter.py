@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test Matcher limiter."""
+
+from __future__ import absolute_import, print_function
+
+import pytest
+from elasticsearch.exceptions import ConnectionTimeout, TransportError
+
+from invenio_matcher.deadline import Deadline
+from invenio_matcher.errors import SearchUnavailable
+from invenio_matcher.limiter import AdaptiveLimiter, CircuitBreaker
+
+from .helpers import FakeClock, FakeSearchClient, empty_search_result
+
+
+def overloaded():
+    """Return the error of a rejected search."""
+    return TransportError(429, 'es_rejected_execution_exception', {})
+
+
+def test_limiter_increases_limit_on_fast_searches():
+    """Grow the limit additively while searches are fast."""
+    clock = FakeClock()
+    client = FakeSearchClient(
+        [empty_search_result()] * 4, latency=0.1, clock=clock)
+    limiter = AdaptiveLimiter(
+        initial_limit=4, latency_target=1, clock=clock, sleep=clock.sleep)
+
+    for _ in range(4):
+        assert limiter.call(client.search) == empty_search_result()
+
+    assert 4.9 < limiter.limit < 5
+    assert limiter.in_flight == 0
+
+
+def test_limiter_decreases_limit_on_slow_searches():
+    """Shrink the limit multiplicatively when searches are slow."""
+    clock = FakeClock()
+    client = FakeSearchClient(
+        [empty_search_result()] * 2, latency=2, clock=clock)
+    limiter = AdaptiveLimiter(
+        initial_limit=8, latency_target=1, clock=clock, sleep=clock.sleep)
+
+    limiter.call(client.search)
+    limiter.call(client.search)
+
+    assert limiter.limit == 2
+
+
+def test_limiter_retries_rejected_searches():
+    """Retry with backoff the searches rejected by an overloaded backend."""
+    clock = FakeClock()
+    client = FakeSearchClient(
+        [overloaded(), overloaded(), empty_search_result()], clock=clock)
+    limiter = AdaptiveLimiter(
+        initial_limit=8, retry_backoff=1, clock=clock, sleep=clock.sleep)
+
+    assert limiter.call(client.search, index='records') == \
+        empty_search_result()
+    assert len(client.calls) == 3
+    assert clock.now <= 1 + 2
+    assert limiter.limit == 2.5
+    assert limiter.breaker.failures == 0
+
+
+def test_limiter_retries_within_deadline():
+    """Give the retries the time left and stop them when it runs out."""
+    clock = FakeClock()
+    client = FakeSearchClient(
+        [overloaded(), overloaded(), empty_search_result()], latency=0.5,
+        clock=clock)
+    limiter = AdaptiveLimiter(
+        initial_limit=8, retry_backoff=1, clock=clock, sleep=clock.sleep)
+    limiter.backoff = lambda attempt: 1
+    deadline = Deadline(3, clock=clock)
+
+    with pytest.raises(TransportError):
+        limiter.call(client.search, request_timeout=10, deadline=deadline)
+    assert len(client.calls) == 2
+    assert client.calls[0] == {'request_timeout': 10}
+    assert client.calls[1] == {'request_timeout': 1.5}
+    assert clock.now == 2
+
+
+def test_limiter_does_not_retry_other_errors():
+    """Raise at once errors that are not caused by overload."""
+    client = FakeSearchClient([TransportError(400, 'parsing_exception', {})])
+    limiter = AdaptiveLimiter(initial_limit=8)
+
+    with pytest.raises(TransportError):
+        limiter.call(client.search)
+    assert len(client.calls) == 1
+    assert limiter.limit == 8
+
+
+def test_limiter_does_not_retry_timeouts():
+    """Raise at once timeouts, which use up the time budget."""
+    client = FakeSearchClient([ConnectionTimeout('TIMEOUT', 'timeout', None)])
+    limiter = AdaptiveLimiter(initial_limit=8)
+
+    with pytest.raises(ConnectionTimeout):
+        limiter.call(client.search)
+    assert len(client.calls) == 1
+    assert limiter.limit == 4
+
+
+def test_limiter_opens_circuit():
+    """Fail fast once the errors exceed the threshold."""
+    clock = FakeClock()
+    client = FakeSearchClient(
+        [overloaded()] * 3 + [empty_search_result()], clock=clock)
+    limiter = AdaptiveLimiter(
+        max_retries=2, failure_threshold=3, reset_timeout=30,
+        clock=clock, sleep=clock.sleep)
+
+    with pytest.raises(TransportError):
+        limiter.call(client.search)
+    with pytest.raises(SearchUnavailable):
+        limiter.call(client.search)
+    assert len(client.calls) == 3
+
+    clock.sleep(30)
+    assert limiter.call(client.search) == empty_search_result()
+
+
+def test_circuit_breaker_reopens_on_failure_after_reset():
+    """Open the circuit again at the first failure after the reset."""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10,
+                             clock=clock)
+
+    breaker.record_failure()
+    assert not breaker.is_open
+    breaker.record_failure()
+    assert breaker.is_open
+
+    clock.sleep(10)
+    breaker.before_call()
+    breaker.record_failure()
+    with pytest.raises(SearchUnavailable):
+        breaker.before_call()
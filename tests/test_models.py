@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test Matcher models."""
+
+from __future__ import absolute_import, print_function
+
+from invenio_db import db
+
+from invenio_matcher.models import MatchDecision, MatchResult
+
+
+def test_bulk_create_decisions(app):
+    """Store the decisions of match results in batches."""
+    query = {'type': 'exact', 'match': 'title'}
+    results = [
+        MatchResult(2, {}, 1.5, query=query),
+        MatchResult(3, {}, 0.5, query=query),
+        MatchResult(4, {}, 0.1),
+    ]
+
+    with app.app_context():
+        count = MatchDecision.bulk_create(
+            MatchDecision.from_results(1, results), batch_size=2)
+        db.session.commit()
+
+        assert count == 3
+        decisions = MatchDecision.query.filter_by(record_id='1').order_by(
+            MatchDecision.matched_id).all()
+        assert [d.matched_id for d in decisions] == ['2', '3', '4']
+        assert decisions[0].match_query == query
+        assert decisions[0].score == 1.5
+        assert decisions[0].created is not None
+        assert decisions[2].match_query is None
+
+        assert MatchDecision.query.filter_by(matched_id='3').count() == 1
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test Matcher normalizers."""
+
+from __future__ import absolute_import, print_function
+
+import pytest
+
+from invenio_matcher.errors import InvalidQuery
+from invenio_matcher.normalizers import compile_pipeline
+
+DOI = [
+    'strip',
+    'lowercase',
+    {'type': 'strip_prefix', 'prefixes': ['doi:', 'https://doi.org/']},
+]
+
+
+def test_normalize_dois():
+    """Normalize the forms of the same DOI to a single value."""
+    pipeline = compile_pipeline(DOI)
+
+    assert pipeline.normalize(
+        ['DOI:10.1/ABC', ' https://doi.org/10.1/abc', '10.1/aBc', 'doi:']
+    ) == ['10.1/abc']
+
+
+def test_normalize_arxiv():
+    """Strip the prefix and the version of arXiv identifiers."""
+    pipeline = compile_pipeline([
+        {'type': 'strip_prefix', 'prefixes': ['arXiv:']},
+        'strip_version',
+    ])
+
+    assert pipeline.normalize(['arXiv:1234.5678v2', 'hep-th/9901001']) == \
+        ['1234.5678', 'hep-th/9901001']
+
+
+def test_normalize_with_regex():
+    """Replace the matches of a regular expression."""
+    pipeline = compile_pipeline([
+        {'type': 'regex', 'pattern': '[- ]', 'replace': ''}, 'uppercase'])
+
+    assert pipeline('978-3-16 148410-x') == '978316148410X'
+
+
+def test_normalize_keeps_other_values():
+    """Return values which are not strings as they are."""
+    pipeline = compile_pipeline(['lowercase'])
+
+    assert pipeline.normalize([1, None, 'A']) == [1, 'a']
+
+
+def test_compile_pipeline_once():
+    """Compile the same specs once and memoize the values."""
+    pipeline = compile_pipeline(DOI)
+
+    assert compile_pipeline(list(DOI)) is pipeline
+    pipeline('DOI:10.1/XYZ')
+    assert pipeline.cache['DOI:10.1/XYZ'] == '10.1/xyz'
+
+
+def test_normalize_batch():
+    """Normalize the values of a batch of records."""
+    pipeline = compile_pipeline(DOI)
+
+    assert pipeline.normalize_batch([
+        ['DOI:10.1/A', '10.1/a'],
+        [],
+        ['doi:10.1/B', 2],
+    ]) == [['10.1/a'], [], ['10.1/b', 2]]
+
+
+def test_unknown_normalizer():
+    """Raise for unknown normalizers."""
+    with pytest.raises(InvalidQuery):
+        compile_pipeline(['banana'])
@@ -27,9 +27,13 @@
 from __future__ import absolute_import, print_function
 
 import mock
+import pytest
 
-from invenio_matcher.engine import _build_doc, _build_exact_query, \
-    _build_free_query, _build_fuzzy_query, _build_mlt_query
+from invenio_matcher.deadline import Deadline
+from invenio_matcher.engine import _build_combined_query, _build_doc, \
+    _build_exact_query, _build_free_query, _build_fuzzy_query, \
+    _build_mlt_query, _exclude_ids, _include_ids, _is_cacheable, scan, \
+    search
 
 
 def test_build_exact_query():
@@ -251,3 +255,291 @@ def test_build_free_query(import_string):
     """Build a free query."""
     _build_free_query(query='foo.bar.baz')
     import_string.assert_called_with('foo.bar.baz')
+
+
+def test_search_uses_matcher_client_and_timeout(app):
+    """Send searches through the matcher client with its timeout."""
+    client = mock.Mock()
+    app.config['MATCHER_SEARCH_TIMEOUT'] = 3
+
+    with app.app_context():
+        app.extensions['invenio-matcher'].search_client = client
+        search('records', 'record', {'query': {}})
+
+    client.search.assert_called_once_with(
+        index='records', doc_type='record', body={'query': {}},
+        request_timeout=3)
+
+
+def test_build_fuzzy_query_with_filters():
+    """Restrict a fuzzy query to the documents passing the filters."""
+    filters = [{'terms': {'document_type': ['article']}}]
+    expected = {
+        'min_score': 1,
+        'query': {
+            'bool': {
+                'must': {
+                    'more_like_this': {
+                        'docs': [
+                            {
+                                '_index': 'records',
+                                '_type': 'record',
+                                'doc': {'title': 'foo bar'},
+                            }
+                        ],
+                        'min_doc_freq': 1,
+                        'min_term_freq': 1,
+                    }
+                },
+                'filter': filters,
+            }
+        },
+    }
+    result = _build_fuzzy_query(
+        match='title',
+        values='foo bar',
+        index='records',
+        doc_type='record',
+        filters=filters,
+    )
+
+    assert expected == result
+
+
+def test_exclude_ids():
+    """Exclude documents by id from a query."""
+    query = {'min_score': 1, 'query': {'match_all': {}}}
+    expected = {
+        'min_score': 1,
+        'query': {
+            'bool': {
+                'must': {'match_all': {}},
+                'must_not': {'ids': {'values': ['1', '2']}},
+            }
+        }
+    }
+
+    assert _exclude_ids(query, ['1', '2']) == expected
+    assert _exclude_ids({}, ['1']) == {}
+    assert _exclude_ids({'query': {}}, []) == {'query': {}}
+
+
+def test_build_combined_query():
+    """Build named exact queries in a single query."""
+    expected = {
+        'size': 20,
+        'query': {
+            'bool': {
+                'should': [
+                    {
+                        'bool': {
+                            'must': _build_exact_query(
+                                'dois.value', ['10.1/abc'])['query'],
+                            '_name': '0',
+                        }
+                    },
+                    {
+                        'bool': {
+                            'must': _build_exact_query(
+                                'arxiv_eprints.value', ['1234.5678'])['query'],
+                            '_name': '2',
+                        }
+                    },
+                ],
+                'minimum_should_match': 1,
+            }
+        }
+    }
+    result = _build_combined_query([
+        ('0', 'dois.value', ['10.1/abc']),
+        ('2', 'arxiv_eprints.value', ['1234.5678']),
+    ])
+
+    assert expected == result
+
+
+def test_search_sets_preference_and_request_cache(app):
+    """Send identical searches to the same shard copies and cache them."""
+    client = mock.Mock()
+    app.config.update(
+        MATCHER_SEARCH_PREFERENCE=True,
+        MATCHER_SEARCH_REQUEST_CACHE=True,
+    )
+
+    with app.app_context():
+        app.extensions['invenio-matcher'].search_client = client
+        search('records', 'record', {'query': {'term': {'a': 1}}})
+        search('records', 'record', {'query': {'term': {'a': 1}}},
+               routing='hep')
+        search('records', 'record', {'query': {'term': {'a': 2}}})
+
+    first, second, third = [c[1] for c in client.search.call_args_list]
+    assert first['request_cache'] is True
+    assert first['preference'] == second['preference']
+    assert first['preference'] != third['preference']
+    assert second['routing'] == 'hep'
+
+
+def _page(*ids):
+    """Return a search response with hits of the ids."""
+    return {
+        '_scroll_id': 'scroll',
+        'hits': {'hits': [
+            {'_id': id_, '_score': 1.0, 'sort': [1.0, id_]} for id_ in ids
+        ]},
+    }
+
+
+def test_scan_with_search_after(app):
+    """Fetch each page after the last hit of the previous one."""
+    pages = [_page('a', 'b'), _page('c', 'd'), _page()]
+    bodies = []
+
+    def search(body, **kwargs):
+        bodies.append(dict(body))
+        return pages.pop(0)
+
+    client = mock.Mock()
+    client.search.side_effect = search
+
+    with app.app_context():
+        app.extensions['invenio-matcher'].search_client = client
+        hits = scan('records', 'record', {'query': {'match_all': {}}},
+                    min_score=0.5, size=2, mode='search_after',
+                    preference='p')
+
+        assert next(hits)['_id'] == 'a'
+        assert client.search.call_count == 1
+        assert [hit['_id'] for hit in hits] == ['b', 'c', 'd']
+
+    assert client.search.call_count == 3
+    assert bodies[0]['min_score'] == 0.5
+    assert bodies[0]['size'] == 2
+    assert bodies[0]['sort'] == [{'_score': 'desc'}, {'_uid': 'asc'}]
+    assert 'search_after' not in bodies[0]
+    assert bodies[1]['search_after'] == [1.0, 'b']
+    assert bodies[2]['search_after'] == [1.0, 'd']
+    assert client.search.call_args[1]['preference'] == 'p'
+
+
+def test_scan_with_scroll(app):
+    """Fetch the pages of a scroll context by default and clear it."""
+    client = mock.Mock()
+    client.search.return_value = _page('a', 'b')
+    client.scroll.side_effect = [_page('c'), _page()]
+
+    with app.app_context():
+        app.extensions['invenio-matcher'].search_client = client
+        hits = list(scan('records', 'record', {'query': {'match_all': {}}},
+                         size=2, request_cache=True))
+
+    assert [hit['_id'] for hit in hits] == ['a', 'b', 'c']
+    assert client.search.call_args[1]['scroll'] == '5m'
+    assert 'sort' not in client.search.call_args[1]['body']
+    assert client.scroll.call_args_list[0] == mock.call(
+        scroll_id='scroll', scroll='5m')
+    assert 'request_cache' not in client.search.call_args[1]
+    assert client.scroll.call_count == 2
+    client.clear_scroll.assert_called_once_with(scroll_id='scroll')
+
+
+def test_scan_within_deadline(app):
+    """Give each page the time left and stop when it runs out."""
+    deadline = Deadline(10)
+    client = mock.Mock()
+    client.search.return_value = _page('a', 'b')
+    client.scroll.return_value = _page('c', 'd')
+
+    with app.app_context():
+        app.extensions['invenio-matcher'].search_client = client
+        hits = scan('records', 'record', {'query': {'match_all': {}}},
+                    size=2, deadline=deadline, request_timeout=30)
+
+        assert [next(hits)['_id'], next(hits)['_id']] == ['a', 'b']
+        assert 0 < client.search.call_args[1]['request_timeout'] <= 10
+
+        deadline.expires_at = 0
+        assert list(hits) == []
+
+    assert not client.scroll.called
+    client.clear_scroll.assert_called_once_with(scroll_id='scroll')
+    assert deadline.partial
+
+
+def test_scan_timeout_past_deadline(app):
+    """Stop at a page timing out once the deadline is over."""
+    from elasticsearch.exceptions import ConnectionTimeout
+    deadline = Deadline(10)
+    pages = [_page('a', 'b')]
+
+    def search(**kwargs):
+        if pages:
+            return pages.pop(0)
+        deadline.expires_at = 0
+        raise ConnectionTimeout('TIMEOUT', 'timed out', None)
+
+    client = mock.Mock()
+    client.search.side_effect = search
+
+    with app.app_context():
+        app.extensions['invenio-matcher'].search_client = client
+        hits = list(scan('records', 'record', {'query': {'match_all': {}}},
+                         size=2, mode='search_after', deadline=deadline))
+
+        assert [hit['_id'] for hit in hits] == ['a', 'b']
+        assert deadline.partial
+
+        client.search.side_effect = ConnectionTimeout(
+            'TIMEOUT', 'timed out', None)
+        with pytest.raises(ConnectionTimeout):
+            list(scan('records', 'record', {'query': {'match_all': {}}},
+                      mode='search_after', deadline=Deadline(10)))
+
+
+def test_search_paginates(app):
+    """Return a generator of all the hits of an exact query when paginating."""
+    client = mock.Mock()
+    client.search.return_value = _page('a')
+    client.scroll.side_effect = [_page('b'), _page()]
+    body = _build_exact_query('doi', ['10.1/a'])
+
+    with app.app_context():
+        app.extensions['invenio-matcher'].search_client = client
+        result = search('records', 'record', body, paginate={'size': 1})
+
+        assert not client.search.called
+        assert [hit['_id'] for hit in result['hits']['hits']] == ['a', 'b']
+
+    first = client.search.call_args[1]
+    assert first['body']['query'] == body['query']
+    assert first['body']['size'] == 1
+    assert 'sort' not in first['body']
+    assert 'request_cache' not in first
+    second = client.scroll.call_args_list[0][1]
+    assert second['scroll_id'] == 'scroll'
+    assert 'body' not in second
+
+
+def test_include_ids():
+    """Restrict the query to the given ids."""
+    query = {'query': {'match_all': {}}}
+
+    assert _include_ids(query, None) == query
+    assert _include_ids(_include_ids({}, [1]), [1]) == {}
+    assert _include_ids({'query': {'match_all': {}}}, [1, 2]) == {
+        'query': {
+            'bool': {
+                'must': {'match_all': {}},
+                'filter': {'ids': {'values': [1, 2]}},
+            }
+        }
+    }
+
+
+def test_is_cacheable():
+    """Do not cache queries whose results change for the same body."""
+    assert _is_cacheable({'query': {'terms': {'a': ['1', '2']}}})
+    assert not _is_cacheable(
+        {'query': {'range': {'date': {'gte': 'now-1d/d'}}}})
+    assert not _is_cacheable(
+        {'query': {'function_score': {'functions': [{'random_score': {}}]}}})
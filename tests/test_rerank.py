@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test Matcher re-ranking."""
+
+from __future__ import absolute_import, print_function
+
+import pytest
+
+from invenio_matcher.models import MatchResult
+
+np = pytest.importorskip('numpy')
+
+from invenio_matcher.rerank import _jaccard, _ngrams, rerank  # noqa: E402
+
+
+def results():
+    """Return candidates in the order of their raw scores."""
+    return [
+        MatchResult(1, {'title': 'Baryons in lattice QCD', 'year': 2001}, 9),
+        MatchResult(2, {'title': 'Lattice QCD with quarks', 'year': 2012}, 7),
+        MatchResult(3, {'title': 'Lattice QCD with quarks', 'year': 2011}, 5),
+        MatchResult(4, {'abstract': 'no title here'}, 3),
+    ]
+
+
+def test_rerank_orders_by_similarity():
+    """Reorder candidates by their similarity with the record."""
+    record = {'title': 'Lattice QCD with Quarks', 'year': '2011-05-03'}
+
+    result = rerank(record, results(), text=['title'], year='year')
+
+    assert [r.id for r in result] == [3, 2, 1, 4]
+    assert result[0].similarity == 1
+    assert result[-1].similarity == 0
+
+
+def test_rerank_filters_by_threshold():
+    """Drop candidates below the threshold."""
+    record = {'title': 'Lattice QCD with quarks'}
+
+    result = rerank(record, results(), text=['title'], threshold=0.5)
+
+    assert [r.id for r in result] == [2, 3]
+
+
+def test_rerank_uses_weights():
+    """Weigh the similarities in the combined one."""
+    record = {'title': 'Lattice QCD with quarks', 'year': 2001}
+
+    result = rerank(
+        record, results(), text=['title'], year='year',
+        weights={'tokens': 0, 'ngrams': 0})
+
+    assert [r.id for r in result][0] == 1
+
+
+def test_rerank_without_reference_values():
+    """Keep the original order when the record has nothing to compare."""
+    result = rerank({}, results(), text=['title'], year='year')
+
+    assert [r.id for r in result] == [1, 2, 3, 4]
+
+
+def test_jaccard():
+    """Compute the Jaccard similarities of all candidates at once."""
+    result = _jaccard(
+        set(['a', 'b']), [set(['a', 'b']), set(['a', 'c']), set()])
+
+    assert np.allclose(result, [1, 1 / 3., 0])
+
+
+def test_ngrams():
+    """Split a text in character n-grams."""
+    assert _ngrams(u'ab, cd', 3) == set([u'ab ', u'b c', u' cd'])
+    assert _ngrams(u'ab', 3) == set([u'ab'])
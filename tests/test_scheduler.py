@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2016 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Query scheduler tests."""
+
+from __future__ import absolute_import, print_function
+
+import json
+
+from invenio_matcher.scheduler import QueryScheduler
+
+EXACT = {'type': 'exact', 'match': 'arxiv_eprints.value'}
+FUZZY = {'type': 'fuzzy', 'match': 'titles.title'}
+
+
+def test_order_keeps_unobserved_queries_in_order():
+    """Keep the configured order without statistics."""
+    scheduler = QueryScheduler()
+
+    assert scheduler.order('records', 'record', [FUZZY, EXACT]) == \
+        [FUZZY, EXACT]
+
+
+def test_order_by_yield_per_second():
+    """Run first the cheap queries finding most of the matches."""
+    scheduler = QueryScheduler()
+    for _ in range(10):
+        scheduler.record('records', 'record', FUZZY, 2.0, False)
+        scheduler.record('records', 'record', EXACT, 0.01, True)
+
+    assert scheduler.order('records', 'record', [FUZZY, EXACT]) == \
+        [EXACT, FUZZY]
+    assert scheduler.order('records', 'other', [FUZZY, EXACT]) == \
+        [FUZZY, EXACT]
+
+
+def test_statistics_decay():
+    """Follow the recent observations rather than the old ones."""
+    scheduler = QueryScheduler(decay=0.5)
+    for _ in range(20):
+        scheduler.record('records', 'record', FUZZY, 0.1, True)
+        scheduler.record('records', 'record', EXACT, 0.1, False)
+    for _ in range(5):
+        scheduler.record('records', 'record', FUZZY, 0.1, False)
+        scheduler.record('records', 'record', EXACT, 0.1, True)
+
+    assert scheduler.order('records', 'record', [FUZZY, EXACT]) == \
+        [EXACT, FUZZY]
+
+
+def test_statistics_persist(tmpdir):
+    """Save the statistics every few observations and load them back."""
+    path = str(tmpdir.join('scheduler.json'))
+    scheduler = QueryScheduler(path=path, save_every=2)
+
+    scheduler.record('records', 'record', EXACT, 0.01, True)
+    assert not tmpdir.join('scheduler.json').exists()
+
+    scheduler.record('records', 'record', FUZZY, 2.0, False)
+    with open(path) as fp:
+        assert set(json.load(fp)['records']['record']) == set([
+            json.dumps(EXACT, sort_keys=True),
+            json.dumps(FUZZY, sort_keys=True),
+        ])
+
+    restarted = QueryScheduler(path=path)
+    assert restarted.order('records', 'record', [FUZZY, EXACT]) == \
+        [EXACT, FUZZY]
+
+
+def test_statistics_merge_between_processes(tmpdir):
+    """Add the observations of each scheduler to the saved statistics."""
+    path = str(tmpdir.join('scheduler.json'))
+    first = QueryScheduler(path=path, decay=1, save_every=2)
+    second = QueryScheduler(path=path, decay=1, save_every=2)
+
+    for scheduler in (first, second, first, second):
+        scheduler.record('records', 'record', EXACT, 0.5, True)
+    first.record('records', 'record', EXACT, 0.5, False)
+    first.save()
+
+    with open(path) as fp:
+        stats = json.load(fp)['records']['record'][
+            json.dumps(EXACT, sort_keys=True)]
+    assert stats == {'runs': 5, 'matches': 4, 'latency': 2.5}
+    assert sorted(tmpdir.listdir()) == sorted([
+        tmpdir.join('scheduler.json'), tmpdir.join('scheduler.json.lock')])
+
+
+def test_statistics_ignore_corrupt_file(tmpdir):
+    """Start from the prior when the saved statistics are unreadable."""
+    path = str(tmpdir.join('scheduler.json'))
+    with open(path, 'w') as fp:
+        fp.write('{"records": {"rec')
+
+    scheduler = QueryScheduler(path=path, save_every=1)
+    assert scheduler.stats == {}
+
+    scheduler.record('records', 'record', EXACT, 0.01, True)
+    with open(path) as fp:
+        assert list(json.load(fp)['records']['record']) == [
+            json.dumps(EXACT, sort_keys=True)]
+
+
+def test_order_keeps_conditional_queries_in_place():
+    """Reorder the queries only between the ones with conditions."""
+    scheduler = QueryScheduler()
+    queries = [
+        {'type': 'exact', 'match': 'doi'},
+        {'type': 'exact', 'match': 'arxiv'},
+        {'type': 'fuzzy', 'match': 'title', 'run_if_no_match': True},
+        {'type': 'exact', 'match': 'isbn', 'stop_if_score_above': 0},
+        {'type': 'fuzzy', 'match': 'abstract'},
+        {'type': 'exact', 'match': 'report'},
+    ]
+    for query in queries:
+        scheduler.record('records', 'record', query, 1, True)
+    for i in (1, 2, 3, 5):
+        scheduler.record('records', 'record', queries[i], 0.001, True)
+    assert scheduler.order('records', 'record', queries) == [
+        queries[1], queries[0], queries[2], queries[3],
+        queries[5], queries[4]]
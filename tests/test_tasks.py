@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2016 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Celery tasks tests."""
+
+from __future__ import absolute_import, print_function
+
+import pytest
+from flask_celeryext import FlaskCeleryExt
+
+from invenio_matcher.errors import SearchUnavailable
+from invenio_matcher.models import MatchDecision, MatchResult
+from invenio_matcher.tasks import ChunkedMatch, match_chunk
+
+
+@pytest.fixture
+def celery_app(app):
+    """Application running the tasks eagerly against a fake backend."""
+    app.config.update(
+        # NOTE: both the Celery 3 and the Celery 4 names of the settings.
+        CELERY_ALWAYS_EAGER=True,
+        CELERY_EAGER_PROPAGATES_EXCEPTIONS=False,
+        CELERY_TASK_ALWAYS_EAGER=True,
+        CELERY_TASK_EAGER_PROPAGATES=False,
+        CELERY_RESULT_BACKEND='cache',
+        CELERY_CACHE_BACKEND='memory',
+        MATCHER_QUERIES={
+            'records': {'record': [{'type': 'exact', 'match': 'title'}]},
+        },
+        MATCHER_SEARCH_CLIENT='tests.helpers:FakeSearchBackend',
+        MATCHER_SEARCH_CLIENT_CONFIG={
+            'documents': {'a': {'title': 'foo'}, 'b': {'title': 'bar'}},
+        },
+    )
+    FlaskCeleryExt(app)
+    return app
+
+
+def _stored_decisions():
+    """Return the record and matched ids of the stored decisions."""
+    return sorted(
+        (decision.record_id, decision.matched_id)
+        for decision in MatchDecision.query.all())
+
+
+def test_match_chunk_of_payloads(celery_app):
+    """Store the matches of the records of the chunk."""
+    chunk = [
+        {'control_number': 1, 'title': 'foo'},
+        {'control_number': 2, 'title': 'baz'},
+        {'control_number': 3, 'title': 'bar'},
+    ]
+
+    with celery_app.app_context():
+        result = match_chunk.delay(chunk, 'records', 'record')
+
+        assert result.get() == 2
+        assert _stored_decisions() == [('1', 'a'), ('3', 'b')]
+
+
+def test_match_chunk_skips_payloads_without_id(celery_app):
+    """Do not store the decisions of a payload without an id."""
+    chunk = [
+        {'title': 'foo'},
+        {'control_number': 3, 'title': 'bar'},
+    ]
+
+    with celery_app.app_context():
+        result = match_chunk.delay(chunk, 'records', 'record')
+
+        assert result.get() == 1
+        assert _stored_decisions() == [('3', 'b')]
+
+
+def test_match_chunk_again(celery_app):
+    """Replace the decisions stored by a previous run of the chunk."""
+    chunk = [
+        {'control_number': 1, 'title': 'foo'},
+        {'control_number': 3, 'title': 'bar'},
+    ]
+
+    with celery_app.app_context():
+        match_chunk.delay(chunk, 'records', 'record').get()
+        match_chunk.delay(
+            [{'control_number': 4, 'title': 'foo'}], 'records', 'record'
+        ).get()
+        match_chunk.delay(chunk, 'records', 'record').get()
+
+        assert _stored_decisions() == [('1', 'a'), ('3', 'b'), ('4', 'a')]
+
+
+def test_match_chunk_of_ids(celery_app, mocker):
+    """Load the stored records of the ids of the chunk."""
+    get_records = mocker.patch(
+        'invenio_records.api.Record.get_records',
+        return_value=[mocker.Mock(id='uuid-1')])
+    match_batch = mocker.patch(
+        'invenio_matcher.api.match_batch',
+        return_value=[[MatchResult('a', {}, 1)]])
+
+    with celery_app.app_context():
+        result = match_chunk.delay(['uuid-1', 'uuid-2'], 'records', 'record')
+
+        assert result.get() == 1
+        assert _stored_decisions() == [('uuid-1', 'a')]
+
+    get_records.assert_called_once_with(['uuid-1', 'uuid-2'])
+    assert len(match_batch.call_args[0][0]) == 1
+
+
+def test_match_chunk_retries(celery_app, mocker):
+    """Retry the chunk when the search backend is unavailable."""
+    match_batch = mocker.patch(
+        'invenio_matcher.api.match_batch',
+        side_effect=[SearchUnavailable(), [[MatchResult('a', {}, 1)]]])
+
+    with celery_app.app_context():
+        result = match_chunk.apply(
+            args=([{'control_number': 1}], 'records', 'record'))
+
+        assert result.get() == 1
+        assert match_batch.call_count == 2
+
+
+def test_chunked_match(celery_app, mocker):
+    """Track the chunks and send again the failed ones."""
+    calls = []
+
+    def match_batch(records, index, doc_type, **kwargs):
+        calls.append([record['control_number'] for record in records])
+        if len(calls) == 2:
+            raise ValueError('corrupted record')
+        return [[MatchResult('a', {}, 1)] for record in records]
+
+    mocker.patch('invenio_matcher.api.match_batch', match_batch)
+    records = [{'control_number': i} for i in range(5)]
+
+    with celery_app.app_context():
+        job = ChunkedMatch(records, 'records', 'record', chunk_size=2)
+        assert [len(chunk) for chunk in job.chunks] == [2, 2, 1]
+
+        job.start()
+        assert job.completed == [0, 2]
+        assert job.failed == [1]
+        assert not job.done
+
+        assert job.retry_failed() == [1]
+        assert job.done
+        assert job.decisions == 5
+        assert calls == [[0, 1], [2, 3], [4], [2, 3]]
+        assert len(_stored_decisions()) == 5
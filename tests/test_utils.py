@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2017 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test Matcher utils."""
+
+from __future__ import absolute_import, print_function
+
+import pytest
+
+from invenio_matcher.utils import PathTrie, get_value, imap_from_caller
+
+RECORD = {
+    'title': 'foo bar',
+    'titles.title': 'literal',
+    'titles': [{'title': 'foo'}, {'subtitle': 'bar'}],
+    'authors': [
+        {
+            'full_name': 'Doe, John',
+            'affiliations': [{'value': 'CERN'}, {'value': 'DESY'}],
+        },
+        {'full_name': 'Roe, Jane'},
+        {'affiliations': [{'value': 'FNAL'}]},
+    ],
+    'dois': [{'value': '10.1/abc'}],
+}
+
+PATHS = [
+    'title',
+    'titles.title',
+    'authors.full_name',
+    'authors.affiliations.value',
+    'authors[0].full_name',
+    'authors[n].affiliations[0].value',
+    'authors[1:].full_name',
+    'authors[5].full_name',
+    'dois.value',
+    'dois[0].value',
+    'missing.value',
+    'authors.missing',
+]
+
+
+@pytest.mark.parametrize('path', PATHS)
+def test_path_trie_agrees_with_get_value(path):
+    """Extract the same values as get_value."""
+    trie = PathTrie(PATHS)
+
+    assert trie.extract(RECORD, default=[])[path] == \
+        get_value(RECORD, path, default=[])
+
+
+def test_path_trie_walks_shared_prefixes_once():
+    """Look up a prefix shared by several paths once."""
+    class CountingDict(dict):
+        lookups = 0
+
+        def __getitem__(self, key):
+            CountingDict.lookups += 1
+            return dict.__getitem__(self, key)
+
+    record = CountingDict(RECORD)
+    PathTrie(['authors.full_name', 'authors.affiliations.value']).extract(
+        record)
+
+    assert CountingDict.lookups == 1
+
+
+def test_imap_from_caller_reads_a_window_ahead():
+    """Consume the items only a window ahead of the results."""
+    from multiprocessing.pool import ThreadPool
+    read = []
+
+    def items():
+        for i in range(10):
+            read.append(i)
+            yield i
+
+    pool = ThreadPool(2)
+    try:
+        results = imap_from_caller(pool, lambda i: i * 2, items(), 3)
+        assert next(results) == 0
+        assert len(read) == 3
+        assert list(results) == [2 * i for i in range(1, 10)]
+    finally:
+        pool.terminate()
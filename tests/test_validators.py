@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2016 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Validators tests."""
+
+from __future__ import absolute_import, print_function
+
+from multiprocessing.pool import ThreadPool
+
+import pytest
+
+from invenio_matcher.models import MatchResult
+from invenio_matcher.validators import BloomValidator, LRUValidator, \
+    SetValidator
+
+
+def _results(*ids):
+    """Return results with the given ids."""
+    return [MatchResult(id_, {}, 1) for id_ in ids]
+
+
+@pytest.mark.parametrize('validator', [
+    SetValidator(), LRUValidator(size=10), BloomValidator(capacity=100)])
+def test_validators_filter_returned_results(validator):
+    """Accept each id once, one result or a list of them at a time."""
+    assert validator({}, _results(1)[0])
+    assert not validator({}, _results(1)[0])
+
+    valid = validator.validate({}, _results(2, 1, 3, 2))
+    assert [result.id for result in valid] == [2, 3]
+
+
+def test_lru_validator_forgets_old_ids():
+    """Remember only the most recently returned ids."""
+    validator = LRUValidator(size=2)
+    validator.validate({}, _results(1, 2))
+
+    assert not validator({}, _results(1)[0])
+    assert validator({}, _results(3)[0])
+    assert len(validator.seen) == 2
+    assert validator({}, _results(2)[0])
+    assert validator({}, _results(1)[0])
+
+
+def test_bloom_validator_error_rate():
+    """Take few new results for duplicates within the capacity."""
+    validator = BloomValidator(capacity=1000, error_rate=0.01)
+    validator.validate({}, _results(*range(1000)))
+
+    false_duplicates = 100 - len(
+        validator.validate({}, _results(*range(1000, 1100))))
+    assert false_duplicates <= 5
+    assert len(validator.bits) == 1199
+
+
+def test_validators_are_thread_safe():
+    """Accept each id exactly once across threads."""
+    validator = SetValidator()
+    pool = ThreadPool(8)
+    try:
+        valid = pool.map(
+            lambda i: validator.validate({}, _results(*range(i, i + 100))),
+            range(0, 1000, 10))
+    finally:
+        pool.terminate()
+
+    ids = [result.id for results in valid for result in results]
+    assert sorted(ids) == list(range(1090))
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2016 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Warm-up tests."""
+
+from __future__ import absolute_import, print_function
+
+from click.testing import CliRunner
+from flask.cli import ScriptInfo
+
+from invenio_matcher import InvenioMatcher
+from invenio_matcher.cli import matcher
+from invenio_matcher.core import _tries
+from invenio_matcher.normalizers import _pipelines
+from invenio_matcher.proxies import current_matcher
+
+from .helpers import FakeSearchClient, one_search_result
+
+
+def test_warmup(app):
+    """Compile the plans, open the client and replay the samples."""
+    app.config.update(
+        MATCHER_QUERIES={
+            'records': {
+                'record': [
+                    {'type': 'exact', 'match': 'title',
+                     'normalize': ['lowercase', 'strip']},
+                    {'type': 'fuzzy', 'match': 'abstract'},
+                ],
+            },
+        },
+        MATCHER_WARMUP_SAMPLES=[
+            {'index': 'records', 'doc_type': 'record',
+             'record': {'title': 'foo bar'}},
+        ],
+    )
+    client = FakeSearchClient([one_search_result()])
+    with app.app_context():
+        current_matcher.search_client = client
+
+    timings = InvenioMatcher.warmup(app)
+
+    assert list(timings) == ['plans', 'search_client', 'samples']
+    assert all(seconds >= 0 for seconds in timings.values())
+    assert ('title', 'abstract') in _tries
+    assert '["lowercase", "strip"]' in _pipelines
+    assert client.calls[0] == {'ping': True}
+    assert client.calls[1]['index'] == 'records'
+    assert not client.responses
+
+
+def test_warmup_command(app):
+    """Report the time taken by each step."""
+    with app.app_context():
+        client = current_matcher.search_client = FakeSearchClient([])
+    app.config['MATCHER_WARMUP_SAMPLES'] = [
+        {'index': 'records', 'doc_type': 'record', 'record': {}},
+    ]
+    runner = CliRunner()
+    script_info = ScriptInfo(create_app=lambda info=None: app)
+
+    result = runner.invoke(matcher, ['warmup', '--no-samples'],
+                           obj=script_info)
+
+    assert result.exit_code == 0
+    assert 'plans: ' in result.output
+    assert 'samples: ' in result.output
+    assert 'Matcher warmed up in' in result.output
+    assert client.calls == [{'ping': True}]